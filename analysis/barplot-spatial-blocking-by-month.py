@@ -21,7 +21,7 @@
 #   rather from all samples for which CSC108 was actually utilizing backfill.
 #
 #                                                       ~~ (c) SRW, 05 Dec 2018
-#                                                   ~~ last updated 06 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import datetime
 import json
@@ -30,6 +30,7 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 import scipy.stats as stats
+import shards
 import sqlite3
 
 ###
@@ -292,9 +293,10 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open a read-only connection to the database (file), along with any monthly
+  # shards.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename)
 
   # Enable users to access columns by name instead of by index.
 
@@ -0,0 +1,514 @@
+#-  Python 2.7 source code (also runs with Python 3)
+
+#-  columnar.py ~~
+#
+#   This program exports the tables in the SQLite database into a columnar
+#   format, one file per column and calendar month, so that the analysis
+#   programs can load millions of values straight into NumPy arrays instead of
+#   pulling them through `sqlite3.Row` one at a time. Run it after each update
+#   of the database, just like any of the other programs:
+#
+#       $ python analysis/columnar.py
+#
+#   If `pyarrow` is installed, each month of each table is written as a single
+#   Parquet file. Otherwise, each month is a directory with one ".npy" file per
+#   column and a "dictionary.json" file for the columns which hold strings.
+#   Either way, a month is only rewritten when its number of rows or its latest
+#   time has changed since the last export, as recorded in "manifest.json".
+#
+#   Other programs can then load whichever columns they need as arrays, e.g.
+#
+#       import columnar
+#       data = columnar.loadColumns("active", ["JobID", "ReqProcs"],
+#           start = 1530403200, end = 1533081600)
+#       big = data["ReqProcs"] / 16 > 3749
+#
+#   Integer columns which contain NULL are returned as floats, with NaN in
+#   place of NULL, and string columns are returned as arrays of objects, with
+#   None in place of NULL.
+#
+#   This program runs under the "python_anaconda2" module, like the rest of the
+#   analysis programs, so it must stay compatible with Python 2.7.
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import calendar
+import json
+import numpy
+import os
+import shards
+import shutil
+import sqlite3
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+###
+
+# The tables which are exported, along with the column which decides the month
+# that each row belongs to.
+
+PARTITIONS = {
+    "active": "SampleTime",
+    "backfill": "SampleTime",
+    "blocked": "SampleTime",
+    "cluster": "SampleTime",
+    "completed": "CompletionTime",
+    "eligible": "SampleTime"
+}
+
+# The number of times that `loadColumns` tries to read a table, in case the
+# files of a month are replaced while it reads them.
+
+READ_ATTEMPTS = 3
+
+###
+
+def describeTable(connection, table):
+
+  # Given a `Connection` object and the name of a table, this function returns
+  # a list of [name, declared type] pairs, one for each column of that table.
+
+    columns = []
+    for row in connection.execute("PRAGMA table_info(%s);" % table):
+        columns.append([row[1], row[2]])
+
+    return columns
+
+###
+
+def distinctRows(*arrays):
+
+  # Given any number of NumPy arrays of the same length, this function returns
+  # a list of the same arrays with repeated rows removed, like SELECT DISTINCT
+  # does for the corresponding columns. Rows come back sorted by the first
+  # array, then by the second one, and so on.
+
+    codes = [numpy.unique(each, return_inverse = True)[1].ravel()
+        for each in arrays]
+    order = numpy.lexsort(codes[::-1])
+
+    keep = numpy.zeros(len(order), dtype = bool)
+    keep[:1] = True
+    for each in codes:
+        each = each[order]
+        keep[1:] |= (each[1:] != each[:-1])
+
+    return [each[order[keep]] for each in arrays]
+
+###
+
+def exportPartition(connection, table, month, path):
+
+  # Given a `Connection` object, the name of a table, a month label such as
+  # "2018-07", and the path to write to (without an extension), this function
+  # writes every row of that table from that month in columnar form. The new
+  # files are written next to the old ones and then renamed into place. It
+  # returns the number of rows that were written.
+
+    cursor = connection.cursor()
+
+    names = []
+    types = []
+    for (name, decltype) in describeTable(connection, table):
+        names.append(name)
+        types.append(decltype)
+
+    (start, end) = monthBounds(month)
+
+    cursor.execute("SELECT * FROM %s WHERE %s >= ? AND %s < ?;" %
+        (table, PARTITIONS[table], PARTITIONS[table]), (start, end))
+
+  # The rows are read in chunks and converted into one array per column as
+  # they go, so that a month never has to fit in memory as Python objects.
+
+    chunks = [[] for name in names]
+    lookups = [{} for name in names]
+    num_rows = 0
+
+    while True:
+        rows = cursor.fetchmany(100000)
+        if len(rows) == 0:
+            break
+        num_rows += len(rows)
+        for (i, values) in enumerate(zip(*rows)):
+            chunks[i].append(toArray(values, types[i], lookups[i]))
+
+    arrays = {}
+    dictionary = {}
+    for (i, name) in enumerate(names):
+        if len(chunks[i]) == 0:
+            arrays[name] = toArray((), types[i], lookups[i])
+        else:
+            arrays[name] = numpy.concatenate(chunks[i])
+        if types[i] not in ["INTEGER", "REAL"]:
+            strings = [None] * len(lookups[i])
+            for (value, code) in lookups[i].items():
+                strings[code] = value
+            dictionary[name] = strings
+
+    if pyarrow is not None:
+        columns = []
+        for name in names:
+            if name in dictionary:
+                codes = arrays[name]
+                columns.append(pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(codes, mask = (codes < 0)),
+                    pyarrow.array(dictionary[name], type = pyarrow.string())))
+            else:
+                columns.append(pyarrow.array(arrays[name]))
+        pyarrow.parquet.write_table(pyarrow.Table.from_arrays(columns,
+            names = names), path + ".parquet.tmp")
+        os.rename(path + ".parquet.tmp", path + ".parquet")
+        return num_rows
+
+    if os.path.isdir(path + ".tmp"):
+        shutil.rmtree(path + ".tmp")
+    os.makedirs(path + ".tmp")
+    for name in names:
+        numpy.save(os.path.join(path + ".tmp", name + ".npy"), arrays[name])
+    with open(os.path.join(path + ".tmp", "dictionary.json"), "w") as f:
+        json.dump(dictionary, f)
+
+    if os.path.isdir(path):
+        os.rename(path, path + ".old")
+    os.rename(path + ".tmp", path)
+    if os.path.isdir(path + ".old"):
+        shutil.rmtree(path + ".old")
+
+    return num_rows
+
+###
+
+def exportTables(connection, out_dir, start = None, end = None):
+
+  # Given a `Connection` object and the path to the output directory, this
+  # function exports every month of every table in PARTITIONS whose number of
+  # rows or latest value of the partition column differs from the last export.
+  # Those are recorded in "manifest.json" in the directory of each table, along
+  # with the columns of the table. Every month is exported again when the
+  # columns have changed, or when the manifest is from an older version of
+  # this program. Only the months in [start, end) are considered, where each
+  # bound is None or the start of a month. It returns the number of rows
+  # written.
+
+    num_rows = 0
+
+    for table in sorted(PARTITIONS):
+
+        table_dir = os.path.join(out_dir, table)
+        if not os.path.isdir(table_dir):
+            os.makedirs(table_dir)
+
+        manifest_file = os.path.join(table_dir, "manifest.json")
+        manifest = {}
+        if os.path.isfile(manifest_file):
+            with open(manifest_file) as f:
+                manifest = json.load(f)
+
+        columns = describeTable(connection, table)
+        if manifest.get("columns") != columns or "months" not in manifest:
+            manifest = {"columns": columns, "months": {}}
+
+        key = PARTITIONS[table]
+        query = """
+            SELECT  strftime('%%Y-%%m', %s, 'unixepoch') AS Month,
+                    count(*) AS n,
+                    max(%s) AS Latest
+                FROM %s
+                WHERE (? IS NULL OR %s >= ?) AND (? IS NULL OR %s < ?)
+                GROUP BY Month;
+            """ % (key, key, table, key, key)
+
+        for row in connection.execute(query,
+                (start, start, end, end)).fetchall():
+            month = row[0]
+            watermark = {"rows": row[1], "latest": row[2]}
+            if month is None or manifest["months"].get(month) == watermark:
+                continue
+            num_rows += exportPartition(connection, table, month,
+                os.path.join(table_dir, month))
+            manifest["months"][month] = watermark
+            writeManifest(manifest_file, manifest)
+
+      # The manifest is written even when nothing was exported, so that the
+      # columns of an empty table are known to `loadColumns`.
+
+        writeManifest(manifest_file, manifest)
+
+    return num_rows
+
+###
+
+def findDataDirectory():
+
+  # This function returns the path to the data directory, where this script is
+  # running remotely at OLCF and locally on a personal laptop, for example.
+
+    cwd = os.getcwd()
+
+    if os.path.isdir("/lustre/atlas/proj-shared/csc108/data/moab/"):
+        data_dir = "/lustre/atlas/proj-shared/csc108/data/moab/"
+    elif os.path.isdir(os.path.join(cwd, "moab")):
+        data_dir = os.path.join(cwd, "moab")
+    else:
+        raise Exception("Data directory not found.")
+
+    return data_dir
+
+###
+
+def loadColumns(table, columns = None, start = None, end = None,
+        data_dir = None):
+
+  # Given the name of a table, this function returns a dictionary which maps
+  # each column name to a NumPy array of that column's values, in the order
+  # they were written. The "columns" list restricts which columns are loaded,
+  # and "start" and "end" restrict the rows to those whose partition column,
+  # e.g. "SampleTime", falls in [start, end). Only the months which overlap
+  # that range are read from disk. When no rows match, every column is still
+  # returned, as an empty array of the right type.
+
+    if data_dir is None:
+        data_dir = findDataDirectory()
+
+    table_dir = os.path.join(data_dir, "columns", table)
+    key = PARTITIONS[table]
+
+    manifest_file = os.path.join(table_dir, "manifest.json")
+    if not os.path.isfile(manifest_file):
+        raise Exception("No columnar copy of %s found in %s. Run columnar.py "
+            "first." % (table, data_dir))
+
+    wanted = None
+    if columns is not None:
+        wanted = list(columns)
+        if key not in wanted:
+            wanted.append(key)
+
+  # "columnar.py" may replace a month while this reads it, so that its files
+  # disappear part of the way through. Then the months are simply listed and
+  # read again, a few times at most.
+
+    for attempt in range(READ_ATTEMPTS):
+        try:
+            parts = readMonths(table_dir, key, wanted, start, end)
+            break
+        except (IOError, OSError):
+            if attempt + 1 == READ_ATTEMPTS:
+                raise
+
+    if len(parts) == 0:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        part = {}
+        for (name, decltype) in manifest["columns"]:
+            if decltype in ["INTEGER", "REAL"]:
+                part[name] = toArray((), decltype, {})
+            else:
+                part[name] = numpy.array([], dtype = object)
+        parts.append(part)
+
+    if columns is None:
+        columns = list(parts[0].keys())
+
+    data = {}
+    for name in columns:
+        data[name] = numpy.concatenate([part[name] for part in parts])
+
+    return data
+
+###
+
+def main():
+
+  # Find the data directory and create strings to represent the paths to the
+  # database file and to the output directory.
+
+    data_dir = findDataDirectory()
+    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
+    out_dir = os.path.join(data_dir, "columns")
+
+  # Export anything that has changed since last time. SQLite can only attach
+  # so many monthly shards at once, so they are opened a range of months at a
+  # time, read-only, and only the months in that range are exported from it.
+
+    num_rows = 0
+
+    for (start, end) in shards.listRanges(dbfilename):
+        connection = shards.connectShards(dbfilename, start, end)
+        num_rows += exportTables(connection, out_dir, start, end)
+        connection.close()
+
+    print("Exported %d rows to %s" % (num_rows, out_dir))
+
+###
+
+def monthBounds(month):
+
+  # Given a month label such as "2018-07", this function returns a tuple of the
+  # UNIX times of the start of that month and of the start of the next one.
+
+    (year, number) = [int(each) for each in month.split("-")]
+
+    start = calendar.timegm((year, number, 1, 0, 0, 0))
+    if number == 12:
+        end = calendar.timegm((year + 1, 1, 1, 0, 0, 0))
+    else:
+        end = calendar.timegm((year, number + 1, 1, 0, 0, 0))
+
+    return (start, end)
+
+###
+
+def readMonths(table_dir, key, columns, start, end):
+
+  # Given the path to the directory of a table, the name of its partition
+  # column, a list of column names (or None), and the "start" and "end" of
+  # `loadColumns`, this function returns a list with one dictionary of arrays
+  # per month which overlaps the range, holding only the rows in the range.
+  # Between its two renames, `exportPartition` leaves a month only as
+  # "<month>.old", which is read in that case.
+
+    paths = {}
+    for name in os.listdir(table_dir):
+        if name.endswith(".parquet"):
+            month = name[:-len(".parquet")]
+            paths[month] = os.path.join(table_dir, month)
+        elif not os.path.isdir(os.path.join(table_dir, name)):
+            continue
+        elif "." not in name:
+            paths[name] = os.path.join(table_dir, name)
+        elif name.endswith(".old") and "." not in name[:-len(".old")]:
+            paths.setdefault(name[:-len(".old")],
+                os.path.join(table_dir, name))
+
+    parts = []
+    for month in sorted(paths):
+        (lower, upper) = monthBounds(month)
+        if start is not None and upper <= start:
+            continue
+        if end is not None and lower >= end:
+            continue
+        part = readPartition(paths[month], columns)
+        if start is not None or end is not None:
+            keep = numpy.ones(len(part[key]), dtype = bool)
+            if start is not None:
+                keep &= part[key] >= start
+            if end is not None:
+                keep &= part[key] < end
+            for name in part:
+                part[name] = part[name][keep]
+        parts.append(part)
+
+    return parts
+
+###
+
+def readPartition(path, columns):
+
+  # Given the path to one month of a table (without an extension) and a list of
+  # column names, or None for all of them, this function returns a dictionary
+  # which maps each column name to a NumPy array. String columns are decoded
+  # from their dictionaries into arrays of objects.
+
+    data = {}
+
+    if os.path.isfile(path + ".parquet"):
+        if pyarrow is None:
+            raise Exception("Reading %s.parquet requires pyarrow." % path)
+        table = pyarrow.parquet.read_table(path + ".parquet",
+            columns = columns)
+        for name in table.column_names:
+            column = table.column(name).combine_chunks()
+            if isinstance(column, pyarrow.DictionaryArray):
+                codes = column.indices.fill_null(-1).to_numpy(
+                    zero_copy_only = False)
+                strings = column.dictionary.to_pylist() + [None]
+                data[name] = numpy.array(strings, dtype = object)[codes]
+            else:
+                data[name] = column.to_numpy(zero_copy_only = False)
+        return data
+
+    with open(os.path.join(path, "dictionary.json")) as f:
+        dictionary = json.load(f)
+
+    if columns is None:
+        columns = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".npy"):
+                columns.append(name[:-len(".npy")])
+
+    for name in columns:
+        values = numpy.load(os.path.join(path, name + ".npy"))
+        if name in dictionary:
+            strings = dictionary[name] + [None]
+            values = numpy.array(strings, dtype = object)[values]
+        data[name] = values
+
+    return data
+
+###
+
+def requestedNodes(data):
+
+  # Given a dictionary of arrays with "ReqNodes" and "ReqProcs" in it, this
+  # function returns an array of the number of nodes each job requested. Jobs
+  # which did not give a node count are assumed to have asked for 16 processors
+  # per node, and those with neither come back as NaN.
+
+    nodes = numpy.asarray(data["ReqNodes"], dtype = numpy.float64)
+    procs = numpy.asarray(data["ReqProcs"], dtype = numpy.float64)
+
+    return numpy.where(numpy.isnan(nodes), procs // 16, nodes)
+
+###
+
+def toArray(values, decltype, lookup):
+
+  # Given a tuple of values from one column, the declared type of that column,
+  # and a dictionary of the strings seen so far in that column, this function
+  # returns a NumPy array. Numbers become int64, or float64 with NaN in place
+  # of NULL, and strings become int32 codes into "lookup", with -1 for NULL.
+  # New strings are added to "lookup" as they are found.
+
+    if decltype in ["INTEGER", "REAL"]:
+        if None in values:
+            return numpy.array([numpy.nan if value is None else value
+                for value in values], dtype = numpy.float64)
+        if decltype == "REAL" or float in set(map(type, values)):
+            return numpy.array(values, dtype = numpy.float64)
+        return numpy.array(values, dtype = numpy.int64)
+
+    codes = numpy.empty(len(values), dtype = numpy.int32)
+    for (i, value) in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        value = "%s" % (value,)
+        if value not in lookup:
+            lookup[value] = len(lookup)
+        codes[i] = lookup[value]
+
+    return codes
+
+###
+
+def writeManifest(manifest_file, manifest):
+
+  # Given the path to a manifest and a dictionary, this function replaces the
+  # manifest with the dictionary as JSON.
+
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump(manifest, f, indent = 4, sort_keys = True)
+    os.rename(manifest_file + ".tmp", manifest_file)
+
+###
+
+if __name__ == "__main__":
+    main()
+
+#-  vim:set syntax=python:
@@ -2,9 +2,10 @@
 
 #-  compute-avg-local-idle-procs.py ~~
 #                                                       ~~ (c) SRW, 15 Jun 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import os
+import shards
 import sqlite3
 
 ###
@@ -50,9 +51,10 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open a read-only connection to the database (file), along with any monthly
+  # shards.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename)
 
   # Enable users to access columns by name instead of by index.
 
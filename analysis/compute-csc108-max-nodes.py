@@ -6,9 +6,10 @@
 #   There are prettier ways to do it, but I'm in a hurry.
 #
 #                                                       ~~ (c) SRW, 28 Aug 2018
-#                                                   ~~ last updated 05 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import os
+import shards
 import sqlite3
 
 ###
@@ -85,9 +86,10 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open a read-only connection to the database (file), along with any monthly
+  # shards.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename)
 
   # Enable users to access columns by name instead of by index.
 
@@ -9,11 +9,13 @@
 #   exploration.
 #
 #                                                       ~~ (c) SRW, 18 Jul 2018
-#                                                   ~~ last updated 05 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import json
 import os
+import shards
 import sqlite3
+import time
 
 ###
 
@@ -74,9 +76,11 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open connection to the database (file), along with any monthly shards that
+  # hold the last 30 days.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename,
+        start = time.time() - 30*24*60*60)
 
   # Enable users to access columns by name instead of by index.
 
@@ -11,11 +11,12 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 09 Jul 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import math
 import matplotlib.pyplot as pyplot
 import os
+import shards
 import sqlite3
 
 ###
@@ -29,10 +30,19 @@ def analyze(connection):
   #
   #     SELECT DISTINCT (ReqProcs % 16) FROM active;
 
+  # A job which was modified while it waited has more than one row in "jobs",
+  # so only the rows that were seen while it ran are counted. They are looked
+  # up by JobKey, instead of going through all of the samples of every job.
+
     query = """
-        SELECT DISTINCT JobID, (ReqProcs / 16) AS nodes
-            FROM active
-            WHERE Account="CSC108" AND User="doleynik"
+        SELECT DISTINCT j.JobID, (j.ReqProcs / 16) AS nodes
+            FROM jobs AS j
+            WHERE
+                j.Account="CSC108" AND j.User="doleynik"
+                AND (EXISTS (SELECT 1 FROM active_samples AS s
+                        WHERE s.JobKey = j.JobKey)
+                    OR EXISTS (SELECT 1 FROM active_runs AS r
+                        WHERE r.JobKey = j.JobKey))
         """
 
     nodes = []
@@ -81,9 +91,10 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open a read-only connection to the database (file), along with any monthly
+  # shards.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename)
 
   # Enable users to access columns by name instead of by index.
 
@@ -14,11 +14,12 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 26 Jul 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import matplotlib.pyplot as pyplot
 from matplotlib.ticker import MaxNLocator
 import os
+import shards
 import sqlite3
 
 ###
@@ -111,9 +112,10 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open a read-only connection to the database (file), along with any monthly
+  # shards.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename)
 
   # Enable users to access columns by name instead of by index.
 
@@ -11,42 +11,34 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 23 Aug 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 from datetime import datetime
 
+import columnar
 import math
 import matplotlib.pyplot as pyplot
 import os
-import sqlite3
 
 ###
 
-def analyze(connection):
-
-    cursor = connection.cursor()
-
-    query = """
-        SELECT  DISTINCT JobID,
-                (StartTime - SubmissionTime) AS WaitTime
-            FROM
-                active
-            WHERE
-                SubmissionTime <= StartTime
-                AND ((ReqNodes IS NULL
-                        AND 3750 <= (ReqProcs / 16)
-                        AND (ReqProcs / 16) <= 11249)
-                    OR (ReqNodes IS NOT NULL
-                        AND 3750 <= ReqNodes
-                        AND ReqNodes <= 11249))
-             -- An estimate for July 21 through August 4
-                AND (1532149200 < SampleTime AND SampleTime < 1533358800)
-        ;
-        """
-
-    waits = []
-    for row in cursor.execute(query):
-        waits.append(row["WaitTime"])
+def analyze(data_dir):
+
+  # Load the columns this needs from the "active" table for an estimate of July
+  # 21 through August 4. SampleTime is in whole seconds, so the range starts
+  # one second after 1532149200.
+
+    data = columnar.loadColumns("active", ["JobID", "ReqNodes",
+        "ReqProcs", "StartTime", "SubmissionTime"], start = 1532149201,
+        end = 1533358800, data_dir = data_dir)
+
+    nodes = columnar.requestedNodes(data)
+
+    keep = ((data["SubmissionTime"] <= data["StartTime"])
+        & (3750 <= nodes) & (nodes <= 11249))
+
+    waits = columnar.distinctRows(data["JobID"][keep],
+        data["StartTime"][keep] - data["SubmissionTime"][keep])[1]
 
     fig = pyplot.figure()
     ax = fig.add_subplot(111)
@@ -79,30 +71,10 @@ def main():
     else:
         raise Exception("Data directory not found.")
 
-  # Create string to represent path to database file.
-
-    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
-
-  # Open connection to the database (file).
-
-    connection = sqlite3.connect(dbfilename)
-
-  # Enable users to access columns by name instead of by index.
-
-    connection.row_factory = sqlite3.Row
-
-  # Ensure read-only access to the database
-
-    connection.execute("PRAGMA query_only = true;")
-
-  # Run custom analyis code.
-
-    analyze(connection)
-
-  # Commit any changes and close the connection to the database.
+  # Run custom analyis code on the columnar copy of the database, which
+  # "columnar.py" refreshes after each update.
 
-    connection.commit()
-    connection.close()
+    analyze(data_dir)
 
 ###
 
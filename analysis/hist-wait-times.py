@@ -7,41 +7,30 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 21 Aug 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 from datetime import datetime
 
+import columnar
 import math
 import matplotlib.pyplot as pyplot
 import os
-import sqlite3
 
 ###
 
-def analyze(connection):
+def analyze(data_dir):
 
-    cursor = connection.cursor()
+  # Load the columns this needs from the "active" table. A query for this one
+  # ran reasonably quickly in SQLite, but the table only grows, and loading
+  # whole columns as arrays keeps it quick.
 
-  # Note that simple queries like this one still run reasonably quickly when
-  # using the "active" table instead of "completed", but everything falls apart
-  # in other programs when the queries get complicated.
+    data = columnar.loadColumns("active", ["JobID", "StartTime",
+        "SubmissionTime"], data_dir = data_dir)
 
-    query = """
-        SELECT  DISTINCT JobID,
-                (StartTime - SubmissionTime) AS WaitTime
-            FROM
-                active
-                --completed
-            WHERE
-                SubmissionTime <= StartTime
-                --AND (ReqProcs / 16) > 3749
-                --AND CompletionCode = "0"
-        ;
-        """
+    keep = (data["SubmissionTime"] <= data["StartTime"])
 
-    waits = []
-    for row in cursor.execute(query):
-        waits.append(row["WaitTime"])
+    waits = columnar.distinctRows(data["JobID"][keep],
+        data["StartTime"][keep] - data["SubmissionTime"][keep])[1]
 
     fig = pyplot.figure()
     ax = fig.add_subplot(111)
@@ -74,30 +63,10 @@ def main():
     else:
         raise Exception("Data directory not found.")
 
-  # Create string to represent path to database file.
+  # Run custom analyis code on the columnar copy of the database, which
+  # "columnar.py" refreshes after each update.
 
-    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
-
-  # Open connection to the database (file).
-
-    connection = sqlite3.connect(dbfilename)
-
-  # Enable users to access columns by name instead of by index.
-
-    connection.row_factory = sqlite3.Row
-
-  # Ensure read-only access to the database
-
-    connection.execute("PRAGMA query_only = true;")
-
-  # Run custom analyis code.
-
-    analyze(connection)
-
-  # Commit any changes and close the connection to the database.
-
-    connection.commit()
-    connection.close()
+    analyze(data_dir)
 
 ###
 
@@ -10,11 +10,12 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 09 Jul 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import math
 import matplotlib.pyplot as pyplot
 import os
+import shards
 import sqlite3
 
 ###
@@ -23,10 +24,19 @@ def analyze(connection):
 
     cursor = connection.cursor()
 
+  # A job which was modified while it waited has more than one row in "jobs",
+  # so only the rows that were seen while it ran are counted. They are looked
+  # up by JobKey, instead of going through all of the samples of every job.
+
     query = """
-        SELECT DISTINCT JobID, ReqAWDuration AS walltime
-            FROM active
-            WHERE Account="CSC108" AND User="doleynik"
+        SELECT DISTINCT j.JobID, j.ReqAWDuration AS walltime
+            FROM jobs AS j
+            WHERE
+                j.Account="CSC108" AND j.User="doleynik"
+                AND (EXISTS (SELECT 1 FROM active_samples AS s
+                        WHERE s.JobKey = j.JobKey)
+                    OR EXISTS (SELECT 1 FROM active_runs AS r
+                        WHERE r.JobKey = j.JobKey))
         """
 
     walltimes = []
@@ -75,9 +85,10 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open a read-only connection to the database (file), along with any monthly
+  # shards.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename)
 
   # Enable users to access columns by name instead of by index.
 
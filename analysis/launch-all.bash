@@ -6,14 +6,21 @@
 #   of all the plots. I could do this much more efficiently with a Makefile,
 #   though.
 #
+#   The columnar copy of the database is brought up to date first, because
+#   some of the programs read from it. "columnar.py" and "shards.py" are not
+#   plotting programs, so they are left out of the parallel run.
+#
 #                                                       ~~ (c) SRW, 30 Jul 2018
-#                                                   ~~ last updated 30 Jul 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 module load python_anaconda2;
 
 DIR_OF_THIS_SCRIPT=$(cd `dirname $0` && pwd)
 NUM_OF_PROCESSORS=$(nproc)
 
-ls $DIR_OF_THIS_SCRIPT/*.py | xargs -n 1 -P $NUM_OF_PROCESSORS -I{} python {};
+python $DIR_OF_THIS_SCRIPT/columnar.py || exit 1;
+
+ls $DIR_OF_THIS_SCRIPT/*.py | grep -v -e '/columnar\.py$' -e '/shards\.py$' \
+    | xargs -n 1 -P $NUM_OF_PROCESSORS -I{} python {};
 
 #-  vim:set syntax=sh:
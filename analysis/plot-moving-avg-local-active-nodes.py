@@ -17,14 +17,16 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 20 Jul 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 from datetime import datetime
 
 import matplotlib
 import matplotlib.pyplot as pyplot
 import os
+import shards
 import sqlite3
+import time
 
 ###
 
@@ -95,9 +97,11 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open connection to the database (file), along with any monthly shards that
+  # hold the last seven days, plus the hour before that for the first average.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename,
+        start = time.time() - 7*24*60*60 - 60*60)
 
   # Enable users to access columns by name instead of by index.
 
@@ -12,13 +12,14 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 12 Oct 2018
-#                                                   ~~ last updated 05 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 from datetime import datetime
 
 import matplotlib
 import matplotlib.pyplot as pyplot
 import os
+import shards
 import sqlite3
 
 import numpy
@@ -117,9 +118,10 @@ def main():
 
     dbfilename = os.path.join(data_dir, "moab-data.sqlite")
 
-  # Open connection to the database (file).
+  # Open a read-only connection to the database (file), along with any monthly
+  # shards.
 
-    connection = sqlite3.connect(dbfilename)
+    connection = shards.connectShards(dbfilename)
 
   # Enable users to access columns by name instead of by index.
 
@@ -15,69 +15,47 @@
 #       $ module load python_anaconda2
 #
 #                                                       ~~ (c) SRW, 24 Aug 2018
-#                                                   ~~ last updated 04 Dec 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 from datetime import datetime
+import columnar
 import matplotlib
 import matplotlib.pyplot as pyplot
 import numpy
 import os
-import sqlite3
 
 ###
 
-def analyze(connection):
-
-    cursor = connection.cursor()
-
-    query = """
-        SELECT DISTINCT
-                    JobID,
-                    (StartTime - SubmissionTime) AS WaitTime
-            FROM
-                active
-            WHERE
-                (Account != "CSC108" OR User != "doleynik")
-
-                AND SubmissionTime <= StartTime
-
-             -- An estimate for July 7 through July 21
-                AND (1530939600 < SampleTime AND SampleTime < 1532149200)
-
-                AND ((ReqNodes IS NULL
-                        AND 11250 <= (ReqProcs / 16))
-                    OR (ReqNodes IS NOT NULL
-                        AND 11250 <= ReqNodes))
-        ;
-        """
-
-    with_csc108 = []
-    for row in cursor.execute(query):
-        with_csc108.append(row["WaitTime"])
-
-  # Now we will change the query to find WaitTimes for jobs that ran while
-  # CSC108 was "dormant".
-
-    query = """
-        SELECT DISTINCT JobID,
-                (StartTime - SubmissionTime) AS WaitTime
-            FROM
-                active
-            WHERE
-                (Account != "CSC108" OR User != "doleynik")
-                AND SubmissionTime < StartTime
-             -- An estimate for July 21 through August 4
-                AND (1532149200 < SampleTime AND SampleTime < 1533358800)
-                AND ((ReqNodes IS NULL
-                        AND 11250 <= (ReqProcs / 16))
-                    OR (ReqNodes IS NOT NULL
-                        AND 11250 <= ReqNodes))
-        ;
-        """
-
-    wo_csc108 = []
-    for row in cursor.execute(query):
-        wo_csc108.append(row["WaitTime"])
+def analyze(data_dir):
+
+  # Load the columns this needs from the "active" table for both two-week
+  # periods at once. SampleTime is in whole seconds, so the range starts one
+  # second after 1530939600.
+
+    data = columnar.loadColumns("active", ["Account", "JobID",
+        "ReqNodes", "ReqProcs", "SampleTime", "StartTime", "SubmissionTime",
+        "User"], start = 1530939601, end = 1533358800, data_dir = data_dir)
+
+    nodes = columnar.requestedNodes(data)
+    others = ((data["Account"] != "CSC108") | (data["User"] != "doleynik"))
+    waits = data["StartTime"] - data["SubmissionTime"]
+
+  # An estimate for July 7 through July 21
+
+    keep = (others & (11250 <= nodes)
+        & (data["SubmissionTime"] <= data["StartTime"])
+        & (data["SampleTime"] < 1532149200))
+
+    with_csc108 = columnar.distinctRows(data["JobID"][keep], waits[keep])[1]
+
+  # Now we will change the filter to find WaitTimes for jobs that ran while
+  # CSC108 was "dormant", from July 21 through August 4.
+
+    keep = (others & (11250 <= nodes)
+        & (data["SubmissionTime"] < data["StartTime"])
+        & (1532149200 < data["SampleTime"]))
+
+    wo_csc108 = columnar.distinctRows(data["JobID"][keep], waits[keep])[1]
 
   # Next, compute the percentiles or quantiles. It really doesn't matter which,
   # because we are only going to use those to relate the two distributions. I
@@ -120,30 +98,10 @@ def main():
     else:
         raise Exception("Data directory not found.")
 
-  # Create string to represent path to database file.
-
-    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
-
-  # Open connection to the database (file).
-
-    connection = sqlite3.connect(dbfilename)
-
-  # Enable users to access columns by name instead of by index.
-
-    connection.row_factory = sqlite3.Row
-
-  # Ensure read-only access to the database
-
-    connection.execute("PRAGMA query_only = true;")
-
-  # Run custom analyis code.
-
-    analyze(connection)
-
-  # Commit any changes and close the connection to the database.
+  # Run custom analyis code on the columnar copy of the database, which
+  # "columnar.py" refreshes after each update.
 
-    connection.commit()
-    connection.close()
+    analyze(data_dir)
 
 ###
 
@@ -0,0 +1,330 @@
+#-  Python 3 source code
+
+#-  shards.py ~~
+#
+#   When "from-xml-to-sqlite.py" runs with "--monthly-shards", the rows of each
+#   sample are written to a separate database file for its month, such as
+#   "moab-data-2018-07.sqlite", next to "moab-data.sqlite", which keeps the
+#   rest. This program provides a drop-in replacement for `sqlite3.connect` for
+#   the analysis programs, which attaches only the shards that overlap a range
+#   of sample times and hides them behind temporary views with the usual table
+#   names, so that existing queries work unchanged:
+#
+#       import shards
+#       connection = shards.connectShards(dbfilename,
+#           start = time.time() - 7*24*60*60)
+#
+#   A query which is bounded by SampleTime then only touches those months. If
+#   there are no shards, it just returns an ordinary connection, so every
+#   analysis program opens the database this way, whether it is sharded or
+#   not. SQLite can only attach a handful of databases at once, usually 10, so
+#   a program which needs more months than that has to pass a narrower range,
+#   or work through the ranges from `listRanges` one at a time, as
+#   "columnar.py" does. Run on its own, this program lists the shards and how
+#   many samples each one holds.
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import calendar
+import os
+import re
+import sqlite3
+import sys
+
+###
+
+# The tables which are split into monthly shards. Everything else, including
+# the "jobs" table that the views join them to, stays in the main database.
+
+SHARDED_TABLES = [
+    "active_samples", "backfill", "blocked_samples", "cluster",
+    "eligible_samples"
+]
+
+###
+
+def attachLimit(connection):
+
+  # Given a `Connection` object, this function returns the number of databases
+  # that SQLite can attach to it at once. Versions of Python which cannot ask
+  # SQLite get its default.
+
+    if hasattr(connection, "getlimit"):
+        return connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+
+    return 10
+
+###
+
+def attachShards(connection, data_dir, months, uri):
+
+  # Given a `Connection` object, the path to the data directory, a list of
+  # month labels, and whether the connection can open URIs, this function
+  # attaches the shard for each month and shadows each table in
+  # SHARDED_TABLES with a temporary view which is the UNION ALL of that table
+  # in the main database and in each shard.
+
+    cursor = connection.cursor()
+
+    schemas = []
+    for month in months:
+        schema = "shard_" + month.replace("-", "_")
+        filename = shardFilename(data_dir, month)
+        if uri:
+            filename = "file:%s?mode=ro" % filename
+        cursor.execute("ATTACH DATABASE ? AS %s;" % schema, (filename,))
+        schemas.append(schema)
+
+    for table in SHARDED_TABLES:
+        parts = ["SELECT * FROM main.%s" % table]
+        for schema in schemas:
+            parts.append("SELECT * FROM %s.%s" % (schema, table))
+        cursor.execute("CREATE TEMP VIEW %s AS %s;" %
+            (table, " UNION ALL ".join(parts)))
+
+    return
+
+###
+
+def connectReadOnly(dbfilename):
+
+  # Given a string "dbfilename" indicating the path to a database file, this
+  # function returns a read-only `Connection` object for it. In WAL mode, this
+  # lets any number of programs read while "from-xml-to-sqlite.py" is writing.
+  # Not every version of Python can open SQLite URIs, and those fall back to
+  # an ordinary connection, which the "query_only" pragma keeps from writing.
+
+    try:
+        connection = sqlite3.connect("file:%s?mode=ro" % dbfilename,
+            uri = True)
+    except TypeError:
+        connection = sqlite3.connect(dbfilename)
+
+    connection.execute("PRAGMA query_only = true;")
+
+    return connection
+
+###
+
+def connectShards(dbfilename, start = None, end = None, copy = False):
+
+  # Given a string "dbfilename" indicating the path to the main database file,
+  # and optionally the UNIX times "start" and "end", this function returns a
+  # `Connection` object which reads every shard that overlaps [start, end)
+  # along with the main database, through the temporary views or tables that
+  # `attachShards` or `copyShards` put in place of each table in
+  # SHARDED_TABLES. The "active", "blocked", and "eligible" views are
+  # recreated on top of them. Note that rows outside of the range may still be
+  # returned, because whole months are attached, so queries should keep their
+  # own bounds. Every file is opened with `connectReadOnly`. If more shards
+  # overlap the range than SQLite can attach, it raises an exception, unless
+  # "copy" is True, in which case `copyShards` copies them all instead.
+
+    connection = connectReadOnly(dbfilename)
+    uri = (sys.version_info >= (3, 4))
+
+    months = []
+    for month in listShards(os.path.dirname(dbfilename)):
+        (lower, upper) = monthBounds(month)
+        if start is not None and upper <= start:
+            continue
+        if end is not None and lower >= end:
+            continue
+        months.append(month)
+
+    if len(months) == 0:
+        return connection
+
+  # A copy of years of samples takes a long time and a lot of room, and
+  # "launch-all.bash" runs dozens of programs at once, so it is never made
+  # unless it is asked for.
+
+    limit = attachLimit(connection)
+    if len(months) > limit and not copy:
+        connection.close()
+        raise Exception("%d monthly shards overlap the range, but SQLite can "
+            "only attach %d at once. Pass a narrower range with \"start\" and "
+            "\"end\", or \"copy = True\" to copy the shards into temporary "
+            "tables." % (len(months), limit))
+
+  # The "query_only" pragma also keeps the temporary views and tables from
+  # being created, so it is lifted until they are in place. Nothing else runs
+  # on the connection in the meantime.
+
+    connection.execute("PRAGMA query_only = false;")
+
+    if len(months) > limit:
+        copyShards(connection, os.path.dirname(dbfilename), months, limit,
+            uri)
+    else:
+        attachShards(connection, os.path.dirname(dbfilename), months, uri)
+
+    cursor = connection.cursor()
+
+  # The views in the main database refer to the tables without naming a
+  # schema, and SQLite looks in the temporary schema first, so a temporary
+  # copy of each view reads from the views above instead.
+
+    for view in ["active", "blocked", "eligible"]:
+        cursor.execute("""
+            SELECT sql FROM main.sqlite_master
+                WHERE type = 'view' AND name = ?;
+            """, (view,))
+        row = cursor.fetchone()
+        if row is None:
+            continue
+        cursor.execute(re.sub(r"^CREATE\s+VIEW", "CREATE TEMP VIEW", row[0]))
+
+    connection.commit()
+    connection.execute("PRAGMA query_only = true;")
+
+    return connection
+
+###
+
+def copyShards(connection, data_dir, months, limit, uri):
+
+  # Given a `Connection` object, the path to the data directory, a list of
+  # month labels, the number of databases that SQLite can attach at once, and
+  # whether the connection can open URIs, this function shadows each table in
+  # SHARDED_TABLES with a temporary table that holds its rows from the main
+  # database and from the shard for each month. The shards are attached
+  # "limit" at a time, copied, and detached again. This is much slower than
+  # the views from `attachShards`, and the copies take up room wherever SQLite
+  # keeps temporary tables, but it works for any number of months.
+
+    cursor = connection.cursor()
+
+    for table in SHARDED_TABLES:
+        cursor.execute("CREATE TEMP TABLE %s AS SELECT * FROM main.%s;" %
+            (table, table))
+
+    for i in range(0, len(months), limit):
+        schemas = []
+        for month in months[i:i + limit]:
+            schema = "shard_" + month.replace("-", "_")
+            filename = shardFilename(data_dir, month)
+            if uri:
+                filename = "file:%s?mode=ro" % filename
+            cursor.execute("ATTACH DATABASE ? AS %s;" % schema, (filename,))
+            schemas.append(schema)
+        for table in SHARDED_TABLES:
+            for schema in schemas:
+                cursor.execute("INSERT INTO temp.%s SELECT * FROM %s.%s;" %
+                    (table, schema, table))
+
+      # A database cannot be detached while a transaction is open.
+
+        connection.commit()
+        for schema in schemas:
+            cursor.execute("DETACH DATABASE %s;" % schema)
+
+  # The copies are indexed the same way as the shards are, so that a job's
+  # samples can still be found without scanning all of them.
+
+    for table in SHARDED_TABLES:
+        if table.endswith("_samples"):
+            cursor.execute("CREATE INDEX temp.%s_jobkey ON %s (JobKey);" %
+                (table, table))
+
+    return
+
+###
+
+def listRanges(dbfilename):
+
+  # Given a string "dbfilename" indicating the path to the main database file,
+  # this function returns a list of (start, end) tuples of UNIX times, or None
+  # for an open end, which together cover all time without overlapping. Each
+  # range overlaps few enough shards for `connectShards` to attach them all.
+
+    connection = connectReadOnly(dbfilename)
+    limit = attachLimit(connection)
+    connection.close()
+
+    months = listShards(os.path.dirname(dbfilename))
+
+    bounds = [None]
+    for i in range(limit, len(months), limit):
+        bounds.append(monthBounds(months[i])[0])
+    bounds.append(None)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+###
+
+def listShards(data_dir):
+
+  # Given the path to the data directory, this function returns a sorted list
+  # of the month labels, such as "2018-07", of the shards it contains.
+
+    months = []
+    for name in os.listdir(data_dir):
+        match = re.match(r"^moab-data-(\d{4}-\d{2})\.sqlite$", name)
+        if match is not None:
+            months.append(match.group(1))
+
+    return sorted(months)
+
+###
+
+def main():
+
+  # Store current working directory.
+
+    cwd = os.getcwd()
+
+  # Find the data directory, where this script is running remotely at OLCF and
+  # locally on a personal laptop, for example.
+
+    if os.path.isdir("/lustre/atlas/proj-shared/csc108/data/moab/"):
+        data_dir = "/lustre/atlas/proj-shared/csc108/data/moab/"
+    elif os.path.isdir(os.path.join(cwd, "moab")):
+        data_dir = os.path.join(cwd, "moab")
+    else:
+        raise Exception("Data directory not found.")
+
+  # List each shard with the number of samples and the size of its file.
+
+    for month in listShards(data_dir):
+        filename = shardFilename(data_dir, month)
+        connection = connectReadOnly(filename)
+        num_samples = connection.execute("""
+            SELECT count(*) FROM cluster;
+            """).fetchone()[0]
+        connection.close()
+        print("%s: %d samples, %.1f MB" % (month, num_samples,
+            os.path.getsize(filename) / 1e6))
+
+###
+
+def monthBounds(month):
+
+  # Given a month label such as "2018-07", this function returns a tuple of the
+  # UNIX times of the start of that month and of the start of the next one.
+
+    (year, number) = [int(each) for each in month.split("-")]
+
+    start = calendar.timegm((year, number, 1, 0, 0, 0))
+    if number == 12:
+        end = calendar.timegm((year + 1, 1, 1, 0, 0, 0))
+    else:
+        end = calendar.timegm((year, number + 1, 1, 0, 0, 0))
+
+    return (start, end)
+
+###
+
+def shardFilename(data_dir, month):
+
+  # Given the path to the data directory and a month label, this function
+  # returns the path to that month's shard.
+
+    return os.path.join(data_dir, "moab-data-%s.sqlite" % month)
+
+###
+
+if __name__ == "__main__":
+    main()
+
+#-  vim:set syntax=python:
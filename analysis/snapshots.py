@@ -0,0 +1,107 @@
+#-  Python 3 source code
+
+#-  snapshots.py ~~
+#
+#   When "from-xml-to-sqlite.py" runs with "--delta", the job rows of each new
+#   `showq` sample are not stored one by one. Each sample is numbered in the
+#   "showq_snapshots" table instead, and each job's consecutive samples in the
+#   same queue are stored as a single row of "active_runs", "blocked_runs", or
+#   "eligible_runs", for as long as its attributes stay the same or grow along
+#   a straight line. The "active", "blocked", and "eligible" views expand the
+#   runs back into rows, so existing queries work unchanged. This program
+#   provides a function for the analysis programs which returns the full state
+#   of the queues at any one sample, however it was stored:
+#
+#       import snapshots
+#       state = snapshots.queueState(connection, sampleid)
+#
+#   Run on its own, this program shows how many rows the runs stand for, and
+#   how many rows are still stored one by one.
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import os
+import shards
+
+###
+
+def main():
+
+  # Store current working directory.
+
+    cwd = os.getcwd()
+
+  # Find the data directory, where this script is running remotely at OLCF and
+  # locally on a personal laptop, for example.
+
+    if os.path.isdir("/lustre/atlas/proj-shared/csc108/data/moab/"):
+        data_dir = "/lustre/atlas/proj-shared/csc108/data/moab/"
+    elif os.path.isdir(os.path.join(cwd, "moab")):
+        data_dir = os.path.join(cwd, "moab")
+    else:
+        raise Exception("Data directory not found.")
+
+    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
+
+    connection = shards.connectShards(dbfilename)
+    connection.execute("PRAGMA query_only = true;")
+
+    if connection.execute("""
+            SELECT name FROM sqlite_master WHERE name = 'showq_snapshots';
+            """).fetchone() is None:
+        print("This database has no snapshots yet.")
+        connection.close()
+        return
+
+    num_snapshots = connection.execute("""
+        SELECT count(*) FROM showq_snapshots;
+        """).fetchone()[0]
+    print("%d samples stored as snapshots" % num_snapshots)
+
+  # For each queue, count the runs, the rows which they stand for, and the
+  # rows which are stored one by one, because they came from samples that
+  # were imported without "--delta" or out of order.
+
+    for queue in ["active", "blocked", "eligible"]:
+        (num_runs, num_rows) = connection.execute("""
+            SELECT  count(DISTINCT r.rowid), count(p.Sequence)
+                FROM %s_runs AS r
+                INNER JOIN showq_snapshots AS p
+                    ON p.Sequence >= r.FirstSequence
+                        AND (r.LastSequence IS NULL
+                            OR p.Sequence <= r.LastSequence)
+            ;
+            """ % queue).fetchone()
+        num_samples = connection.execute("""
+            SELECT count(*) FROM %s_samples;
+            """ % queue).fetchone()[0]
+        print("%s: %d runs stand for %d rows (%.1f rows per run), and %d "
+            "rows are stored one by one" % (queue, num_runs, num_rows,
+            float(num_rows) / max(num_runs, 1), num_samples))
+
+    connection.close()
+
+###
+
+def queueState(connection, sampleid):
+
+  # Given a `Connection` object and a SampleID, this function returns a
+  # dictionary which maps "active", "blocked", and "eligible" to lists of the
+  # rows of that queue in that sample, with the same columns as the views of
+  # the same names. The rows come from the views, so they are the same whether
+  # the sample was stored as a snapshot or one row at a time.
+
+    state = {}
+    for queue in ["active", "blocked", "eligible"]:
+        state[queue] = connection.execute("""
+            SELECT * FROM %s WHERE SampleID = ?;
+            """ % queue, (sampleid,)).fetchall()
+
+    return state
+
+###
+
+if __name__ == "__main__":
+    main()
+
+#-  vim:set syntax=python:
@@ -13,10 +13,13 @@
 #   script will be used to create "delta" tarballs periodically so that the
 #   entire contents of the SQLite database may be reconstructed by
 #   decompressing and importing the data stored in each of the individual
-#   tarballs.
+#   tarballs. The tarballs do not need to be decompressed by hand, though,
+#   because "from-xml-to-sqlite.py" will stream them directly:
+#
+#       $ python2 from-xml-to-sqlite.py ${HOME}/delta-*.tar.gz
 #
 #                                                       ~~ (c) SRW, 10 Sep 2018
-#                                                   ~~ last updated 11 Sep 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 #-  Define variables that represent directories where the data are being
 #   collected and where the data will be relocated.
@@ -0,0 +1,271 @@
+#-  Python 2.6 source code (also tested with 2.7)
+
+#-  benchmark-ingest.py ~~
+#
+#   This program measures how fast "from-xml-to-sqlite.py" imports data,
+#   without needing access to the real data on Lustre. For each scale, it
+#   writes a synthetic data directory with "generate-xml-data.py", imports it
+#   into a new database using the same functions as the real program, and
+#   reports the time spent in each phase separately:
+#
+#       discover    listing the data directories and checking the manifest
+#       parse       reading the XML files into rows
+#       insert      writing the rows to SQLite and committing
+#       rescan      discovering again afterwards, when nothing is new, which
+#                   is what every nightly run pays for all of history
+#
+#   A scale of 1 is one day of samples, one every 5 minutes, at the default
+#   size of the queues in "generate-xml-data.py", so the default scales of 1,
+#   10, and 100 correspond to a day, about a week and a half, and about three
+#   months of collection. The largest takes a while and needs tens of GB: on
+#   one core, it took about 15 minutes to write 24 GB of XML and another 30 to
+#   import them into a 4.3 GB database. To leave it out, use
+#
+#       $ python2 benchmark-ingest.py --scales=1,10 --work-dir=/tmp/bench
+#
+#   With "--work-dir", the synthetic data are kept and reused by later runs
+#   with the same settings, so that a change to the import can be compared
+#   before and after on exactly the same files.
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import json
+import multiprocessing
+import optparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+###
+
+# The number of samples in one day, which is a scale of 1.
+
+SAMPLES_PER_DAY = 288
+
+###
+
+def benchmarkIngest(ingest, data_dir, batch_size, processes, delta=False):
+
+  # Given the "from-xml-to-sqlite.py" module, the path to a data directory,
+  # the number of samples per transaction, the number of worker processes, and
+  # whether to store `showq` samples as snapshots and runs, this function
+  # imports the data directory into a new "moab-data.sqlite" in
+  # the same way as the real program does, and it returns a dictionary of the
+  # time spent in each phase, in seconds, along with the numbers of samples,
+  # rows, and bytes of XML that were imported and the size of the database.
+
+    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
+    for suffix in ["", "-shm", "-wal"]:
+        if os.path.isfile(dbfilename + suffix):
+            os.remove(dbfilename + suffix)
+
+    connection = sqlite3.connect(dbfilename)
+    connection.row_factory = sqlite3.Row
+    ingest.setJournalMode(connection, "main", "delete")
+    ingest.initializeDatabase(connection)
+    ingest.loadCompleted(connection)
+
+    results = {
+        "bytes": 0,
+        "discover": 0.0,
+        "insert": 0.0,
+        "parse": 0.0,
+        "rescan": 0.0,
+        "rows": 0,
+        "samples": 0
+    }
+
+    started = time.time()
+    uuids = ingest.findNewUUIDs(connection, data_dir)
+    if delta:
+        uuids = ingest.sortSamples(data_dir, uuids)
+    results["discover"] = time.time() - started
+
+  # The parsing and the writing take turns, just as they do in the real
+  # program, so each is timed on its own. With a pool, the time spent parsing
+  # is the time spent waiting for the workers to hand over the next sample.
+
+    tasks = [(data_dir, sampleid) for sampleid in uuids]
+
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, ingest.initializeWorker,
+            (ingest.KNOWN_COMPLETED,))
+        samples = pool.imap(ingest.parseSample, tasks, 4)
+    else:
+        samples = (ingest.parseSample(task) for task in tasks)
+
+    batch = ingest.newBatch()
+    while True:
+        started = time.time()
+        try:
+            sample = next(samples)
+        except StopIteration:
+            sample = None
+        if sample is not None:
+            ingest.mergeBatch(batch, sample)
+            results["samples"] += 1
+            for row in sample["manifest"]:
+                results["bytes"] += row[2]
+        results["parse"] += time.time() - started
+        if sample is None or results["samples"] % batch_size == 0:
+            started = time.time()
+            results["rows"] += ingest.writeBatch(connection, batch, None,
+                None, delta)
+            results["insert"] += time.time() - started
+            batch = ingest.newBatch()
+        if sample is None:
+            break
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    started = time.time()
+    ingest.checkpointDatabase(connection)
+    results["insert"] += time.time() - started
+
+    started = time.time()
+    if len(ingest.findNewUUIDs(connection, data_dir)) != 0:
+        raise Exception("Some samples in %s were not imported." % data_dir)
+    results["rescan"] = time.time() - started
+
+    connection.close()
+
+    results["db_size"] = os.path.getsize(dbfilename)
+
+    return results
+
+###
+
+def loadModule(name, filename):
+
+  # Given a module name and the path to a Python file, this function imports
+  # that file as a module under that name and returns it. The programs in
+  # this directory have hyphens in their names, so they cannot be imported
+  # with an ordinary `import` statement. The module is also registered in
+  # `sys.modules`, so that worker processes can find its functions.
+
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(name, filename)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    except ImportError:
+        import imp
+        module = imp.load_source(name, filename)
+
+    return module
+
+###
+
+def main():
+
+  # This is the first function that will execute.
+
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-b", "--batch-size", dest="batch_size", type="int",
+        default=100, help="number of samples to import per transaction "
+        "[default: %default]")
+    parser.add_option("-c", "--completed", dest="num_completed", type="int",
+        default=1000, help="number of jobs listed by `showq -c` in each "
+        "sample [default: %default]")
+    parser.add_option("-d", "--delta", dest="delta", action="store_true",
+        default=False, help="import with \"--delta\", as snapshots and runs")
+    parser.add_option("-e", "--error-rate", dest="error_rate", type="float",
+        default=0.01, help="fraction of commands that fail "
+        "[default: %default]")
+    parser.add_option("-j", "--jobs", dest="num_jobs", type="int",
+        default=1000, help="number of jobs in the queue in each sample "
+        "[default: %default]")
+    parser.add_option("-p", "--processes", dest="processes", type="int",
+        default=1, help="number of worker processes for parsing XML "
+        "[default: %default]")
+    parser.add_option("-s", "--scales", dest="scales", default="1,10,100",
+        help="comma-separated multiples of one day of samples "
+        "[default: %default]")
+    parser.add_option("-w", "--work-dir", dest="work_dir", default=None,
+        help="directory in which to keep the synthetic data between runs, "
+        "instead of a temporary one")
+
+    (options, args) = parser.parse_args()
+
+    try:
+        scales = [int(each) for each in options.scales.split(",")]
+    except ValueError:
+        parser.error("scales must be a comma-separated list of integers")
+    if options.batch_size < 1 or options.processes < 1:
+        parser.error("batch size and processes must be positive integers")
+    if min(scales) < 1:
+        parser.error("scales must be positive integers")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    generator = loadModule("generate_xml_data",
+        os.path.join(here, "generate-xml-data.py"))
+    ingest = loadModule("from_xml_to_sqlite",
+        os.path.join(here, "from-xml-to-sqlite.py"))
+
+    work_dir = options.work_dir
+    if work_dir is None:
+        work_dir = tempfile.mkdtemp(prefix="benchmark-ingest-")
+
+    print("SQLite %s, Python %s, batch size %d, %d processes" %
+        (sqlite3.sqlite_version, sys.version.split()[0], options.batch_size,
+        options.processes))
+    print("%5s %8s %9s %10s %9s %9s %9s %9s %10s %9s" % ("scale", "samples",
+        "XML MB", "rows", "discover", "parse", "insert", "rescan", "rows/sec",
+        "DB MB"))
+
+    try:
+        for scale in scales:
+
+          # The synthetic data for each scale go into their own directory,
+          # and they are only written again if the settings have changed.
+
+            settings = {
+                "error_rate": options.error_rate,
+                "num_completed": options.num_completed,
+                "num_jobs": options.num_jobs,
+                "num_samples": scale * SAMPLES_PER_DAY
+            }
+            data_dir = os.path.join(work_dir, "scale-%d" % scale)
+            settings_file = os.path.join(data_dir, "settings.json")
+            previous = None
+            if os.path.isfile(settings_file):
+                with open(settings_file) as f:
+                    previous = json.load(f)
+            if previous != settings:
+                if os.path.isdir(data_dir):
+                    shutil.rmtree(data_dir)
+                generator.generateCorpus(data_dir, settings["num_samples"],
+                    options.num_jobs, options.num_completed,
+                    options.error_rate)
+                with open(settings_file, "w") as f:
+                    json.dump(settings, f, sort_keys=True)
+
+            results = benchmarkIngest(ingest, data_dir, options.batch_size,
+                options.processes, options.delta)
+
+            total = results["parse"] + results["insert"]
+            print("%5d %8d %9.1f %10d %8.2fs %8.2fs %8.2fs %8.2fs %10.0f "
+                "%9.1f" % (scale, results["samples"], results["bytes"] / 1e6,
+                results["rows"], results["discover"], results["parse"],
+                results["insert"], results["rescan"],
+                results["rows"] / max(total, 1e-6),
+                results["db_size"] / 1e6))
+            sys.stdout.flush()
+
+    finally:
+        if options.work_dir is None:
+            shutil.rmtree(work_dir)
+
+###
+
+if __name__ == "__main__":
+    main()
+
+#-  vim:set syntax=python:
@@ -0,0 +1,218 @@
+#-  Python 2.6 source code (also tested with 2.7)
+
+#-  benchmark-xml.py ~~
+#
+#   This program compares the two ways that "from-xml-to-sqlite.py" can read
+#   the XML files: `iterExpat`, which drives expat directly and is what the
+#   real program uses, and `iterXML`, which goes through ElementTree and is
+#   what it falls back on when expat is not available. Each file is parsed
+#   into rows several times with each of them, exactly as an import would do
+#   it, and the best time is reported. The rows from the two are compared, so
+#   this also checks the fast path against ElementTree, and the program exits
+#   with a status of 1 if they differ in any way.
+#
+#   Without arguments, it runs the simulation from "generate-xml-data.py" until
+#   `showq -c` lists as many jobs as requested, which takes a few seconds, and
+#   it benchmarks one large `showq` and one large `showq -c` file from the end:
+#
+#       $ python2 benchmark-xml.py --jobs=20000 --completed=20000
+#
+#   It can also be given "-out.xml" files from a data directory, and the
+#   command for each one is taken from the name of its directory:
+#
+#       $ python2 benchmark-xml.py moab/showq/*-out.xml moab/showqc/*-out.xml
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import optparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+###
+
+def benchmarkFile(ingest, command, filename, repeat):
+
+  # Given the "from-xml-to-sqlite.py" module, the name of the command that
+  # wrote a file, such as "showq", the path to the file, and the number of
+  # times to parse it, this function parses the file into a new batch with
+  # each of the two generators in turn. It returns a dictionary which maps the
+  # name of each generator to a tuple of its best time in seconds and the
+  # batch that it produced.
+
+    parsers = {
+        "showbf": ingest.showbfXMLtoRows,
+        "showq": ingest.showqXMLtoRows,
+        "showqc": ingest.showqcXMLtoRows
+    }
+
+    results = {}
+
+    for (name, generator) in [("expat", ingest.iterExpat),
+            ("etree", ingest.iterXML)]:
+        best = None
+        for i in range(repeat):
+
+          # The completed jobs seen by one parse would be skipped by the next,
+          # so the set is emptied every time to parse the whole file.
+
+            ingest.KNOWN_COMPLETED.clear()
+            batch = ingest.newBatch()
+            started = time.time()
+            parsers[command](batch, {
+                "errtext": None,
+                "events": generator(filename),
+                "SampleID": os.path.basename(filename)[:-8]
+            })
+            elapsed = time.time() - started
+            if best is None or elapsed < best:
+                best = elapsed
+        results[name] = (best, batch)
+
+    return results
+
+###
+
+def loadModule(name, filename):
+
+  # Given a module name and the path to a Python file, this function imports
+  # that file as a module under that name and returns it. The programs in
+  # this directory have hyphens in their names, so they cannot be imported
+  # with an ordinary `import` statement.
+
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(name, filename)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    except ImportError:
+        import imp
+        module = imp.load_source(name, filename)
+
+    return module
+
+###
+
+def main():
+
+  # This is the first function that will execute.
+
+    parser = optparse.OptionParser(usage="%prog [options] [files]")
+    parser.add_option("-c", "--completed", dest="num_completed", type="int",
+        default=10000, help="number of jobs listed by `showq -c` in the "
+        "simulated files [default: %default]")
+    parser.add_option("-j", "--jobs", dest="num_jobs", type="int",
+        default=10000, help="number of jobs in the queue in the simulated "
+        "files [default: %default]")
+    parser.add_option("-r", "--repeat", dest="repeat", type="int", default=5,
+        help="number of times to parse each file [default: %default]")
+
+    (options, args) = parser.parse_args()
+
+    if options.num_completed < 1 or options.num_jobs < 1 \
+            or options.repeat < 1:
+        parser.error("jobs, completed, and repeat must be positive integers")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    ingest = loadModule("from_xml_to_sqlite",
+        os.path.join(here, "from-xml-to-sqlite.py"))
+
+    if ingest.expat is None:
+        raise Exception("The expat module is not available.")
+
+    work_dir = None
+    if len(args) == 0:
+        work_dir = tempfile.mkdtemp(prefix="benchmark-xml-")
+        generator = loadModule("generate_xml_data",
+            os.path.join(here, "generate-xml-data.py"))
+        files = simulateFiles(generator, work_dir, options.num_jobs,
+            options.num_completed)
+    else:
+        files = []
+        for filename in args:
+            command = os.path.basename(os.path.dirname(
+                os.path.abspath(filename)))
+            if command not in ["showbf", "showq", "showqc"]:
+                parser.error("cannot tell which command wrote %s" % filename)
+            if ingest.readXML(filename)["events"] is None:
+                continue
+            files.append((command, filename))
+
+    print("Python %s, %s, best of %d" % (sys.version.split()[0],
+        ingest.expat.EXPAT_VERSION, options.repeat))
+    print("%-7s %9s %9s %9s %9s %10s %10s %8s" % ("command", "XML MB", "rows",
+        "etree", "expat", "etree MB/s", "expat MB/s", "speedup"))
+
+    different = 0
+
+    try:
+        for (command, filename) in files:
+            results = benchmarkFile(ingest, command, filename,
+                options.repeat)
+            size = os.path.getsize(filename) / 1e6
+            batch = results["expat"][1]
+            num_rows = 0
+            for table in ["active", "backfill", "blocked", "completed",
+                    "eligible"]:
+                num_rows += len(batch[table])
+            etree = max(results["etree"][0], 1e-6)
+            expat = max(results["expat"][0], 1e-6)
+            print("%-7s %9.1f %9d %8.3fs %8.3fs %10.1f %10.1f %7.2fx" %
+                (command, size, num_rows, etree, expat, size / etree,
+                size / expat, etree / expat))
+            if results["etree"][1] != batch:
+                print("    the rows from expat and ElementTree differ in %s" %
+                    filename)
+                different += 1
+            sys.stdout.flush()
+
+    finally:
+        if work_dir is not None:
+            shutil.rmtree(work_dir)
+
+    if different > 0:
+        sys.exit(1)
+
+###
+
+def simulateFiles(generator, out_dir, num_jobs, num_completed):
+
+  # Given the "generate-xml-data.py" module, the path to a directory, the
+  # number of jobs to keep in the queue, and the number of completed jobs to
+  # wait for, this function runs the simulation an hour at a time until
+  # `showq -c` would list that many jobs. It writes the `showq` and `showq -c`
+  # output at that point into the directory, and it returns a list of tuples
+  # of the name of each command and the path to its file.
+
+    rng = random.Random(0)
+    state = {
+        "completed": [],
+        "next_id": 3000000,
+        "queued": []
+    }
+
+    now = 1530403200
+    while len(state["completed"]) < num_completed:
+        generator.stepQueue(state, now, num_jobs, num_completed, rng)
+        now += 3600
+
+    files = []
+    for (command, text) in [("showq", generator.showqXML(state, now)),
+            ("showqc", generator.showqcXML(state, now))]:
+        filename = os.path.join(out_dir, command + "-out.xml")
+        with open(filename, "w") as f:
+            f.write(text)
+        files.append((command, filename))
+
+    return files
+
+###
+
+if __name__ == "__main__":
+    main()
+
+#-  vim:set syntax=python:
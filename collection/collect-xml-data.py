@@ -10,16 +10,784 @@
 #
 #   with subdirectories to store the XML files.
 #
+#   The three queries run at the same time, and the program waits for all of
+#   them. Each one is killed if it takes longer than TIMEOUT seconds, and it is
+#   tried again, up to RETRIES more times, if it is killed or if it fails, so
+#   that a hung MOAB server can no longer leave processes piling up from one
+#   cron job to the next. When the last attempt is killed, its output, which
+#   stops part of the way through, is left empty, just like that of a query
+#   that failed, and the error file says why. How long each query took, how
+#   it exited, and how many bytes it wrote are appended as one line of JSON
+#   per sample to
+#
+#       /lustre/atlas/proj-shared/csc108/data/moab/collect-xml-data.log
+#
+#   and the time that the whole sample took is the longest of the three.
+#
+#   Instead of running from cron, the program can also stay up as a daemon,
+#   which samples every 5 minutes by default but adapts to the queue. After
+#   each sample, it compares the jobs in `showq` with the ones from the sample
+#   before. While many of them are arriving, leaving, or moving between queues,
+#   it samples twice as often, down to "--min-interval", and while the queue
+#   hardly changes, it samples half as often, up to "--max-interval":
+#
+#       $ python2 collect-xml-data.py --daemon --interval=300 &
+#
+#   Each line of the log then also records how much the queue changed and how
+#   long the daemon waited before the next sample.
+#
+#   With "--segments", in either mode, the six files of each sample are not
+#   left in the "showbf", "showq", and "showqc" directories. The commands write
+#   them to a temporary directory on local disk instead, and then they are
+#   appended to one segment file per hour under "segments", e.g.
+#
+#       /lustre/atlas/proj-shared/csc108/data/moab/segments/2018-07-01-13.seg
+#
+#   Each file is framed by a line which holds its SampleID, the time the sample
+#   was started, the command, "out" or "err", and the number of bytes, and it
+#   is followed by a newline. The same line, with the offset of the frame
+#   inserted before the length, goes into an index next to the segment, e.g.
+#   "2018-07-01-13.idx", which is written last and all at once, so that a
+#   sample is in the index completely or not at all. Lustre then has a couple
+#   of files per hour to keep track of instead of more than a hundred, and
+#   "from-xml-to-sqlite.py" reads each segment from start to end.
+#
+#   MOAB's XML repeats the same attribute names for every job, so it shrinks
+#   several times over when it is compressed. With "--compress=gzip" or
+#   "--compress=zstd", the output of each command is piped through `gzip` or
+#   `zstd` on its way to disk, and it is never written to Lustre uncompressed.
+#   The files keep their names, and "from-xml-to-sqlite.py" recognizes the
+#   compressed ones by their first few bytes, so both kinds can be mixed in one
+#   directory, segment, or tarball. The error files are tiny, and they stay as
+#   plain text. The number of bytes in the log is the number on disk.
+#
+#   Without "--blocking", MOAB answers from its cache, and `showq -c` often
+#   returns exactly what it returned the sample before, apart from the time in
+#   its `<cluster>` element. Its output is hashed without that time, and when
+#   the hash matches the one from the last sample, the output is replaced by
+#   a tiny document that carries the new time and a reference to the sample
+#   which holds the output in full, e.g.
+#
+#       <Data><Object>queue</Object><cluster time="1530489600"></cluster>
+#       <reference SampleID="..." sha1="..."></reference></Data>
+#
+#   all on one line. The hash and the SampleID of the last output are kept in
+#   "collect-xml-data.state" between samples, and the log records which sample
+#   each reference points to.
+#
 #                                                       ~~ (c) SRW, 06 Jun 2018
-#                                                   ~~ last updated 23 Jul 2018
+#                                                   ~~ last updated 18 Oct 2026
 
+import fcntl
+import hashlib
+import json
+import optparse
 import os
+import re
+import shutil
+import signal
 import subprocess
+import tempfile
+import time
 import uuid
 
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+from xml.parsers import expat
+
+###
+
+# The directory on Lustre where the data are stored.
+
+DATA_DIR = "/lustre/atlas/proj-shared/csc108/data/moab"
+
+# The number of seconds that one attempt at a query may take before it is
+# killed, the number of times that a query is tried again after it fails or
+# is killed, and the number of seconds to wait before trying again. Even in
+# the worst case, a sample finishes well within the 5 minutes between cron
+# jobs.
+
+TIMEOUT = 60
+
+RETRIES = 2
+
+RETRY_DELAY = 5
+
+# The number of seconds between checks on the running queries.
+
+POLL_INTERVAL = 0.1
+
+# The queries that make up a sample, by the name of the directory that their
+# output goes into.
+#
+# The "-p titan" returns the values for the "titan" partition only. Note that
+# there is also a "--blocking" flag which fetches fresh (non-cached) data, but
+# that I have elected not to use it, due to the fact that 10% of my queries on
+# the first day of using it failed due to "resources unavailable" errors. The
+# previous day, when I used cached data, I had zero errors. Since we are only
+# sampling every 5 minutes anyway, there is no reason to worry about stale
+# query results. The "--blocking" flag is extremely important for the
+# operation of BigPanDA but not for gathering data about MOAB. The flags used
+# for "showq" are the same as for "showbf".
+#
+# Update: post-mortem data is available in the completed queue, so we will
+# start recording that, too, and we will process it later. We use the exact
+# same strategy to capture this data as we have used previously.
+#
+# This part is experimental. There's nothing wrong with collecting data before
+# it is known for certain that it will be needed, but for now, I will leave
+# "mjobctl" as a comment. It would only take one more entry:
+#
+#     ("mjobctl", ["mjobctl", "-q", "diag", "ALL", "--format=xml"])
+#
+# Read more here:
+#
+#     http://docs.adaptivecomputing.com/maui/commands/mjobctl.php
+
+COMMANDS = [
+    ("showbf", ["showbf", "--format=xml", "-p", "titan"]),
+    ("showq", ["showq", "--format=xml", "-p", "titan"]),
+    ("showqc", ["showq", "-c", "-p", "titan", "--format=xml"])
+]
+
+# The programs which can compress the output of the commands, by the name
+# given to "--compress". Each one reads from stdin and writes to stdout, and
+# adding "-d" and a filename decompresses that file to stdout instead.
+
+COMPRESSORS = {
+    "gzip": ["gzip", "-c"],
+    "zstd": ["zstd", "-q", "-c"]
+}
+
+# The commands whose output is replaced by a reference when it has not changed
+# since the last sample. The completed jobs in `showq -c` belong to no sample
+# in particular, so an unchanged copy adds nothing and is not needed at all to
+# import the sample. The ranges in `showbf` are rows of the sample, and they
+# would have to be found again in the full copy, which may already have been
+# archived, so it is not included, and `showq` changes with every sample.
+
+DEDUPLICATED = ["showqc"]
+
+# The `time` attribute of the `<cluster>` element, which is left out of the
+# hash, and the number of bytes of output to read at once while hashing. The
+# `<cluster>` element always comes first, well within the first chunk.
+
+TIME_PATTERN = re.compile(b'<cluster\\b[^>]*?( time="([0-9]+)")')
+
+HASH_CHUNK_SIZE = 65536
+
+REFERENCE = '<Data><Object>queue</Object><cluster time="%s"></cluster>' \
+    '<reference SampleID="%s" sha1="%s"></reference></Data>\n'
+
+# In daemon mode, the fraction of the jobs in `showq` that arrive, leave, or
+# move to another queue from one sample to the next decides how soon the next
+# sample is taken. It is scaled to what it would be over the base interval,
+# so that sampling more often does not make the queue look calmer than it is.
+# At or above BUSY_CHURN, the interval is halved, at or below IDLE_CHURN, it is
+# doubled, and in between, it moves back towards the base interval.
+
+BUSY_CHURN = 0.05
+
+IDLE_CHURN = 0.005
+
+###
+
+def appendSegment(out_dir, record):
+
+  # Given the directory that a sample was written to and the dictionary from
+  # `sample` which describes it, this function appends the sample's files to
+  # the segment for the hour in which the sample was started, then adds them
+  # to the segment's index, and then removes the files.
+
+    name = time.strftime("%Y-%m-%d-%H", time.gmtime(record["started"]))
+    segfilename = os.path.join(DATA_DIR, "segments", name + ".seg")
+
+  # The index is locked while the sample is appended, in case two collectors
+  # ever run at once. Lustre only supports locks when it is mounted with the
+  # "flock" option, but the timeouts keep runs from overlapping anyway.
+
+    index = open(segfilename[:-4] + ".idx", "a+b")
+    try:
+        fcntl.flock(index.fileno(), fcntl.LOCK_EX)
+    except IOError:
+        pass
+
+    try:
+
+        lines = []
+        filenames = []
+
+        with open(segfilename, "ab") as segment:
+            segment.seek(0, os.SEEK_END)
+            offset = segment.tell()
+            for (command, args) in COMMANDS:
+                for stream in ["out", "err"]:
+                    filename = os.path.join(out_dir, command,
+                        "%s-%s.xml" % (record["SampleID"], stream))
+                    with open(filename, "rb") as f:
+                        data = f.read()
+                    header = "%s %.3f %s %s" % (record["SampleID"],
+                        record["started"], command, stream)
+                    frame = ("%s %d\n" % (header, len(data))).encode()
+                    segment.write(frame)
+                    segment.write(data)
+                    segment.write(b"\n")
+                    lines.append("%s %d %d\n" % (header, offset, len(data)))
+                    offset += len(frame) + len(data) + 1
+                    filenames.append(filename)
+            segment.flush()
+            os.fsync(segment.fileno())
+
+      # A collector that was killed while it wrote to the index may have left
+      # part of a line, which has to be ended before the next line starts.
+
+        index.seek(0, os.SEEK_END)
+        if index.tell() > 0:
+            index.seek(-1, os.SEEK_END)
+            if index.read(1) != b"\n":
+                lines.insert(0, "\n")
+        index.seek(0, os.SEEK_END)
+        index.write("".join(lines).encode())
+        index.flush()
+        os.fsync(index.fileno())
+
+    finally:
+        index.close()
+
+    for filename in filenames:
+        os.remove(filename)
+
+    return
+
+###
+
+def chooseInterval(interval, base, minimum, maximum, churn):
+
+  # Given the number of seconds that the daemon waited before the last sample,
+  # the base, minimum, and maximum intervals, and the churn of the queue from
+  # `measureChurn`, scaled to the base interval, this function returns the
+  # number of seconds to wait before the next sample. An unknown churn, when a
+  # `showq` failed, counts as a normal one.
+
+    if churn is not None and churn >= BUSY_CHURN:
+        interval = interval / 2.0
+    elif churn is not None and churn <= IDLE_CHURN:
+        interval = interval * 2.0
+    elif interval < base:
+        interval = min(interval * 2.0, base)
+    elif interval > base:
+        interval = max(interval / 2.0, base)
+
+    return min(max(interval, minimum), maximum)
+
+###
+
+def hashOutput(filename, compress):
+
+  # Given the path to the output of a command and the name of the compressor
+  # that wrote it, or None, this function returns a tuple of the time in the
+  # output's `<cluster>` element and the SHA-1 of the output without that
+  # attribute, or None if the output has no such time. A compressed file is
+  # read through its compressor, and the output is hashed a chunk at a time,
+  # because `showq -c` output can be large.
+
+    process = None
+    if compress is None:
+        xmlfile = open(filename, "rb")
+    else:
+        process = subprocess.Popen(COMPRESSORS[compress] + ["-d", filename],
+            stdout=subprocess.PIPE)
+        xmlfile = process.stdout
+
+    result = None
+
+    try:
+        chunk = xmlfile.read(HASH_CHUNK_SIZE)
+        match = TIME_PATTERN.search(chunk)
+        if match is not None:
+            digest = hashlib.sha1(chunk[:match.start(1)])
+            digest.update(chunk[match.end(1):])
+            chunk = xmlfile.read(HASH_CHUNK_SIZE)
+            while len(chunk) > 0:
+                digest.update(chunk)
+                chunk = xmlfile.read(HASH_CHUNK_SIZE)
+            result = (match.group(2).decode(), digest.hexdigest())
+    finally:
+        xmlfile.close()
+        if process is not None:
+            process.wait()
+
+    return result
+
+###
+
+def killGroup(query):
+
+  # Given a "query" dictionary, as made by `runCommands`, this function kills
+  # the process group of the command of its current attempt, if it is still
+  # running, and waits for it to exit. The compressor, if there is one, is not
+  # killed but waited for, so that it can finish compressing whatever the
+  # command had written, just as the output of a command that is killed stays
+  # on disk when it is not compressed. A compressor that is still running
+  # after the command has exited is waiting on something that the command
+  # started and left behind, so the group is killed in that case, too.
+
+    process = query["process"]
+    compressor = query["compressor"]
+
+    if process is not None:
+        running = (process.poll() is None)
+        if compressor is not None and compressor.poll() is None:
+            running = True
+        if running:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            process.wait()
+
+    if compressor is not None:
+        compressor.wait()
+
+    return
+
+###
+
+def launchCommand(query, env):
+
+  # Given a "query" dictionary, as made by `runCommands`, and the environment
+  # variables for MOAB, this function starts a new attempt at the query, with
+  # its output going to the query's files, which are truncated first. Each
+  # command gets a session of its own, so that anything it starts can be
+  # killed along with it. If the command cannot even be started, the reason is
+  # written to the error file, just as MOAB's own errors would be, and the
+  # attempt is over at once.
+  #
+  # When the output is compressed, the compressor is started first, in a
+  # session of its own as well, and the command writes into its stdin. The
+  # compressor finishes by itself once the command exits or cannot be started.
+
+    query["attempts"] += 1
+    query["compressor"] = None
+    query["process"] = None
+    query["status"] = None
+    query["timed_out"] = False
+
+    with open(query["out"], "wb") as out:
+        with open(query["err"], "wb") as err:
+            stdout = out
+            try:
+                if query["compress"] is not None:
+                    program = COMPRESSORS[query["compress"]][0]
+                    query["compressor"] = subprocess.Popen(
+                        COMPRESSORS[query["compress"]],
+                        stdin=subprocess.PIPE, stdout=out, stderr=err,
+                        preexec_fn=os.setsid)
+                    stdout = query["compressor"].stdin
+                program = query["args"][0]
+                query["process"] = subprocess.Popen(query["args"],
+                    stdout=stdout, stderr=err, env=env, preexec_fn=os.setsid)
+            except OSError as e:
+                err.write(("ERROR:    cannot run %s: %s\n" %
+                    (program, e)).encode())
+            if query["compressor"] is not None:
+                query["compressor"].stdin.close()
+
+    query["launched"] = time.time()
+
+    return
+
+###
+
+def loadState():
+
+  # This function returns the dictionary that `saveState` last saved, which
+  # maps the name of each of the DEDUPLICATED commands to a dictionary of the
+  # hash of its last output and the SampleID of the sample which holds that
+  # output in full, or an empty dictionary if nothing has been saved yet.
+
+    try:
+        with open(os.path.join(DATA_DIR, "collect-xml-data.state")) as f:
+            return json.load(f)
+    except (EnvironmentError, ValueError):
+        return {}
+
+###
+
+def main():
+
+  # Initially, `sample` was separated from `main` only so that I could fake a
+  # cron-type functionality with the following loop:
+  #
+  #     import time
+  #     while True:
+  #         sample()
+  #         time.sleep(60)
+  #
+  # I had to do that in order to implement periodic sampling without cron
+  # because I didn't have privileges to run cron on a Titan login node and I
+  # didn't realize that setting environment variables would allow the DTNs to
+  # access the correct MOAB server. Now, this script is run as a cron job, or
+  # it stays up on its own with "--daemon", which is that same loop, except
+  # that it decides how long to sleep from how busy the queue is.
+
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option("-d", "--daemon", dest="daemon", action="store_true",
+        default=False, help="keep sampling instead of taking one sample")
+    parser.add_option("-i", "--interval", dest="interval", type="int",
+        default=300, help="seconds between samples in daemon mode when the "
+        "queue changes at a normal pace [default: %default]")
+    parser.add_option("-n", "--min-interval", dest="min_interval",
+        type="int", default=60, help="fewest seconds between samples "
+        "[default: %default]")
+    parser.add_option("-x", "--max-interval", dest="max_interval",
+        type="int", default=1200, help="most seconds between samples "
+        "[default: %default]")
+
+    parser.add_option("-s", "--segments", dest="segments",
+        action="store_true", default=False, help="append each sample to an "
+        "hourly segment file instead of leaving six files for it")
+    parser.add_option("-z", "--compress", dest="compress", type="choice",
+        choices=sorted(COMPRESSORS.keys()), default=None, help="compress "
+        "the output of each command with gzip or zstd as it is written")
+
+    (options, args) = parser.parse_args()
+
+    if len(args) > 0:
+        parser.error("no arguments are expected")
+    if not 0 < options.min_interval <= options.interval \
+            <= options.max_interval:
+        parser.error("intervals must be positive, and the base interval "
+            "must be between the minimum and the maximum")
+
+  # A compressor that is missing would otherwise only show up in the error
+  # files, after the output of every sample had been lost.
+
+    if options.compress is not None:
+        devnull = open(os.devnull, "wb")
+        try:
+            subprocess.call(COMPRESSORS[options.compress][:1] +
+                ["--version"], stdout=devnull, stderr=devnull)
+        except OSError:
+            parser.error("%s is not installed" % options.compress)
+        finally:
+            devnull.close()
+
+  # With segments, the files of each sample only live in a temporary
+  # directory on local disk until they have been appended.
+
+    out_dir = DATA_DIR
+    if options.segments:
+        out_dir = tempfile.mkdtemp(prefix="collect-xml-data-")
+
+    try:
+        makeDirectories(out_dir, options.segments)
+        if options.daemon:
+            runDaemon(options.interval, options.min_interval,
+                options.max_interval, out_dir, options.segments,
+                options.compress)
+        else:
+            record = sample(out_dir, options.compress)
+            if options.segments:
+                appendSegment(out_dir, record)
+            writeLog(record)
+    finally:
+        if options.segments:
+            shutil.rmtree(out_dir)
+
+    return
+
+###
+
+def makeDirectories(out_dir, segments):
+
+  # Create directories for storing the data, just in case they're not present
+  # when the script runs for the first time. A daemon only needs to do this
+  # once, instead of asking Lustre again before every sample. Given the
+  # directory that the commands write to, and whether samples are appended to
+  # segments, this function creates a directory for each command in the
+  # former, and the "segments" directory for the latter.
+
+    dirnames = []
+    for (name, args) in COMMANDS:
+        dirnames.append(os.path.join(out_dir, name))
+    if segments:
+        dirnames.append(os.path.join(DATA_DIR, "segments"))
+
+    for dirname in dirnames:
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+    return
+
+###
+
+def measureChurn(previous, current):
+
+  # Given two dictionaries from `readJobs`, for an earlier and a later sample,
+  # this function returns the fraction of the jobs which arrived, left, or
+  # moved to another queue in between, out of the jobs in the larger sample.
+
+    changes = 0
+    for jobid in current:
+        if previous.get(jobid) != current[jobid]:
+            changes += 1
+    for jobid in previous:
+        if jobid not in current:
+            changes += 1
+
+    return float(changes) / max(len(previous), len(current), 1)
+
+###
+
+def readJobs(filename, compress):
+
+  # Given the path to the output of `showq` and the name of the compressor
+  # that wrote it, or None, this function returns a dictionary which maps the
+  # JobID of each job to the queue it is in, such as "active" or "eligible",
+  # or None if the file cannot be read as XML, which is what happens when the
+  # command failed. A compressed file is read through its compressor.
+
+    jobs = {}
+    process = None
+
+    try:
+        source = filename
+        if compress is not None:
+            process = subprocess.Popen(COMPRESSORS[compress] +
+                ["-d", filename], stdout=subprocess.PIPE)
+            source = process.stdout
+        for (event, elem) in ElementTree.iterparse(source):
+            if elem.tag == "queue":
+                for job in elem:
+                    jobs[job.get("JobID")] = elem.get("option")
+                elem.clear()
+    except (EnvironmentError, SyntaxError, expat.ExpatError):
+        jobs = None
+
+    if process is not None:
+        process.stdout.close()
+        process.wait()
+
+    return jobs
+
+###
+
+def replaceUnchanged(files, results, compress, sampleid):
+
+  # Given the list of tuples that `sample` passed to `runCommands`, the
+  # dictionary that it returned, the name of the compressor, or None, and the
+  # SampleID, this function replaces the output of each of the DEDUPLICATED
+  # commands with a reference when it matches the last output, apart from its
+  # time, and it remembers the hash of every new output for the next sample.
+  # The reference is written as plain text, even with "--compress", and only
+  # if it is smaller than the output that it would replace.
+
+    state = loadState()
+    changed = False
+
+    for (name, args, outfilename, errfilename) in files:
+
+        if name not in DEDUPLICATED or results[name]["status"] != 0:
+            continue
+        hashed = hashOutput(outfilename, compress)
+        if hashed is None:
+            continue
+        (sampletime, sha1) = hashed
+
+        last = state.get(name)
+        if last is not None and last["sha1"] == sha1:
+            reference = (REFERENCE % (sampletime, last["SampleID"],
+                sha1)).encode()
+            if len(reference) < results[name]["out_bytes"]:
+                with open(outfilename, "wb") as out:
+                    out.write(reference)
+                results[name]["out_bytes"] = len(reference)
+                results[name]["reference"] = last["SampleID"]
+        else:
+            state[name] = {
+                "SampleID": sampleid,
+                "sha1": sha1
+            }
+            changed = True
+
+    if changed:
+        saveState(state)
+
+    return
+
+###
+
+def runCommands(commands, env, compress):
+
+  # Given a list of (name, arguments, output filename, error filename) tuples,
+  # the environment variables for MOAB, and the name of the compressor for the
+  # output, or None, this function runs all of the commands at the same time
+  # and waits until each one has either succeeded or run out of attempts.
+  # Every process that is started is waited for, even if it had to be killed,
+  # so that none are left behind. It returns a dictionary which maps each name
+  # to a dictionary of what happened to it.
+
+    queries = []
+    results = {}
+    waiting = {}
+
+    try:
+
+        for (name, args, outfilename, errfilename) in commands:
+            query = {
+                "args": args,
+                "attempts": 0,
+                "compress": compress,
+                "err": errfilename,
+                "name": name,
+                "out": outfilename,
+                "started": time.time()
+            }
+            launchCommand(query, env)
+            queries.append(query)
+
+        while len(results) < len(queries):
+
+            time.sleep(POLL_INTERVAL)
+            now = time.time()
+
+            for query in queries:
+
+                name = query["name"]
+                if name in results:
+                    continue
+
+              # A query that failed is started again once it has waited out
+              # the delay, and it is left alone until then.
+
+                if name in waiting:
+                    if now >= waiting[name]:
+                        del waiting[name]
+                        launchCommand(query, env)
+                    continue
+
+              # An attempt is not over until its compressor has finished, too,
+              # and a compressor that fails spoils an attempt that succeeded.
+
+                process = query["process"]
+                compressor = query["compressor"]
+                if process is not None:
+                    query["status"] = process.poll()
+                    if compressor is not None and compressor.poll() is None:
+                        query["status"] = None
+                    if query["status"] is None:
+                        if now - query["launched"] < TIMEOUT:
+                            continue
+                        killGroup(query)
+                        query["status"] = process.returncode
+                        query["timed_out"] = True
+                        with open(query["err"], "ab") as err:
+                            err.write(("ERROR:    killed after %d seconds\n"
+                                % TIMEOUT).encode())
+                if compressor is not None and compressor.wait() != 0 \
+                        and query["status"] == 0:
+                    query["status"] = compressor.returncode
+
+                if query["status"] != 0 and query["attempts"] <= RETRIES:
+                    waiting[name] = now + RETRY_DELAY
+                    continue
+
+              # The output of a command that was killed stops part of the way
+              # through, and it cannot be parsed, so it is thrown away after
+              # the last attempt. An empty output file is how a failed command
+              # is recognized, whether or not the output is compressed, and
+              # the error file says why.
+
+                if query["timed_out"]:
+                    open(query["out"], "wb").close()
+
+                results[name] = {
+                    "attempts": query["attempts"],
+                    "err_bytes": os.path.getsize(query["err"]),
+                    "out_bytes": os.path.getsize(query["out"]),
+                    "seconds": round(now - query["started"], 3),
+                    "status": query["status"],
+                    "timed_out": query["timed_out"]
+                }
+
+    finally:
+
+      # If the program is stopped part of the way through, whatever is still
+      # running is killed and waited for, so that nothing is left behind.
+
+        for query in queries:
+            killGroup(query)
+
+    return results
+
+###
+
+def runDaemon(base, minimum, maximum, out_dir, segments, compress):
+
+  # Given the base, minimum, and maximum number of seconds between samples, the
+  # directory for `sample` to write to, whether to append each sample to a
+  # segment, and the name of the compressor, or None, this function takes
+  # samples until it is stopped by SIGTERM or Ctrl-C. The interval is measured
+  # from the start of one sample to the start of the next, and a sample that
+  # takes longer than the interval is followed by the next one right away, so
+  # that samples never overlap.
+
+    def terminate(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    interval = base
+    previous = None
+
+    try:
+
+        while True:
+
+            record = sample(out_dir, compress)
+            jobs = readJobs(os.path.join(out_dir, "showq",
+                record["SampleID"] + "-out.xml"), compress)
+            if segments:
+                appendSegment(out_dir, record)
+
+          # The churn is only known when this sample and the one before it
+          # both have a readable `showq`.
+
+            churn = None
+            if jobs is not None and previous is not None:
+                elapsed = record["started"] - previous[0]
+                churn = measureChurn(previous[1], jobs) * base / \
+                    max(elapsed, 1)
+                record["churn"] = round(churn, 4)
+
+            if jobs is not None:
+                previous = (record["started"], jobs)
+
+            interval = chooseInterval(interval, base, minimum, maximum,
+                churn)
+            record["interval"] = interval
+            writeLog(record)
+
+            time.sleep(max(record["started"] + interval - time.time(), 0))
+
+    except KeyboardInterrupt:
+        pass
+
+    return
+
 ###
 
-def sample():
+def sample(out_dir, compress):
+
+  # Given the directory to write to and the name of the compressor for the
+  # output, or None, this function takes one sample, with the output of each
+  # command going into its own directory within it, and it returns a
+  # dictionary which describes how the sample went, to be written to the log
+  # by `writeLog`.
 
   # Set proper environment variables for getting MOAB data for Titan while the
   # script is running on a DTN (data transfer node), which has different
@@ -43,95 +811,59 @@ def sample():
 
     unique_hex = uuid.uuid4().hex
 
-  # Create directories for storing the data, just in case they're not present
-  # when the script runs for the first time.
-
-    showbf_dir = "/lustre/atlas/proj-shared/csc108/data/moab/showbf"
-    if not os.path.exists(showbf_dir):
-        os.makedirs(showbf_dir)
-
-    showq_dir = "/lustre/atlas/proj-shared/csc108/data/moab/showq"
-    if not os.path.exists(showq_dir):
-        os.makedirs(showq_dir)
-
-  # Capture stdout and stderr from "showbf" as XML files. The "-p titan"
-  # returns the values for the "titan" partition only. Note that there is also
-  # a "--blocking" flag which fetches fresh (non-cached) data, but that I have
-  # elected not to use it, due to the fact that 10% of my queries on the first
-  # day of using it failed due to "resources unavailable" errors. The previous
-  # day, when I used cached data, I had zero errors. Since we are only sampling
-  # every 5 minutes anyway, there is no reason to worry about stale query
-  # results. The "--blocking" flag is extremely important for the operation of
-  # BigPanDA but not for gathering data about MOAB.
-
-    showbf_out = os.path.join(showbf_dir, unique_hex + "-out.xml")
-    showbf_err = os.path.join(showbf_dir, unique_hex + "-err.xml")
-    with open(showbf_out, "wb") as out:
-        with open(showbf_err, "wb") as err:
-            subprocess.Popen(["showbf", "--format=xml", "-p", "titan"],
-                    stdout=out, stderr=err, env=env)
-
-  # Capture stdout and stderr from "showq" as XML files. The flags used here
-  # are the same as previously used for "showbf".
-
-    showq_out = os.path.join(showq_dir, unique_hex + "-out.xml")
-    showq_err = os.path.join(showq_dir, unique_hex + "-err.xml")
-    with open(showq_out, "wb") as out:
-        with open(showq_err, "wb") as err:
-            subprocess.Popen(["showq", "--format=xml", "-p", "titan"],
-                    stdout=out, stderr=err, env=env)
-
-  # This part is experimental. There's nothing wrong with collecting data
-  # before it is known for certain that it will be needed, but for now, I
-  # will leave all of this as comments. Read more here:
-  #
-  #     http://docs.adaptivecomputing.com/maui/commands/mjobctl.php
+  # Capture stdout and stderr from each of the COMMANDS as XML files.
 
-  # mjobctl_dir = "/lustre/atlas/proj-shared/csc108/data/moab/mjobctl"
-  # if not os.path.exists(mjobctl_dir):
-  #     os.makedirs(mjobctl_dir)
-  #
-  # mjobctl_out = os.path.join(mjobctl_dir, unique_hex + "-out.xml")
-  # mjobctl_err = os.path.join(mjobctl_dir, unique_hex + "-err.xml")
-  # with open(mjobctl_out, "wb") as out:
-  #     with open(mjobctl_err, "wb") as err:
-  #         subprocess.Popen(["mjobctl", "-q", "diag", "ALL", "--format=xml"],
-  #                 stdout=out, stderr=err, env=env)
+    files = []
+    for (name, args) in COMMANDS:
+        dirname = os.path.join(out_dir, name)
+        files.append((name, args,
+            os.path.join(dirname, unique_hex + "-out.xml"),
+            os.path.join(dirname, unique_hex + "-err.xml")))
+
+    started = time.time()
+    results = runCommands(files, env, compress)
+    replaceUnchanged(files, results, compress, unique_hex)
+
+    seconds = 0
+    for name in results:
+        seconds = max(seconds, results[name]["seconds"])
+
+    return {
+        "commands": results,
+        "SampleID": unique_hex,
+        "seconds": seconds,
+        "started": round(started, 3)
+    }
+
+###
+
+def saveState(state):
 
+  # Given a dictionary like the one from `loadState`, this function saves it
+  # for the next sample. It is written to a temporary file, which is then
+  # renamed, so that a collector which is killed halfway through leaves the
+  # last state as it was.
 
-  # Update: post-mortem data is available in the completed queue, so we will
-  # start recording that, too, and we will process it later. We use the exact
-  # same strategy to capture this data as we have used previously.
+    filename = os.path.join(DATA_DIR, "collect-xml-data.state")
 
-    showqc_dir = "/lustre/atlas/proj-shared/csc108/data/moab/showqc"
-    if not os.path.exists(showqc_dir):
-        os.makedirs(showqc_dir)
+    with open(filename + ".tmp", "w") as f:
+        f.write(json.dumps(state, sort_keys=True) + "\n")
+    os.rename(filename + ".tmp", filename)
 
-    showqc_out = os.path.join(showqc_dir, unique_hex + "-out.xml")
-    showqc_err = os.path.join(showqc_dir, unique_hex + "-err.xml")
-    with open(showqc_out, "wb") as out:
-        with open(showqc_err, "wb") as err:
-            subprocess.Popen(["showq", "-c", "-p", "titan", "--format=xml"],
-                    stdout=out, stderr=err, env=env)
+    return
 
 ###
 
-def main():
+def writeLog(record):
 
-  # Initially, `sample` was separated from `main` only so that I could fake a
-  # cron-type functionality with the following loop:
-  #
-  #     import time
-  #     while True:
-  #         sample()
-  #         time.sleep(60)
-  #
-  # I had to do that in order to implement periodic sampling without cron
-  # because I didn't have privileges to run cron on a Titan login node and I
-  # didn't realize that setting environment variables would allow the DTNs to
-  # access the correct MOAB server. Now, this script is run as a cron job.
+  # Given a dictionary from `sample`, this function appends it to the log as
+  # one line of JSON. It is written with a single call so that the line stays
+  # whole even if two runs ever overlap.
+
+    with open(os.path.join(DATA_DIR, "collect-xml-data.log"), "a") as log:
+        log.write(json.dumps(record, sort_keys=True) + "\n")
 
-    sample()
+    return
 
 ###
 
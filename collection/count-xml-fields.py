@@ -7,19 +7,49 @@
 #   columns were optional and therefore might contain NULL values once the data
 #   were imported into SQLite.
 #
+#   Output that "collect-xml-data.py" compressed with "--compress=gzip" or
+#   "--compress=zstd" is recognized by its first bytes and decompressed, just
+#   as "from-xml-to-sqlite.py" does it. Reading zstd needs the "zstandard"
+#   module.
+#
 #                                                       ~~ (c) SRW, 13 Jun 2018
-#                                                   ~~ last updated 22 Jun 2018
+#                                                   ~~ last updated 18 Oct 2026
 
 import json
 import os
+import zlib
 from xml.etree import ElementTree
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+###
+
+# The first bytes of the files that "collect-xml-data.py" compresses with
+# "--compress=gzip" and "--compress=zstd", respectively.
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
 ###
 
 def readXML(filename):
     xmltext = ""
-    with open(filename, "r") as xmlfile:
-        xmltext = "".join(xmlfile.readlines()).strip()
+    with open(filename, "rb") as xmlfile:
+        xmltext = xmlfile.read()
+
+    if xmltext.startswith(GZIP_MAGIC):
+        xmltext = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(xmltext)
+    elif xmltext.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise Exception("The zstandard module is needed to read files "
+                "that were compressed with zstd.")
+        xmltext = zstandard.ZstdDecompressor().decompressobj().decompress(
+            xmltext)
+    xmltext = xmltext.strip()
 
     if len(xmltext) == 0:
       # Now we need to check the error file to see what happened.
@@ -13,174 +13,1102 @@
 #   I used Python here with extensive inline SQL using heredocs because that's
 #   what the group has used elsewhere in the BigPanDA project as well.
 #
+#   Rows are collected per table in memory and written with `executemany`
+#   inside a single transaction for each batch of samples, rather than with one
+#   `execute` per job and one commit per table of every sample. The number of
+#   samples per batch can be changed from the command line:
+#
+#       $ python2 from-xml-to-sqlite.py --batch-size=500
+#
+#   Parsing is CPU-bound and every sample is independent, so it can also be
+#   spread over a pool of worker processes while this process stays the only
+#   one that writes to SQLite:
+#
+#       $ python2 from-xml-to-sqlite.py --processes=$(nproc)
+#
+#   The default is still one process, and the nightly job does not use the
+#   option, because the speedup has not yet been measured on a machine with
+#   more than one core. "benchmark-ingest.py --processes" can measure it.
+#
+#   Data that has already been archived by "archive-xml-files.bash" can be
+#   imported straight from the "delta" tarballs, without extracting millions of
+#   small files onto Lustre first:
+#
+#       $ python2 from-xml-to-sqlite.py ~/delta-*.tar.gz
+#
+#   Instead of running once a day, the program can also keep running and poll
+#   the data directories, importing each sample within seconds of collection:
+#
+#       $ python2 from-xml-to-sqlite.py --watch=10
+#
+#   The XML files are streamed, so that each job's attributes go straight into
+#   a row as soon as its tag is seen, and nothing is kept for the elements
+#   themselves. Memory use no longer grows with the size of a `showq -c` file.
+#   They are read with expat directly, which hands over each job's attributes
+#   as a flat list that is picked apart into columns without building a
+#   dictionary, and large files go into rows 15-25% faster than they did with
+#   `iterparse`. The same events can still be produced with ElementTree, which
+#   is used if expat is not available, and which "benchmark-xml.py" uses to
+#   check the fast path.
+#
+#   A queued job shows up in thousands of consecutive samples, but only a few
+#   of its attributes change from one sample to the next. The rest, such as
+#   its account and requested walltime, are stored once in the "jobs" table,
+#   and "active", "blocked", and "eligible" are now views which join them back
+#   together, so the analysis scripts work unchanged. The per-sample "State"
+#   and "PAL" columns, which only take a handful of values, are stored as small
+#   integer codes, and the views translate them back into names.
+#
+#   Every numeric attribute is parsed once, according to FIELD_TYPES, so that
+#   SQLite stores and compares native numbers. Values which do not parse are
+#   stored as NULL and kept, with the rest of their row, in "quarantine".
+#
+#   So that no single file has to hold all of history, the rows of each sample
+#   can be written to a separate database file for its month, which can then
+#   be copied, rebuilt, or vacuumed on its own. The analysis programs can open
+#   them together with "analysis/shards.py":
+#
+#       $ python2 from-xml-to-sqlite.py --monthly-shards
+#
+#   By default, the database uses SQLite's rollback journal, because at OLCF
+#   it lives on Lustre and is written from a Rhea compute node or a DTN while
+#   it is read from other hosts. When every program that opens the database
+#   runs on the same host, it can be switched to SQLite's write-ahead log (WAL)
+#   mode instead, so that the analysis programs, which open it read-only, can
+#   run at the same time as an import without either side waiting on the
+#   other's locks:
+#
+#       $ python2 from-xml-to-sqlite.py --journal-mode=wal
+#
+#   SQLite folds the log back into the database every WAL_AUTOCHECKPOINT
+#   pages, and at the end of every run, or every CHECKPOINT_INTERVAL seconds
+#   with "--watch", the log is emptied completely once no reader still needs
+#   it. WAL relies on shared memory, which does not work across hosts on a
+#   network filesystem, so a database in WAL mode must never be opened from
+#   another host while it is in use. Running without the option switches it
+#   back to the rollback journal.
+#
+#   Every run records how long it spent discovering, reading, parsing, and
+#   inserting, how much it imported, and how much memory it used, in the
+#   "ingest_runs" table. To see how those have changed over the last 30 runs:
+#
+#       $ python2 from-xml-to-sqlite.py --report=30
+#
+#   Consecutive `showq` samples are nearly identical, apart from durations and
+#   priorities which grow steadily. With "--delta", each job's consecutive
+#   samples in a queue are stored as a single "run", with a rate of change for
+#   each of the LINEAR_FIELDS, as long as every value stays exactly on course.
+#   The views expand the runs again, and "analysis/snapshots.py" shows how much
+#   they save. Only samples newer than the last one stored this way can be
+#   added to the runs, so the directories are imported in order of time, and
+#   anything older is stored one row at a time, as usual:
+#
+#       $ python2 from-xml-to-sqlite.py --delta
+#
+#   The "job_intervals" table keeps, for every JobID, when it was first and
+#   last seen in each queue and in how many samples, and every import folds
+#   its new samples into it, so that questions about individual jobs can read
+#   one row instead of every sample of the job.
+#
+#   Output that "collect-xml-data.py" compressed with "--compress" is read just
+#   like any other, from directories, segments, and tarballs alike, because
+#   each file is recognized by its first bytes and decompressed a chunk at a
+#   time as it is parsed. Files compressed with zstd need the "zstandard"
+#   module, which is not part of a standard Python distribution, while gzip
+#   only needs the standard "zlib" module.
+#
+#   When `showq -c` has not changed since the sample before, apart from its
+#   time, the collector stores a reference to the sample which holds it in
+#   full instead of the output itself. Every completed job in it has then
+#   already been read from that sample, so the reference is recognized and
+#   nothing else is parsed, whichever order the samples are imported in.
+#
+#   The program can be killed at any point and simply run again. Each batch of
+#   samples is committed together with its entries in "ingest_manifest", so a
+#   sample is either imported completely or not at all, and a tarball's place
+#   is recorded in "ingest_checkpoints" with every batch, so that the next run
+#   resumes where the last one stopped instead of reading it from the start.
+#
 #                                                       ~~ (c) SRW, 15 Jun 2018
-#                                                   ~~ last updated 12 Sep 2018
+#                                                   ~~ last updated 18 Oct 2026
 
-#import json
+import io
+import json
+import multiprocessing
+import operator
+import optparse
 import os
+import resource
+import signal
 import sqlite3
-from xml.etree import ElementTree
+import sys
+import tarfile
+import time
+import zlib
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+try:
+    from xml.parsers import expat
+except ImportError:
+    expat = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The version of the schema created by `initializeDatabase`, which is stored in
+# SQLite's "user_version" header field. Version 0 is the original schema, which
+# had UNIQUE constraints over nearly every column and no secondary indexes.
+# Version 1 added natural keys and indexes, and version 2 moved the static
+# description of each job out of the per-sample rows and into "jobs". Version 3
+# replaced the names in the ENCODED_FIELDS with integer codes. Version 4 stores
+# every field in FIELD_TYPES natively and moves malformed values to the
+# "quarantine" table. Version 5 added "showq_snapshots" and the "*_runs" tables
+# for "--delta", which the views read from as well.
+
+SCHEMA_VERSION = 5
+
+# The number of pages that the write-ahead log may grow to before SQLite copies
+# it back into the database on its own, which is ten times SQLite's default. A
+# bulk import then pauses for checkpoints less often, while the log stays small
+# enough for readers to search quickly. With "--watch", the log is also emptied
+# completely every CHECKPOINT_INTERVAL seconds, because readers that never stop
+# can otherwise keep the automatic checkpoints from ever reaching its end.
+
+WAL_AUTOCHECKPOINT = 10000
+
+CHECKPOINT_INTERVAL = 3600
+
+# Every `showq -c` file repeats most of the completed jobs in the file before
+# it, so the JobIDs of completed jobs which are already known are kept in
+# KNOWN_COMPLETED, and their rows are dropped as soon as they are parsed. The
+# set is filled by `loadCompleted` with every job in the database which
+# completed within COMPLETED_HORIZON seconds of the newest one, which is that
+# watermark, and it grows with the new jobs from every file that this process
+# parses all the way through, so that the jobs in a file which turns out to
+# be cut off are not skipped in the files after it. A job that is not in the
+# set is still passed to SQLite, which ignores it if it is already there, so
+# the set only needs to be large enough to be useful.
+
+COMPLETED_HORIZON = 7 * 24 * 60 * 60
+
+KNOWN_COMPLETED = set()
+
+# The XML files are fed to expat in chunks of this many bytes.
+
+XML_CHUNK_SIZE = 65536
+
+# The first bytes of the files that "collect-xml-data.py" compresses with
+# "--compress=gzip" and "--compress=zstd", respectively. XML cannot start with
+# either of them.
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# The exceptions which mean that an output file is not well-formed, e.g.
+# because the command that wrote it was killed part of the way through.
+# ElementTree's own exception is a subclass of SyntaxError.
+
+XML_ERRORS = [SyntaxError, zlib.error]
+if expat is not None:
+    XML_ERRORS.append(expat.ExpatError)
+if zstandard is not None:
+    XML_ERRORS.append(zstandard.ZstdError)
+XML_ERRORS = tuple(XML_ERRORS)
+
+# The `operator.itemgetter` objects which `pickAttributes` uses, keyed by the
+# names of a job's attributes, in the order that they appear in the XML, and
+# the names of the fields wanted from them. MOAB writes every job's attributes
+# in the same order, leaving out the ones it has no value for, so only a few
+# dozen combinations ever show up. The cache is emptied if it grows too large
+# anyway, because it costs nothing to fill it again.
+
+ATTRIBUTE_GETTERS = {}
+
+MAX_ATTRIBUTE_GETTERS = 10000
+
+# Attributes of the per-sample rows which only ever take a handful of distinct
+# values across millions of rows. These are stored as integer codes which refer
+# to a small "<field>_codes" table, e.g. "state_codes", that holds each name
+# exactly once. Names such as Account and User are already stored only once per
+# job, in "jobs", which is small enough that encoding them gains nothing.
+
+ENCODED_FIELDS = ["PAL", "State"]
+
+# The type of every numeric XML attribute, which `convertRow` uses to parse
+# each value exactly once, before it reaches SQLite. Attributes which are not
+# listed here, such as "Account" or "CompletionCode", are kept as strings.
+
+FIELD_TYPES = {
+
+  # `showbf` partition ranges
+
+    "duration": int,
+    "index": int,
+    "nodecount": int,
+    "proccount": int,
+    "reqid": int,
+    "starttime": int,
+
+  # `showq` cluster summary
+
+    "LocalActiveNodes": int,
+    "LocalAllocProcs": int,
+    "LocalConfigNodes": int,
+    "LocalIdleNodes": int,
+    "LocalIdleProcs": int,
+    "LocalUpNodes": int,
+    "LocalUpProcs": int,
+    "RemoteActiveNodes": int,
+    "RemoteAllocProcs": int,
+    "RemoteConfigNodes": int,
+    "RemoteIdleNodes": int,
+    "RemoteIdleProcs": int,
+    "RemoteUpNodes": int,
+    "RemoteUpProcs": int,
+    "time": int,
+
+  # `showq` and `showq -c` jobs
+
+    "AWDuration": int,
+    "CompletionTime": int,
+    "DRMJID": int,
+    "EEDuration": int,
+    "GJID": int,
+    "MasterHost": int,
+    "ReqAWDuration": int,
+    "ReqNodes": int,
+    "ReqProcs": int,
+    "RsvStartTime": int,
+    "RunPriority": int,
+    "StartPriority": int,
+    "StartTime": int,
+    "StatPSDed": float,
+    "StatPSUtl": float,
+    "SubmissionTime": int,
+    "SuspendDuration": int
+}
+
+# The attributes of each `<job>` element which are kept for each queue, in the
+# same order as the columns of the "active", "blocked", and "eligible" views.
+# The XML attribute "Group" is stored in the column "Group_".
+
+JOB_FIELDS = {
+    "active": [
+        "Account", "AWDuration", "Class", "DRMJID", "EEDuration", "GJID",
+        "Group", "JobID", "JobName", "MasterHost", "PAL", "QOS",
+        "ReqAWDuration", "ReqNodes", "ReqProcs", "RsvStartTime",
+        "RunPriority", "StartPriority", "StartTime", "State", "StatPSDed",
+        "StatPSUtl", "SubmissionTime", "SuspendDuration", "User"
+    ],
+    "blocked": [
+        "Account", "Class", "DRMJID", "EEDuration", "GJID", "Group", "JobID",
+        "JobName", "QOS", "ReqAWDuration", "ReqProcs", "StartPriority",
+        "StartTime", "State", "SubmissionTime", "SuspendDuration", "User"
+    ],
+    "eligible": [
+        "Account", "Class", "DRMJID", "EEDuration", "GJID", "Group", "JobID",
+        "JobName", "QOS", "ReqAWDuration", "ReqProcs", "RsvStartTime",
+        "StartPriority", "StartTime", "State", "SubmissionTime",
+        "SuspendDuration", "User"
+    ]
+}
+
+# The attributes which describe a job rather than a sample of it, in the same
+# order as the columns of the "jobs" table. These are stored once per job.
+
+STATIC_FIELDS = [
+    "Account", "Class", "DRMJID", "GJID", "Group", "JobID", "JobName", "QOS",
+    "ReqAWDuration", "ReqProcs", "SubmissionTime", "User"
+]
+
+# The attributes which grow steadily while a job waits or runs, rather than
+# staying the same from one sample to the next. With "--delta", each run of
+# consecutive samples in which a job stays in the same queue is stored as a
+# single row, for as long as every other attribute stays the same and each of
+# these follows a straight line through time exactly. Each gets a "<field>Rate"
+# column in the "*_runs" tables, which holds its change per second.
+
+LINEAR_FIELDS = [
+    "AWDuration", "EEDuration", "StartPriority", "StatPSDed", "StatPSUtl"
+]
 
 ###
 
-def findNewUUIDs(connection, data_dir):
+def attachShards(connection, shard_dir, months):
 
-  # Given a `Connection` object and a "data_dir" string indicating the path to
-  # the data directory, this function finds newly collected XML files that have
-  # not been imported into SQLite yet. This function returns a list of UUIDs
-  # that can be used to generate the filenames that should be imported.
+  # Given a `Connection` object, the path to the directory of monthly shards,
+  # and a list of month labels such as "2018-07", this function makes sure that
+  # the shard for each month, "moab-data-<month>.sqlite", exists and is
+  # attached, and it returns a dictionary which maps each month to the name of
+  # its schema. Shards stay attached between batches, but SQLite can only
+  # attach a handful of databases at once, so the ones that are not needed are
+  # detached first if there are too many. Each shard uses the same journal
+  # mode as the main database. It must not be called in the middle of a
+  # transaction.
+
+    cursor = connection.cursor()
+    journal_mode = cursor.execute("PRAGMA main.journal_mode;").fetchone()[0]
+
+    attached = []
+    for row in connection.execute("PRAGMA database_list;"):
+        if row[1].startswith("shard_"):
+            attached.append(row[1])
+
+    schemas = {}
+    for month in months:
+        schemas[month] = "shard_" + month.replace("-", "_")
+
+    if len(set(attached) | set(schemas.values())) > 8:
+        for schema in list(attached):
+            if schema not in schemas.values():
+                connection.execute("DETACH DATABASE %s;" % schema)
+                attached.remove(schema)
+
+    for month in months:
+        schema = schemas[month]
+        if schema in attached:
+            continue
+        filename = os.path.join(shard_dir, "moab-data-%s.sqlite" % month)
+        cursor.execute("ATTACH DATABASE ? AS %s;" % schema, (filename,))
+        setJournalMode(connection, schema, journal_mode)
+        initializeSamples(cursor, schema)
+        cursor.execute("PRAGMA %s.user_version = %d;" %
+            (schema, SCHEMA_VERSION))
+        connection.commit()
+        attached.append(schema)
+
+    return schemas
+
+###
+
+def checkpointDatabase(connection):
+
+  # Given a `Connection` object, this function copies everything in the
+  # write-ahead log of the main database and of every attached shard back into
+  # the database file and truncates the log. SQLite waits up to the busy
+  # timeout for readers that still need the older pages, and if they are still
+  # there, the log is left for next time. It returns the number of databases
+  # whose logs could not be emptied, and it does nothing outside of WAL mode.
+
+    num_busy = 0
+
+    schemas = []
+    for row in connection.execute("PRAGMA database_list;"):
+        if row[1] != "temp":
+            schemas.append(row[1])
+
+    for schema in schemas:
+        row = connection.execute("PRAGMA %s.wal_checkpoint(TRUNCATE);" %
+            schema).fetchone()
+        if row is not None and row[0] != 0:
+            num_busy += 1
+
+    return num_busy
+
+###
+
+def convertRow(batch, table, sampleid, fields, values):
+
+  # Given a "batch" dictionary, the name of the table a row is meant for, the
+  # SampleID it came from, a list of XML attribute names, and a list of their
+  # raw values, this function returns a tuple of the values converted to the
+  # types in FIELD_TYPES. A value which cannot be converted is replaced with
+  # None, and it goes to the "quarantine" list of the batch along with the
+  # whole raw row, so that nothing is lost and nothing malformed reaches the
+  # typed columns.
+
+    kinds = map(FIELD_TYPES.get, fields)
+
+  # Nearly every row is well-formed, so the whole row is converted in one go
+  # first, and the values are only checked one at a time if that fails.
+
+    try:
+        return tuple([value if kind is None or value is None else kind(value)
+            for (kind, value) in zip(kinds, values)])
+    except ValueError:
+        pass
+
+    row = []
+
+    for (field, value) in zip(fields, values):
+        kind = FIELD_TYPES.get(field)
+        if kind is not None and value is not None:
+            try:
+                value = kind(value)
+            except ValueError:
+                batch["quarantine"].append((sampleid, table, field, value,
+                    json.dumps(dict(zip(fields, values)), sort_keys=True)))
+                value = None
+        row.append(value)
 
-  # First, get a list of SampleIDs out of the SQLite database, so we know what
-  # has already been imported.
+    return tuple(row)
+
+###
+
+def encodeJobs(cursor, batch):
+
+  # Given a `Cursor` object and a "batch" dictionary, this function replaces
+  # the names in the ENCODED_FIELDS of the job rows with their integer codes,
+  # and it finds the JobKey of every job, adding any codes and jobs that are
+  # new to the main database. It returns a tuple of a dictionary which maps
+  # "active", "blocked", and "eligible" to their encoded rows and the
+  # dictionary from `findJobKeys`. The batch itself is left as it was.
+
+    codes = findCodes(cursor, batch)
+
+    encoded = {}
+    for table in ["active", "blocked", "eligible"]:
+        lookups = []
+        for field in JOB_FIELDS[table]:
+            if field in ENCODED_FIELDS:
+                lookups.append(codes[field])
+            else:
+                lookups.append(None)
+        encoded[table] = []
+        for row in batch[table]:
+            values = list(row)
+            for (i, lookup) in enumerate(lookups):
+                if lookup is not None and values[i + 2] is not None:
+                    values[i + 2] = lookup[values[i + 2]]
+            encoded[table].append(tuple(values))
+
+    keys = findJobKeys(cursor, encoded)
+
+    return (encoded, keys)
+
+###
+
+def extendRun(run, values, now):
+
+  # Given a "run" dictionary, which holds the columns of a row of one of the
+  # "*_runs" tables, and a dictionary of the values of the same job's dynamic
+  # attributes in the next snapshot, taken at the UNIX time "now", this
+  # function decides whether that snapshot can be stored as part of the run.
+  # If so, it fills in any rates that were still unknown, which happens at the
+  # second snapshot of every run, and it returns True. Otherwise, it leaves the
+  # run unchanged and returns False.
+
+    elapsed = now - run["FirstTime"]
+    rates = {}
+
+    for field in values:
+        base = run[field]
+        value = values[field]
+        if field not in LINEAR_FIELDS or base is None or value is None:
+            if value != base:
+                return False
+            continue
+        rate = run[field + "Rate"]
+        if rate is None:
+            if elapsed == 0:
+                rate = 0.0
+            else:
+                rate = (value - base) / float(elapsed)
+            rates[field + "Rate"] = rate
+
+      # This must be the same arithmetic as in the views, which is done in
+      # double precision on both sides, and the result must match exactly.
+
+        if base + rate * elapsed != value:
+            return False
+
+    run.update(rates)
+
+    return True
+
+###
+
+def findCodes(cursor, batch):
+
+  # Given a `Cursor` object and a "batch" dictionary, this function returns a
+  # dictionary which maps each of the ENCODED_FIELDS to another dictionary,
+  # which maps every name of that field in the batch's job rows to its integer
+  # code. Names which have not been seen before are added to the matching
+  # "<field>_codes" table.
+
+    codes = {}
+
+    for field in ENCODED_FIELDS:
+        names = set()
+        for table in ["active", "blocked", "eligible"]:
+            if field not in JOB_FIELDS[table]:
+                continue
+            i = JOB_FIELDS[table].index(field) + 2
+            for row in batch[table]:
+                if row[i] is not None:
+                    names.add(row[i])
+        codes[field] = {}
+
+      # The names are looked up one at a time, rather than with `IN`, because
+      # SQLite may hand a name like "123" back as a number.
+
+        for name in sorted(names):
+            cursor.execute("""
+                INSERT OR IGNORE INTO %s_codes (Name) VALUES (?);
+                """ % field.lower(), (name,))
+            cursor.execute("""
+                SELECT Code FROM %s_codes WHERE Name = ?;
+                """ % field.lower(), (name,))
+            codes[field][name] = cursor.fetchone()[0]
+
+    return codes
+
+###
+
+def findConsumed(connection, filenames):
+
+  # Given a `Connection` object and a set of "filenames" relative to the data
+  # directory, this function returns the subset of them that are recorded in
+  # the "ingest_manifest" table. The lookups use the primary key and are done
+  # in chunks that stay under the limit on the number of SQL variables in older
+  # versions of SQLite, so the cost is proportional to the number of filenames
+  # given rather than to the number of samples that have ever been imported.
 
     cursor = connection.cursor()
 
-    query = """
-        SELECT DISTINCT SampleID FROM sample_info;
-        """
+    consumed = set()
 
-    sampleids = []
-    for row in cursor.execute(query):
-        sampleids.append(row["SampleID"])
+    candidates = sorted(filenames)
+    for i in range(0, len(candidates), 500):
+        chunk = candidates[i:i + 500]
+        query = """
+            SELECT Filename FROM ingest_manifest WHERE Filename IN (%s);
+            """ % ", ".join(["?"] * len(chunk))
+        for row in cursor.execute(query, chunk):
+            consumed.add(row["Filename"])
 
     connection.commit()
 
-  # Now, filter lists of the data directories to find UUIDs that have not been
-  # imported yet.
+    return consumed
 
-    uuids = []
+###
 
-    showbf_dir = os.path.join(data_dir, "showbf")
-    showq_dir = os.path.join(data_dir, "showq")
-    showqc_dir = os.path.join(data_dir, "showqc")
+def findIntervals(batch):
+
+  # Given a "batch" dictionary, this function returns a dictionary which maps
+  # the JobID of every job in the batch's job rows to a list of the values for
+  # its row of the "job_intervals" table, in the order of its columns, but
+  # counting only the samples in this batch. A job is counted once per sample
+  # and queue, just as the natural keys of the "*_samples" tables allow.
+
+    intervals = {}
+
+    for (offset, table) in enumerate(["active", "blocked", "eligible"]):
+        i = JOB_FIELDS[table].index("JobID") + 2
+        seen = set()
+        for row in batch[table]:
+            (sampleid, sampletime, jobid) = (row[0], row[1], row[i])
+            if sampletime is None or jobid is None:
+                continue
+            if (sampleid, jobid) in seen:
+                continue
+            seen.add((sampleid, jobid))
+            if jobid not in intervals:
+                intervals[jobid] = [None, None, 0] * 3
+            interval = intervals[jobid]
+            first = 3 * offset
+            if interval[first] is None or sampletime < interval[first]:
+                interval[first] = sampletime
+            if interval[first + 1] is None or sampletime > interval[first + 1]:
+                interval[first + 1] = sampletime
+            interval[first + 2] += 1
+
+    return intervals
 
-    for each in ["showbf", "showq", "showqc"]:
-        dirname = os.path.join(data_dir, each)
-        for filename in os.listdir(dirname):
-            uuid = filename[:-8]
-            if (uuid not in sampleids) and (uuid not in uuids):
-                uuids.append(uuid)
+###
 
-  # Return the list of UUIDs.
+def findJobKeys(cursor, batch):
+
+  # Given a `Cursor` object and a "batch" dictionary whose job rows already
+  # have codes in place of names, as in `insertBatch`, this function returns a
+  # dictionary which maps the static part of every job row, as a tuple of the
+  # STATIC_FIELDS, to its JobKey in the "jobs" table. Jobs which have not been
+  # seen before are inserted. Each distinct job is looked up once per batch,
+  # and the lookup is served by the "jobs_jobid" index. A job which is missing
+  # a required attribute is left out, so that its rows are ignored, just like
+  # any other row that violates a NOT NULL constraint.
+
+    keys = {}
+
+    for table in ["active", "blocked", "eligible"]:
+        positions = []
+        for field in STATIC_FIELDS:
+            positions.append(JOB_FIELDS[table].index(field) + 2)
+        for row in batch[table]:
+            static = tuple([row[i] for i in positions])
+            if static in keys:
+                continue
+            cursor.execute("""
+                SELECT JobKey FROM jobs
+                    WHERE JobID = ?
+                        AND Account IS ? AND Class IS ? AND DRMJID IS ?
+                        AND GJID IS ? AND Group_ IS ? AND JobName IS ?
+                        AND QOS IS ? AND ReqAWDuration IS ? AND ReqProcs IS ?
+                        AND SubmissionTime IS ? AND User IS ?
+                    LIMIT 1;
+                """, (static[5],) + static[:5] + static[6:])
+            found = cursor.fetchone()
+            if found is not None:
+                keys[static] = found[0]
+                continue
+            cursor.execute("""
+                INSERT OR IGNORE INTO jobs (
+                    Account, Class, DRMJID, GJID, Group_, JobID, JobName, QOS,
+                    ReqAWDuration, ReqProcs, SubmissionTime, User
+                ) VALUES (
+                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+                )
+                """, static)
+            if cursor.rowcount == 1:
+                keys[static] = cursor.lastrowid
 
-    return uuids
+    return keys
 
 ###
 
-def importBackfill(connection, data_dir, uuids):
+def findNewUUIDs(connection, data_dir):
 
   # Given a `Connection` object and a "data_dir" string indicating the path to
-  # the data directory, this function imports the `showbf` data into SQLite.
+  # the data directory, this function finds newly collected XML files that have
+  # not been imported into SQLite yet. This function returns a list of UUIDs
+  # that can be used to generate the filenames that should be imported.
 
-    cursor = connection.cursor()
+  # First, list the data directories, and then ask the manifest which of those
+  # files have already been consumed.
+
+    filenames = listDataFiles(data_dir)
+    filenames -= findConsumed(connection, filenames)
+
+  # Any UUID with a file that has not been consumed needs to be imported.
+
+    uuids = set()
+    for filename in filenames:
+        uuids.add(os.path.basename(filename)[:-8])
+
+  # Return the list of UUIDs.
+
+    return sorted(uuids)
+
+###
+
+def importBackfill(batch, data_dir, uuids):
+
+  # Given a "batch" dictionary from `newBatch`, a "data_dir" string indicating
+  # the path to the data directory, and a list of UUIDs, this function adds
+  # the `showbf` data for those samples to the batch. Nothing is written to
+  # SQLite until the batch is passed to `writeBatch`.
 
     showbf_dir = os.path.join(data_dir, "showbf")
 
     for sampleid in uuids:
 
         abspath = os.path.join(showbf_dir, sampleid + "-out.xml")
+        started = time.time()
         obj = readXML(abspath)
+        read = time.time() - started
 
-      # A version of UPSERT that works with SQLite versions older than 3.24:
-        cursor.execute("""
-            UPDATE sample_info SET showbfError = ? WHERE SampleID = ?;
-        """, (obj["errtext"], sampleid))
-        cursor.execute("""
-            INSERT OR IGNORE INTO sample_info (SampleID, showbfError)
-                VALUES (?, ?);
-            """, (sampleid, obj["errtext"]))
+        if obj["events"] is not None:
+            if not parseOutput(batch, "showbf", obj):
+                obj["errtext"] = readErrors(abspath)
 
-        connection.commit()
+        batch["showbfError"].append((obj["errtext"], sampleid))
 
-        if obj["tree"] is not None:
-            showbfXMLtoSQL(connection, obj)
+        batch["timings"].append((read, time.time() - started - read))
 
     return
 
 ###
 
-def importCompleted(connection, data_dir, uuids):
+def importCompleted(batch, data_dir, uuids):
 
-  # Given a `Connection` object and a "data_dir" string indicating the path to
-  # the data directory, this function imports the `showq -c` (abbreviated
-  # throughout as "showqc") data into SQLite.
+  # Given a "batch" dictionary from `newBatch`, a "data_dir" string indicating
+  # the path to the data directory, and a list of UUIDs, this function adds
+  # the `showq -c` (abbreviated throughout as "showqc") data to the batch.
 
   # Notice also that I really don't worry about error handling with the
   # completed queue data, thanks to ridiculous amounts of multiple coverage.
   # Sample identifiers don't matter at all in the completed queue data except
   # that heeding them allows us avoid attempting to insert old files again.
 
-    cursor = connection.cursor()
-
     showqc_dir = os.path.join(data_dir, "showqc")
 
     for sampleid in uuids:
         abspath = os.path.join(showqc_dir, sampleid + "-out.xml")
+        started = time.time()
         obj = readXML(abspath)
+        read = time.time() - started
 
-        if obj["tree"] is not None:
-            showqcXMLtoSQL(connection, obj)
+        if obj["events"] is not None:
+            parseOutput(batch, "showqc", obj)
+
+        batch["timings"].append((read, time.time() - started - read))
 
     return
 
 ###
 
-def importQueues(connection, data_dir, uuids):
-
-  # Given a `Connection` object and a "data_dir" string indicating the path to
-  # the data directory, this function imports the `showq` data into SQLite.
+def importQueues(batch, data_dir, uuids):
 
-    cursor = connection.cursor()
+  # Given a "batch" dictionary from `newBatch`, a "data_dir" string indicating
+  # the path to the data directory, and a list of UUIDs, this function adds
+  # the `showq` data for those samples to the batch.
 
     showq_dir = os.path.join(data_dir, "showq")
 
     for sampleid in uuids:
         abspath = os.path.join(showq_dir, sampleid + "-out.xml")
+        started = time.time()
         obj = readXML(abspath)
+        read = time.time() - started
 
-      # A version of UPSERT that works with SQLite versions older than 3.24:
-        cursor.execute("""
-            UPDATE sample_info SET showqError = ? WHERE SampleID = ?;
-        """, (obj["errtext"], sampleid))
-        cursor.execute("""
-            INSERT OR IGNORE INTO sample_info (SampleID, showqError)
-                VALUES (?, ?);
-            """, (sampleid, obj["errtext"]))
+        if obj["events"] is not None:
+            if not parseOutput(batch, "showq", obj):
+                obj["errtext"] = readErrors(abspath)
 
-        connection.commit()
+        batch["showqError"].append((obj["errtext"], sampleid))
 
-        if obj["tree"] is not None:
-            showqXMLtoSQL(connection, obj)
+        batch["timings"].append((read, time.time() - started - read))
 
     return
 
 ###
 
+def importSegments(connection, data_dir, batch_size, shard_dir, run=None,
+        delta=False):
+
+  # Given a `Connection` object, a "data_dir" string indicating the path to the
+  # data directory, the number of samples to write per transaction, and the
+  # "shard_dir", "run", and "delta" to pass on to `writeBatch`, this function
+  # imports every sample in the segment files that "collect-xml-data.py"
+  # appends to with "--segments", which have not been imported yet. It
+  # returns the number of rows written and the number of samples imported.
+
+  # Each segment has an index, which is only ever appended to, and everything
+  # up to a line of an index is committed together with its position, so the
+  # next run starts reading there. The samples are also looked up in the
+  # manifest, under the same names that their files would have had, so that
+  # nothing is imported twice should an index ever be written again from the
+  # start.
+
+    segment_dir = os.path.join(data_dir, "segments")
+    if not os.path.isdir(segment_dir):
+        return (0, 0)
+
+    cursor = connection.cursor()
+
+    num_rows = 0
+    num_samples = 0
+
+    for name in sorted(os.listdir(segment_dir)):
+
+        if not name.endswith(".idx"):
+            continue
+
+        source = os.path.abspath(os.path.join(segment_dir, name))
+        info = os.stat(source)
+        position = 0
+
+        cursor.execute("""
+            SELECT Position FROM ingest_checkpoints WHERE Source = ?;
+            """, (source,))
+        row = cursor.fetchone()
+        if row is not None and row[0] <= info.st_size:
+            position = row[0]
+        if position == info.st_size:
+            continue
+
+        batch = newBatch()
+        ready = 0
+
+        for (sampleid, records, end) in readSegment(source, position):
+
+            started = time.time()
+            filenames = set()
+            for (each, stream) in records:
+                filenames.add("%s/%s-%s.xml" % (each, sampleid, stream))
+            consumed = (findConsumed(connection, filenames) == filenames)
+            if run is not None:
+                run["DiscoverSeconds"] += time.time() - started
+
+            if not consumed:
+                mergeBatch(batch, parseRecords(sampleid, records))
+                ready += 1
+                num_samples += 1
+
+            batch["checkpoints"] = [(source, info.st_size,
+                int(info.st_mtime), end, 0)]
+
+            if ready == batch_size:
+                num_rows += writeBatch(connection, batch, shard_dir, run,
+                    delta)
+                batch = newBatch()
+                ready = 0
+
+        num_rows += writeBatch(connection, batch, shard_dir, run, delta)
+
+    return (num_rows, num_samples)
+
+###
+
+def importTarball(connection, tarfilename, batch_size, shard_dir, run=None,
+        delta=False):
+
+  # Given a `Connection` object, a "tarfilename" string indicating the path to
+  # a tarball created by "archive-xml-files.bash", the number of samples to
+  # write per transaction, and the "shard_dir", "run", and "delta" to pass on
+  # to `writeBatch`, which are None or False unless monthly shards are in use,
+  # the run is being recorded, or "--delta" was given, this function streams
+  # the members of the tarball straight into the parser. It returns the number
+  # of rows written and the number of samples seen.
+
+  # The tarball is read in stream mode, so each member can only be read while
+  # it is the current one, and the "-out.xml" and "-err.xml" members of a
+  # sample are not necessarily next to each other. Error text is only needed
+  # when the output is blank or not well-formed, so error members are held in
+  # "errors" until their output shows up, and such outputs are held in
+  # "pending" until their error shows up. Both are keyed by (directory, UUID),
+  # and a member only goes into the manifest once its partner has been seen,
+  # so that anything in the manifest never has to be read again.
+
+    cursor = connection.cursor()
+
+    batch = newBatch()
+    errors = {}
+    outputs = set()
+    pending = {}
+    sampleids = set()
+
+    num_files = 0
+    num_rows = 0
+
+  # Every batch records how far into the tarball everything has been
+  # committed, in the same transaction, so that a run which was killed part
+  # of the way through can pick up exactly where it stopped. A tarball which
+  # was imported completely, and which has not changed since, is not even
+  # opened again.
+
+    source = os.path.abspath(tarfilename)
+    info = os.stat(source)
+    position = 0
+
+    cursor.execute("""
+        SELECT Size, MTime, Position, Finished FROM ingest_checkpoints
+            WHERE Source = ?;
+        """, (source,))
+    row = cursor.fetchone()
+    if row is not None and (row[0], row[1]) == (info.st_size,
+            int(info.st_mtime)):
+        if row[3] == 1:
+            print("Skipping %s, which has already been imported" %
+                tarfilename)
+            return (0, 0)
+        position = row[2]
+
+    tarball = tarfile.open(tarfilename, "r|*")
+
+    index = -1
+    for member in tarball:
+
+        index += 1
+
+        if not member.isfile():
+            continue
+
+      # Member names look like "<anything>/showq/<uuid>-out.xml".
+
+        (dirname, basename) = os.path.split(member.name)
+        each = os.path.basename(dirname)
+        if each not in ["showbf", "showq", "showqc"]:
+            continue
+        if not (basename.endswith("-err.xml") or
+                basename.endswith("-out.xml")):
+            continue
+
+        sampleid = basename[:-8]
+        filename = each + "/" + basename
+        key = (each, sampleid)
+
+      # Members before the checkpoint, or in the manifest, have already been
+      # committed along with their partners. Only the outputs need to be
+      # remembered, so that their error members are not mistaken for those
+      # of missing outputs.
+
+        started = time.time()
+        consumed = (index < position)
+        if not consumed:
+            cursor.execute("""
+                SELECT Filename FROM ingest_manifest WHERE Filename = ?;
+                """, (filename,))
+            consumed = (cursor.fetchone() is not None)
+        if run is not None:
+            run["DiscoverSeconds"] += time.time() - started
+        if consumed:
+            if basename.endswith("-out.xml"):
+                outputs.add(key)
+            continue
+
+        started = time.time()
+
+        sampleids.add(sampleid)
+        manifest = (filename, sampleid, member.size, int(member.mtime))
+        xmlfile = tarball.extractfile(member)
+
+        if basename.endswith("-err.xml"):
+
+            errtext = xmlfile.read().decode("utf-8", "replace").strip()
+            batch["timings"].append((time.time() - started, 0.0))
+            if key in pending:
+                batch[each + "Error"].append((errtext, sampleid))
+                batch["manifest"].append(pending.pop(key)[0])
+                batch["manifest"].append(manifest)
+            elif key in outputs:
+                batch["manifest"].append(manifest)
+            else:
+                errors[key] = (errtext, manifest, index)
+
+        else:
+
+            outputs.add(key)
+
+          # Small members are read whole to check whether they are blank, and
+          # large ones are parsed directly from the stream.
+
+            if member.size <= 4096:
+                data = xmlfile.read()
+                if isBlank(io.BytesIO(data)):
+                    batch["timings"].append((time.time() - started, 0.0))
+                    if key in errors:
+                        (errtext, errmanifest) = errors.pop(key)[:2]
+                        if each != "showqc":
+                            batch[each + "Error"].append((errtext, sampleid))
+                        batch["manifest"].append(errmanifest)
+                        batch["manifest"].append(manifest)
+                    elif each == "showqc":
+                        batch["manifest"].append(manifest)
+                    else:
+                        pending[key] = (manifest, index)
+                    continue
+                xmlfile = io.BytesIO(data)
+
+            obj = {
+                "errtext": None,
+                "events": iterEvents(xmlfile),
+                "SampleID": sampleid
+            }
+
+            read = time.time() - started
+            parsed = parseOutput(batch, each, obj)
+            batch["timings"].append((read, time.time() - started - read))
+
+          # Output which is not well-formed is handled just like blank output,
+          # with its error text recorded instead.
+
+            if parsed or each == "showqc":
+                if each != "showqc":
+                    batch[each + "Error"].append((None, sampleid))
+                if key in errors:
+                    batch["manifest"].append(errors.pop(key)[1])
+                batch["manifest"].append(manifest)
+            elif key in errors:
+                (errtext, errmanifest) = errors.pop(key)[:2]
+                batch[each + "Error"].append((errtext, sampleid))
+                batch["manifest"].append(errmanifest)
+                batch["manifest"].append(manifest)
+            else:
+                pending[key] = (manifest, index)
+
+        num_files += 1
+        if num_files % (6 * batch_size) == 0:
+
+          # Everything before the first member that is still waiting for its
+          # partner is complete once this batch has been committed.
+
+            complete = index + 1
+            for waiting in list(errors.values()) + list(pending.values()):
+                complete = min(complete, waiting[-1])
+            batch["checkpoints"].append((source, info.st_size,
+                int(info.st_mtime), complete, 0))
+
+            num_rows += writeBatch(connection, batch, shard_dir, run,
+                delta)
+            batch = newBatch()
+
+    tarball.close()
+
+  # Whatever is left over is missing its partner. A blank output without an
+  # error file gets a note to that effect, and an error file without an output
+  # is recorded the same way `readXML` records a missing output file.
+
+    for key in pending:
+        (each, sampleid) = key
+        batch[each + "Error"].append(("No error file found", sampleid))
+        batch["manifest"].append(pending[key][0])
+
+    for key in errors:
+        (each, sampleid) = key
+        if each != "showqc":
+            batch[each + "Error"].append(("No output file found", sampleid))
+        batch["manifest"].append(errors[key][1])
+
+    batch["checkpoints"].append((source, info.st_size, int(info.st_mtime),
+        index + 1, 1))
+
+    num_rows += writeBatch(connection, batch, shard_dir, run, delta)
+
+    return (num_rows, len(sampleids))
+
+###
+
 def initializeDatabase(connection):
 
   # Given a `Connection` object, this function constructs the tables and
   # indexes for the SQLite3 database.
 
-    cursor = connection.cursor()
+  # The static description of a job, such as its account and requested
+  # walltime, is stored once in the "jobs" table, and each sample only stores
+  # what changes from one sample to the next in the "active_samples",
+  # "blocked_samples", and "eligible_samples" tables. The "active", "blocked",
+  # and "eligible" views at the bottom join them back together, with exactly
+  # the same columns as the tables they replaced, so that existing queries
+  # keep working. The views also translate the ENCODED_FIELDS back from their
+  # integer codes into names, with subqueries rather than joins, so that the
+  # query planner never mistakes a tiny "<field>_codes" table for a good place
+  # to start, and so that queries which do not use them never pay for them.
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS active (
+    cursor = connection.cursor()
 
-         -- Metadata for our study
+  # The tables with one row per sample, or per job per sample, are shared with
+  # the monthly shards.
 
-            SampleID STRING NOT NULL,
-            SampleTime INTEGER NOT NULL,
+    initializeSamples(cursor, "main")
 
-         -- Data
+    for field in ENCODED_FIELDS:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS %s_codes (
+                Code INTEGER PRIMARY KEY,
+                Name STRING NOT NULL UNIQUE
+            );
+            """ % field.lower())
 
-            Account STRING NOT NULL,
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS completed (
             AWDuration INTEGER,
+            Account STRING NOT NULL,
             Class STRING NOT NULL,
+            CompletionCode STRING NOT NULL, -- because "CNCLD" can occur
+            CompletionTime INTEGER NOT NULL,
             DRMJID INTEGER,
             EEDuration INTEGER,
             GJID INTEGER NOT NULL,
             Group_ STRING NOT NULL,
-            JobID STRING NOT NULL,
+            JobID STRING NOT NULL PRIMARY KEY,
             JobName STRING NOT NULL,
             MasterHost INTEGER,
             PAL STRING,
@@ -188,75 +1116,128 @@ def initializeDatabase(connection):
             ReqAWDuration INTEGER NOT NULL,
             ReqNodes INTEGER,
             ReqProcs INTEGER NOT NULL,
-            RsvStartTime INTEGER,
-            RunPriority INTEGER,
-            StartPriority INTEGER NOT NULL,
             StartTime INTEGER NOT NULL,
-            State STRING NOT NULL,
             StatPSDed REAL NOT NULL,
             StatPSUtl REAL NOT NULL,
-            SubmissionTime TEXT NOT NULL,
+            State STRING NOT NULL,
+            SubmissionTime INTEGER NOT NULL,
             SuspendDuration INTEGER NOT NULL,
-            User STRING NOT NULL,
-
-         -- Other table-specific information
-
-            CONSTRAINT unique_rows UNIQUE (
-
-             -- This can probably simplify to SampleID, SampleTime, JobID ...
+            User STRING NOT NULL
+        );
+        """)
 
-                SampleID, SampleTime, Account, Class, GJID, Group_, JobID,
-                JobName, QOS, ReqAWDuration, ReqProcs, RunPriority,
-                StartPriority, StartTime, State, StatPSDed, StatPSUtl,
-                SubmissionTime, SuspendDuration, User
-            ),
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS completed_completiontime
+            ON completed (CompletionTime);
+        """)
 
-            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
-        )
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+
+         -- One row per tarball, identified by its absolute path, which says
+         -- how many of its members have been committed, and whether all of
+         -- them have. It only applies while the tarball's size and mtime are
+         -- the same as they were then.
+
+            Source STRING PRIMARY KEY,
+            Size INTEGER NOT NULL,
+            MTime INTEGER NOT NULL,
+            Position INTEGER NOT NULL,
+            Finished INTEGER NOT NULL,
+            UpdateTime INTEGER NOT NULL
+        );
         """)
 
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS backfill (
+        CREATE TABLE IF NOT EXISTS ingest_manifest (
 
-         -- Metadata for our study
+         -- One row per XML file that has been consumed, where "Filename" is
+         -- relative to the data directory, e.g. "showq/<uuid>-out.xml". The
+         -- "Size" and "MTime" columns are NULL for files which were imported
+         -- before this table existed.
 
+            Filename STRING PRIMARY KEY,
             SampleID STRING NOT NULL,
-            SampleTime INTEGER NOT NULL,
-
-         -- Data
-
-            duration INTEGER NOT NULL,
-            index_ INTEGER NOT NULL,
-            proccount INTEGER NOT NULL,
-            nodecount INTEGER NOT NULL,
-            reqid INTEGER NOT NULL,
-            starttime INTEGER NOT NULL,
+            Size INTEGER,
+            MTime INTEGER,
+            ImportTime INTEGER
+        );
+        """)
 
-         -- Other table-specific information
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS ingest_manifest_sampleid
+            ON ingest_manifest (SampleID);
+        """)
 
-            CONSTRAINT unique_rows UNIQUE (
-                SampleID, SampleTime, duration, index_, proccount, nodecount,
-                reqid, starttime
-            ),
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_runs (
+
+         -- One row per run of this program, or per CHECKPOINT_INTERVAL in
+         -- watch mode, as recorded by `recordRun`. "ReadSeconds" is the time
+         -- spent in `readXML`, which checks whether each file is blank, and
+         -- "ParseSeconds" is the time spent streaming the XML into rows. Both
+         -- are summed over the worker processes, so with "--processes" they
+         -- can add up to more than "WallSeconds". "Rows" counts every row
+         -- that was submitted, and "Duplicates" counts the rows of sample and
+         -- job data among them which were ignored because they were already
+         -- in the database. The peak resident set sizes are in bytes.
+
+            RunID INTEGER PRIMARY KEY,
+            Mode STRING NOT NULL,
+            StartTime INTEGER NOT NULL,
+            EndTime INTEGER NOT NULL,
+            BatchSize INTEGER,
+            Processes INTEGER,
+            Samples INTEGER NOT NULL,
+            Files INTEGER NOT NULL,
+            Bytes INTEGER NOT NULL,
+            Rows INTEGER NOT NULL,
+            Duplicates INTEGER NOT NULL,
+            DiscoverSeconds REAL NOT NULL,
+            ReadSeconds REAL NOT NULL,
+            ParseSeconds REAL NOT NULL,
+            InsertSeconds REAL NOT NULL,
+            WallSeconds REAL NOT NULL,
+            PeakRSS INTEGER,
+            WorkerPeakRSS INTEGER
+        );
+        """)
 
-            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_intervals (
+
+         -- One row per JobID, with the first and last SampleTime at which the
+         -- job was seen in each queue, and the number of samples it was seen
+         -- in there, so that questions about when a job waited or ran do not
+         -- have to scan every sample of it. The times are NULL, and the count
+         -- zero, for a queue the job has never been seen in. It is kept up to
+         -- date by `writeBatch`, in the same transaction as the manifest.
+
+            JobID STRING PRIMARY KEY,
+            FirstActive INTEGER,
+            LastActive INTEGER,
+            ActiveSamples INTEGER NOT NULL DEFAULT 0,
+            FirstBlocked INTEGER,
+            LastBlocked INTEGER,
+            BlockedSamples INTEGER NOT NULL DEFAULT 0,
+            FirstEligible INTEGER,
+            LastEligible INTEGER,
+            EligibleSamples INTEGER NOT NULL DEFAULT 0
         );
         """)
 
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS blocked (
+        CREATE TABLE IF NOT EXISTS jobs (
 
-         -- Metadata for our study
+         -- Surrogate key, referenced by the per-sample tables
 
-            SampleID STRING NOT NULL,
-            SampleTime INTEGER NOT NULL,
+            JobKey INTEGER PRIMARY KEY,
 
-         -- Data
+         -- Data which does not change from one sample to the next
 
             Account STRING NOT NULL,
             Class STRING NOT NULL,
             DRMJID INTEGER,
-            EEDuration INTEGER,
             GJID INTEGER NOT NULL,
             Group_ STRING NOT NULL,
             JobID STRING NOT NULL,
@@ -264,208 +1245,1792 @@ def initializeDatabase(connection):
             QOS STRING NOT NULL,
             ReqAWDuration INTEGER NOT NULL,
             ReqProcs INTEGER NOT NULL,
-            StartPriority INTEGER NOT NULL,
-            StartTime INTEGER NOT NULL,
-            State STRING NOT NULL,
             SubmissionTime INTEGER NOT NULL,
+            User STRING NOT NULL
+
+         -- Almost every JobID has exactly one row here. If a job is modified
+         -- while it waits, e.g. with `qalter` to change its walltime, it gets
+         -- a second row, so that no sample loses what it actually recorded.
+        );
+        """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS quarantine (
+
+         -- One row per value which could not be converted to the type given
+         -- in FIELD_TYPES, and which was stored as NULL instead. "Field" is
+         -- the name of the XML attribute, or of the column for values found
+         -- by `migrateDatabase`, and "Record" is the whole row as JSON.
+
+            SampleID STRING,
+            TableName STRING NOT NULL,
+            Field STRING NOT NULL,
+            Value TEXT,
+            Record TEXT
+        );
+        """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sample_info (
+            SampleID STRING PRIMARY KEY,
+            showbfError STRING,
+            showqError STRING
+        );
+        """)
+
+  # With "--delta", the job rows of each new `showq` sample are not stored one
+  # by one. Instead, the sample is numbered in "showq_snapshots", and the job
+  # rows only extend, close, or start "runs" in the "*_runs" tables, each of
+  # which stands for a job's rows in every snapshot from FirstSequence to
+  # LastSequence, or to the latest snapshot while LastSequence is NULL. Each
+  # attribute in LINEAR_FIELDS is the value at FirstTime plus its rate times
+  # the time since then, and every other attribute is the same throughout.
+  # The views below expand the runs back into rows, so nothing else needs to
+  # know which way a sample was stored.
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS showq_snapshots (
+            Sequence INTEGER PRIMARY KEY,
+            SampleID STRING NOT NULL UNIQUE,
+            SampleTime INTEGER NOT NULL
+        );
+        """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS active_runs (
+
+         -- Metadata for our study
+
+            JobKey INTEGER NOT NULL,
+            FirstSequence INTEGER NOT NULL,
+            LastSequence INTEGER,
+            FirstTime INTEGER NOT NULL,
+
+         -- Data
+
+            AWDuration INTEGER,
+            EEDuration INTEGER,
+            MasterHost INTEGER,
+            PAL INTEGER,
+            ReqNodes INTEGER,
+            RsvStartTime INTEGER,
+            RunPriority INTEGER,
+            StartPriority INTEGER NOT NULL,
+            StartTime INTEGER NOT NULL,
+            State INTEGER NOT NULL,
+            StatPSDed REAL NOT NULL,
+            StatPSUtl REAL NOT NULL,
             SuspendDuration INTEGER NOT NULL,
-            User STRING NOT NULL,
+
+         -- Rates of change, which are NULL until the second snapshot
+
+            AWDurationRate REAL,
+            EEDurationRate REAL,
+            StartPriorityRate REAL,
+            StatPSDedRate REAL,
+            StatPSUtlRate REAL,
 
          -- Other table-specific information
 
-            CONSTRAINT unique_rows UNIQUE (
+            CONSTRAINT unique_rows UNIQUE (JobKey, FirstSequence),
 
-             -- This can probably simplify to SampleID, SampleTime, JobID ...
+            FOREIGN KEY(JobKey) REFERENCES jobs(JobKey)
+        );
+        """)
 
-                SampleID, SampleTime, Account, Class, GJID, Group_, JobID,
-                JobName, QOS, ReqAWDuration, ReqProcs, StartPriority,
-                StartTime, State, SubmissionTime, SuspendDuration, User
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS blocked_runs (
 
+         -- Metadata for our study
+
+            JobKey INTEGER NOT NULL,
+            FirstSequence INTEGER NOT NULL,
+            LastSequence INTEGER,
+            FirstTime INTEGER NOT NULL,
+
+         -- Data
+
+            EEDuration INTEGER,
+            StartPriority INTEGER NOT NULL,
+            StartTime INTEGER NOT NULL,
+            State INTEGER NOT NULL,
+            SuspendDuration INTEGER NOT NULL,
+
+         -- Rates of change, which are NULL until the second snapshot
+
+            EEDurationRate REAL,
+            StartPriorityRate REAL,
+
+         -- Other table-specific information
+
+            CONSTRAINT unique_rows UNIQUE (JobKey, FirstSequence),
+
+            FOREIGN KEY(JobKey) REFERENCES jobs(JobKey)
+        );
+        """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS eligible_runs (
+
+         -- Metadata for our study
+
+            JobKey INTEGER NOT NULL,
+            FirstSequence INTEGER NOT NULL,
+            LastSequence INTEGER,
+            FirstTime INTEGER NOT NULL,
+
+         -- Data
+
+            EEDuration INTEGER,
+            RsvStartTime INTEGER,
+            StartPriority INTEGER NOT NULL,
+            StartTime INTEGER NOT NULL,
+            State INTEGER NOT NULL,
+            SuspendDuration INTEGER NOT NULL,
+
+         -- Rates of change, which are NULL until the second snapshot
+
+            EEDurationRate REAL,
+            StartPriorityRate REAL,
+
+         -- Other table-specific information
+
+            CONSTRAINT unique_rows UNIQUE (JobKey, FirstSequence),
+
+            FOREIGN KEY(JobKey) REFERENCES jobs(JobKey)
+        );
+        """)
+
+  # The open runs are looked up by their NULL LastSequence with every snapshot,
+  # and a range of SampleTime becomes a range of Sequence, which the two
+  # sequence indexes narrow down from either end. Just as for the per-sample
+  # tables, queries by job go through JobKey.
+
+    for table in ["active_runs", "blocked_runs", "eligible_runs"]:
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS %s_jobkey ON %s (JobKey);
+            """ % (table, table))
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS %s_firstsequence
+                ON %s (FirstSequence);
+            """ % (table, table))
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS %s_lastsequence
+                ON %s (LastSequence);
+            """ % (table, table))
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS showq_snapshots_sampletime
+            ON showq_snapshots (SampleTime);
+        """)
+
+  # Secondary indexes for the analysis workload. Every analysis script filters
+  # the job tables by Account and User, by a range of SampleTime, or by JobID,
+  # and lookups by SampleID are already served by the leftmost column of each
+  # "unique_rows" index.
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS jobs_account_user ON jobs (Account, User);
+        """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS jobs_jobid ON jobs (JobID);
+        """)
+
+  # Views with the same names and columns, in the same order, as the original
+  # "active", "blocked", and "eligible" tables. The second half of each view
+  # expands the runs, and the values of LINEAR_FIELDS are computed in exactly
+  # the same way as `extendRun` checked them, so they come out exactly as they
+  # were parsed. The integer ones are cast back, because the rate is REAL.
+
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS active AS
+            SELECT  s.SampleID, s.SampleTime, j.Account, s.AWDuration,
+                    j.Class, j.DRMJID, s.EEDuration, j.GJID, j.Group_,
+                    j.JobID, j.JobName, s.MasterHost,
+                    (SELECT Name FROM pal_codes WHERE Code = s.PAL) AS PAL,
+                    j.QOS, j.ReqAWDuration, s.ReqNodes, j.ReqProcs,
+                    s.RsvStartTime, s.RunPriority, s.StartPriority,
+                    s.StartTime,
+                    (SELECT Name FROM state_codes WHERE Code = s.State)
+                        AS State,
+                    s.StatPSDed, s.StatPSUtl, j.SubmissionTime,
+                    s.SuspendDuration, j.User
+                FROM active_samples AS s
+                INNER JOIN jobs AS j ON s.JobKey = j.JobKey
+            UNION ALL
+            SELECT  p.SampleID, p.SampleTime, j.Account,
+                    CAST(r.AWDuration + coalesce(r.AWDurationRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS INTEGER)
+                        AS AWDuration,
+                    j.Class, j.DRMJID,
+                    CAST(r.EEDuration + coalesce(r.EEDurationRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS INTEGER)
+                        AS EEDuration,
+                    j.GJID, j.Group_, j.JobID, j.JobName, r.MasterHost,
+                    (SELECT Name FROM pal_codes WHERE Code = r.PAL) AS PAL,
+                    j.QOS, j.ReqAWDuration, r.ReqNodes, j.ReqProcs,
+                    r.RsvStartTime, r.RunPriority,
+                    CAST(r.StartPriority + coalesce(r.StartPriorityRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS INTEGER)
+                        AS StartPriority,
+                    r.StartTime,
+                    (SELECT Name FROM state_codes WHERE Code = r.State)
+                        AS State,
+                    r.StatPSDed + coalesce(r.StatPSDedRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS StatPSDed,
+                    r.StatPSUtl + coalesce(r.StatPSUtlRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS StatPSUtl,
+                    j.SubmissionTime, r.SuspendDuration, j.User
+                FROM active_runs AS r
+                INNER JOIN showq_snapshots AS p
+                    ON p.Sequence >= r.FirstSequence
+                        AND (r.LastSequence IS NULL
+                            OR p.Sequence <= r.LastSequence)
+                INNER JOIN jobs AS j ON r.JobKey = j.JobKey;
+        """)
+
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS blocked AS
+            SELECT  s.SampleID, s.SampleTime, j.Account, j.Class, j.DRMJID,
+                    s.EEDuration, j.GJID, j.Group_, j.JobID, j.JobName, j.QOS,
+                    j.ReqAWDuration, j.ReqProcs, s.StartPriority, s.StartTime,
+                    (SELECT Name FROM state_codes WHERE Code = s.State)
+                        AS State,
+                    j.SubmissionTime, s.SuspendDuration, j.User
+                FROM blocked_samples AS s
+                INNER JOIN jobs AS j ON s.JobKey = j.JobKey
+            UNION ALL
+            SELECT  p.SampleID, p.SampleTime, j.Account, j.Class, j.DRMJID,
+                    CAST(r.EEDuration + coalesce(r.EEDurationRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS INTEGER)
+                        AS EEDuration,
+                    j.GJID, j.Group_, j.JobID, j.JobName, j.QOS,
+                    j.ReqAWDuration, j.ReqProcs,
+                    CAST(r.StartPriority + coalesce(r.StartPriorityRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS INTEGER)
+                        AS StartPriority,
+                    r.StartTime,
+                    (SELECT Name FROM state_codes WHERE Code = r.State)
+                        AS State,
+                    j.SubmissionTime, r.SuspendDuration, j.User
+                FROM blocked_runs AS r
+                INNER JOIN showq_snapshots AS p
+                    ON p.Sequence >= r.FirstSequence
+                        AND (r.LastSequence IS NULL
+                            OR p.Sequence <= r.LastSequence)
+                INNER JOIN jobs AS j ON r.JobKey = j.JobKey;
+        """)
+
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS eligible AS
+            SELECT  s.SampleID, s.SampleTime, j.Account, j.Class, j.DRMJID,
+                    s.EEDuration, j.GJID, j.Group_, j.JobID, j.JobName, j.QOS,
+                    j.ReqAWDuration, j.ReqProcs, s.RsvStartTime,
+                    s.StartPriority, s.StartTime,
+                    (SELECT Name FROM state_codes WHERE Code = s.State)
+                        AS State,
+                    j.SubmissionTime, s.SuspendDuration, j.User
+                FROM eligible_samples AS s
+                INNER JOIN jobs AS j ON s.JobKey = j.JobKey
+            UNION ALL
+            SELECT  p.SampleID, p.SampleTime, j.Account, j.Class, j.DRMJID,
+                    CAST(r.EEDuration + coalesce(r.EEDurationRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS INTEGER)
+                        AS EEDuration,
+                    j.GJID, j.Group_, j.JobID, j.JobName, j.QOS,
+                    j.ReqAWDuration, j.ReqProcs, r.RsvStartTime,
+                    CAST(r.StartPriority + coalesce(r.StartPriorityRate, 0) *
+                        (p.SampleTime - r.FirstTime) AS INTEGER)
+                        AS StartPriority,
+                    r.StartTime,
+                    (SELECT Name FROM state_codes WHERE Code = r.State)
+                        AS State,
+                    j.SubmissionTime, r.SuspendDuration, j.User
+                FROM eligible_runs AS r
+                INNER JOIN showq_snapshots AS p
+                    ON p.Sequence >= r.FirstSequence
+                        AND (r.LastSequence IS NULL
+                            OR p.Sequence <= r.LastSequence)
+                INNER JOIN jobs AS j ON r.JobKey = j.JobKey;
+        """)
+
+  # Databases that were built before the manifest existed have only the
+  # "sample_info" table to say what has been imported, so the manifest is
+  # seeded from it once, with one row for each file a sample could have had.
+
+    cursor.execute("SELECT count(*) AS n FROM ingest_manifest;")
+    if cursor.fetchone()[0] == 0:
+        for each in ["showbf", "showq", "showqc"]:
+            for suffix in ["-err.xml", "-out.xml"]:
+                cursor.execute("""
+                    INSERT OR IGNORE INTO ingest_manifest
+                        (Filename, SampleID)
+                    SELECT ? || SampleID || ?, SampleID FROM sample_info;
+                    """, (each + "/", suffix))
+
+  # Record which version of the schema this is. Older databases are rebuilt
+  # by `migrateDatabase` before this function ever sees them.
+
+    cursor.execute("PRAGMA user_version = %d;" % SCHEMA_VERSION)
+
+  # Commit changes
+
+    connection.commit()
+
+    return
+
+###
+
+def initializeSamples(cursor, schema):
+
+  # Given a `Cursor` object and the name of a database schema, such as "main"
+  # or an attached monthly shard, this function constructs the tables which
+  # hold one row per sample, or per job per sample, and their indexes, in that
+  # schema. It does not commit.
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS %s.active_samples (
+
+         -- Metadata for our study
+
+            SampleID STRING NOT NULL,
+            SampleTime INTEGER NOT NULL,
+            JobKey INTEGER NOT NULL,
+
+         -- Data
+
+            AWDuration INTEGER,
+            EEDuration INTEGER,
+            MasterHost INTEGER,
+            PAL INTEGER,
+            ReqNodes INTEGER,
+            RsvStartTime INTEGER,
+            RunPriority INTEGER,
+            StartPriority INTEGER NOT NULL,
+            StartTime INTEGER NOT NULL,
+            State INTEGER NOT NULL,
+            StatPSDed REAL NOT NULL,
+            StatPSUtl REAL NOT NULL,
+            SuspendDuration INTEGER NOT NULL,
+
+         -- Other table-specific information
+
+         -- A job appears at most once in a given sample, and SampleTime is
+         -- determined by SampleID, so this is the natural key.
+
+            CONSTRAINT unique_rows UNIQUE (SampleID, JobKey),
+
+            FOREIGN KEY(JobKey) REFERENCES jobs(JobKey),
+            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
+        )
+        """ % schema)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS %s.backfill (
+
+         -- Metadata for our study
+
+            SampleID STRING NOT NULL,
+            SampleTime INTEGER NOT NULL,
+
+         -- Data
+
+            duration INTEGER NOT NULL,
+            index_ INTEGER NOT NULL,
+            proccount INTEGER NOT NULL,
+            nodecount INTEGER NOT NULL,
+            reqid INTEGER NOT NULL,
+            starttime INTEGER NOT NULL,
+
+         -- Other table-specific information
+
+            CONSTRAINT unique_rows UNIQUE (
+                SampleID, SampleTime, duration, index_, proccount, nodecount,
+                reqid, starttime
             ),
 
+            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
+        );
+        """ % schema)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS %s.blocked_samples (
+
+         -- Metadata for our study
+
+            SampleID STRING NOT NULL,
+            SampleTime INTEGER NOT NULL,
+            JobKey INTEGER NOT NULL,
+
+         -- Data
+
+            EEDuration INTEGER,
+            StartPriority INTEGER NOT NULL,
+            StartTime INTEGER NOT NULL,
+            State INTEGER NOT NULL,
+            SuspendDuration INTEGER NOT NULL,
+
+         -- Other table-specific information
+
+            CONSTRAINT unique_rows UNIQUE (SampleID, JobKey),
+
+            FOREIGN KEY(JobKey) REFERENCES jobs(JobKey),
             FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
         )
+        """ % schema)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS %s.cluster (
+
+         -- Metadata for our study
+
+            SampleID STRING NOT NULL,
+            SampleTime INTEGER NOT NULL,
+
+         -- Data
+
+            LocalActiveNodes INTEGER NOT NULL,
+            LocalAllocProcs INTEGER NOT NULL,
+            LocalConfigNodes INTEGER NOT NULL,
+            LocalIdleNodes INTEGER NOT NULL,
+            LocalIdleProcs INTEGER NOT NULL,
+            LocalUpNodes INTEGER NOT NULL,
+            LocalUpProcs INTEGER NOT NULL,
+            RemoteActiveNodes INTEGER NOT NULL,
+            RemoteAllocProcs INTEGER NOT NULL,
+            RemoteConfigNodes INTEGER NOT NULL,
+            RemoteIdleNodes INTEGER NOT NULL,
+            RemoteIdleProcs INTEGER NOT NULL,
+            RemoteUpNodes INTEGER NOT NULL,
+            RemoteUpProcs INTEGER NOT NULL,
+
+         -- Other table-specific information
+
+         -- There is exactly one row per `showq` sample.
+
+            CONSTRAINT unique_rows UNIQUE (SampleID),
+
+            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
+        )
+        """ % schema)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS %s.eligible_samples (
+
+         -- Metadata for our study
+
+            SampleID STRING NOT NULL,
+            SampleTime INTEGER NOT NULL,
+            JobKey INTEGER NOT NULL,
+
+         -- Data
+
+            EEDuration INTEGER,
+            RsvStartTime INTEGER,
+            StartPriority INTEGER NOT NULL,
+            StartTime INTEGER NOT NULL,
+            State INTEGER NOT NULL,
+            SuspendDuration INTEGER NOT NULL,
+
+         -- Other table-specific information
+
+            CONSTRAINT unique_rows UNIQUE (SampleID, JobKey),
+
+            FOREIGN KEY(JobKey) REFERENCES jobs(JobKey),
+            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
+        )
+        """ % schema)
+
+    for table in ["active_samples", "blocked_samples", "eligible_samples"]:
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS %s.%s_jobkey ON %s (JobKey);
+            """ % (schema, table, table))
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS %s.%s_sampletime ON %s (SampleTime);
+            """ % (schema, table, table))
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS %s.cluster_sampletime
+            ON cluster (SampleTime);
+        """ % schema)
+
+    return
+
+###
+
+def initializeWorker(known):
+
+  # Given a set of JobIDs, this function fills KNOWN_COMPLETED with them. It
+  # runs once in each `multiprocessing.Pool` worker as it starts, so that the
+  # workers skip the same completed jobs as this process would.
+
+    KNOWN_COMPLETED.update(known)
+
+    return
+
+###
+
+def insertBatch(cursor, batch, schema="main"):
+
+  # Given a `Cursor` object and a "batch" dictionary, this function writes
+  # every row in the batch to SQLite with one `executemany` per statement. The
+  # rows for the tables made by `initializeSamples` go into the given schema,
+  # which is how they reach a monthly shard, and everything else goes into the
+  # main database. It does not commit, so that the caller decides how much goes
+  # into a single transaction. It returns a tuple of the number of rows that
+  # were submitted, and the number of rows of sample and job data among them
+  # which were ignored, almost always because they were already there.
+
+  # A version of UPSERT that works with SQLite versions older than 3.24:
+
+    cursor.executemany("""
+        UPDATE sample_info SET showbfError = ? WHERE SampleID = ?;
+        """, batch["showbfError"])
+    cursor.executemany("""
+        INSERT OR IGNORE INTO sample_info (showbfError, SampleID)
+            VALUES (?, ?);
+        """, batch["showbfError"])
+
+    cursor.executemany("""
+        UPDATE sample_info SET showqError = ? WHERE SampleID = ?;
+        """, batch["showqError"])
+    cursor.executemany("""
+        INSERT OR IGNORE INTO sample_info (showqError, SampleID)
+            VALUES (?, ?);
+        """, batch["showqError"])
+
+    cursor.executemany("""
+        INSERT INTO quarantine (SampleID, TableName, Field, Value, Record)
+            VALUES (?, ?, ?, ?, ?);
+        """, batch["quarantine"])
+
+    now = int(time.time())
+    cursor.executemany("""
+        INSERT OR REPLACE INTO ingest_checkpoints (
+            Source, Size, MTime, Position, Finished, UpdateTime
+        ) VALUES (
+            ?, ?, ?, ?, ?, ?
+        )
+        """, [row + (now,) for row in batch["checkpoints"]])
+
+    cursor.executemany("""
+        INSERT OR REPLACE INTO ingest_manifest (
+            Filename, SampleID, Size, MTime, ImportTime
+        ) VALUES (
+            ?, ?, ?, ?, ?
+        )
+        """, [row + (now,) for row in batch["manifest"]])
+
+    num_ignored = 0
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO %s.backfill (
+            SampleID, SampleTime, duration, index_, proccount,
+            nodecount, reqid, starttime
+        ) VALUES (
+            ?, ?, ?, ?, ?, ?, ?, ?
+        )
+        """ % schema, batch["backfill"])
+    num_ignored += len(batch["backfill"]) - max(cursor.rowcount, 0)
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO completed (
+            AWDuration, Account, Class, CompletionCode, CompletionTime,
+            DRMJID, EEDuration, GJID, Group_, JobID, JobName, MasterHost,
+            PAL, QOS, ReqAWDuration, ReqNodes, ReqProcs, StartTime,
+            StatPSDed, StatPSUtl, State, SubmissionTime, SuspendDuration,
+            User
+        ) VALUES (
+            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+            ?, ?, ?
+        )
+        """, batch["completed"])
+    num_ignored += len(batch["completed"]) - max(cursor.rowcount, 0)
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO %s.cluster (
+            SampleID, SampleTime, LocalActiveNodes, LocalAllocProcs,
+            LocalConfigNodes, LocalIdleNodes, LocalIdleProcs, LocalUpNodes,
+            LocalUpProcs, RemoteActiveNodes, RemoteAllocProcs,
+            RemoteConfigNodes, RemoteIdleNodes, RemoteIdleProcs, RemoteUpNodes,
+            RemoteUpProcs
+        ) VALUES (
+            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+        )
+        """ % schema, batch["cluster"])
+    num_ignored += len(batch["cluster"]) - max(cursor.rowcount, 0)
+
+  # The job rows are split into the static part, which is replaced by its
+  # JobKey, and the part which changes from one sample to the next.
+
+    (encoded, keys) = encodeJobs(cursor, batch)
+
+    for table in ["active", "blocked", "eligible"]:
+        dynamic = []
+        positions = []
+        for field in JOB_FIELDS[table]:
+            if field not in STATIC_FIELDS:
+                dynamic.append(field)
+                positions.append(JOB_FIELDS[table].index(field) + 2)
+        static = []
+        for field in STATIC_FIELDS:
+            static.append(JOB_FIELDS[table].index(field) + 2)
+        rows = []
+        for row in encoded[table]:
+            jobkey = keys.get(tuple([row[i] for i in static]))
+            if jobkey is None:
+                continue
+            rows.append((row[0], row[1], jobkey) +
+                tuple([row[i] for i in positions]))
+        cursor.executemany("""
+            INSERT OR IGNORE INTO %s.%s_samples (
+                SampleID, SampleTime, JobKey, %s
+            ) VALUES (
+                ?, ?, ?%s
+            )
+            """ % (schema, table, ", ".join(dynamic), ", ?" * len(dynamic)),
+            rows)
+        num_ignored += len(batch[table]) - max(cursor.rowcount, 0)
+
+    num_rows = 0
+    for key in batch:
+        if key not in ["checkpoints", "timings"]:
+            num_rows += len(batch[key])
+
+    return (num_rows, num_ignored)
+
+###
+
+def insertSnapshots(cursor, batch):
+
+  # Given a `Cursor` object and a "batch" dictionary, this function stores the
+  # job rows of the batch's `showq` samples as snapshots and runs, as described
+  # in `initializeDatabase`. Every snapshot closes or extends every open run,
+  # so only samples at least as new as the latest snapshot can be stored this
+  # way, in order of SampleTime, and any others are left to `insertBatch`. It
+  # does not commit. It returns a tuple of a copy of the batch without the job
+  # rows that it has taken care of, the number of those rows, and the number
+  # among them which were ignored, usually because the sample was already
+  # stored.
+
+  # Every `showq` sample has a "cluster" row, even when all of its queues are
+  # empty, and such a sample must still close the runs that are open, so the
+  # snapshots are taken from those rows rather than from the job rows.
+
+    times = {}
+    for row in batch["cluster"]:
+        if row[1] is not None:
+            times[row[0]] = row[1]
+
+    cursor.execute("""
+        SELECT Sequence, SampleTime FROM showq_snapshots
+            ORDER BY Sequence DESC LIMIT 1;
         """)
+    latest = cursor.fetchone()
+    previous = None
+    if latest is not None:
+        previous = latest[0]
+
+    stored = set()
+    samples = []
+    for sampleid in times:
+        cursor.execute("""
+            SELECT Sequence FROM showq_snapshots WHERE SampleID = ?;
+            """, (sampleid,))
+        if cursor.fetchone() is not None:
+            stored.add(sampleid)
+        elif latest is None or times[sampleid] >= latest[1]:
+            samples.append((times[sampleid], sampleid))
+    samples.sort()
+
+    taken = set([sampleid for (now, sampleid) in samples])
+
+    rest = {}
+    for key in batch:
+        rest[key] = batch[key]
+
+    chosen = newBatch()
+    num_ignored = 0
+    num_rows = 0
+    for table in ["active", "blocked", "eligible"]:
+        rest[table] = []
+        for row in batch[table]:
+            if row[0] in stored:
+                num_ignored += 1
+                num_rows += 1
+            elif row[0] in taken:
+                chosen[table].append(row)
+                num_rows += 1
+            else:
+                rest[table].append(row)
+
+    if len(samples) == 0:
+        return (rest, num_rows, num_ignored)
+
+    (encoded, keys) = encodeJobs(cursor, chosen)
+
+  # Gather the dynamic attributes of every job row by sample, and load the
+  # runs which are still open, along with which attributes cannot be NULL, so
+  # that the same rows are left out as would be by the "*_samples" tables.
+
+    created = {}
+    fields = {}
+    notnull = {}
+    rows = {}
+    runs = {}
+    updated = {}
+    for table in ["active", "blocked", "eligible"]:
+        fields[table] = []
+        positions = []
+        for (i, field) in enumerate(JOB_FIELDS[table]):
+            if field not in STATIC_FIELDS:
+                fields[table].append(field)
+                positions.append(i + 2)
+        static = []
+        for field in STATIC_FIELDS:
+            static.append(JOB_FIELDS[table].index(field) + 2)
+        rows[table] = {}
+        for row in encoded[table]:
+            jobkey = keys.get(tuple([row[i] for i in static]))
+            values = dict(zip(fields[table], [row[i] for i in positions]))
+            if row[0] not in rows[table]:
+                rows[table][row[0]] = []
+            rows[table][row[0]].append((jobkey, values))
+        notnull[table] = []
+        for column in cursor.execute("PRAGMA table_info(%s_runs);" % table):
+            if column[3] == 1 and column[1] in fields[table]:
+                notnull[table].append(column[1])
+        runs[table] = {}
+        cursor.execute("""
+            SELECT rowid, * FROM %s_runs WHERE LastSequence IS NULL;
+            """ % table)
+        names = [each[0] for each in cursor.description]
+        for row in cursor.fetchall():
+            run = dict(zip(names, row))
+            runs[table][run["JobKey"]] = run
+        created[table] = []
+        updated[table] = {}
+
+  # Number each sample as the next snapshot, and then extend the runs that it
+  # continues, close the rest, and start new runs for everything else.
+
+    for (now, sampleid) in samples:
+        cursor.execute("""
+            INSERT INTO showq_snapshots (SampleID, SampleTime) VALUES (?, ?);
+            """, (sampleid, now))
+        sequence = cursor.lastrowid
+        for table in ["active", "blocked", "eligible"]:
+            current = {}
+            for (jobkey, values) in rows[table].get(sampleid, []):
+                if jobkey is None or jobkey in current:
+                    num_ignored += 1
+                    continue
+                missing = False
+                for field in notnull[table]:
+                    if values[field] is None:
+                        missing = True
+                if missing:
+                    num_ignored += 1
+                    continue
+                run = runs[table].get(jobkey)
+                if run is not None:
+                    before = dict(run)
+                    if extendRun(run, values, now):
+                        if "rowid" in run and run != before:
+                            updated[table][run["rowid"]] = run
+                        current[jobkey] = run
+                        continue
+                run = {
+                    "FirstSequence": sequence,
+                    "FirstTime": now,
+                    "JobKey": jobkey,
+                    "LastSequence": None
+                }
+                run.update(values)
+                for field in fields[table]:
+                    if field in LINEAR_FIELDS:
+                        run[field + "Rate"] = None
+                created[table].append(run)
+                current[jobkey] = run
+            for jobkey in runs[table]:
+                run = runs[table][jobkey]
+                if current.get(jobkey) is not run:
+                    run["LastSequence"] = previous
+                    if "rowid" in run:
+                        updated[table][run["rowid"]] = run
+            runs[table] = current
+        previous = sequence
+
+  # Only the runs which were started, closed, or given their rates are written.
+
+    for table in ["active", "blocked", "eligible"]:
+        rates = []
+        for field in fields[table]:
+            if field in LINEAR_FIELDS:
+                rates.append(field + "Rate")
+        columns = ["JobKey", "FirstSequence", "LastSequence", "FirstTime"]
+        columns.extend(fields[table])
+        columns.extend(rates)
+        cursor.executemany("""
+            INSERT OR IGNORE INTO %s_runs (%s) VALUES (?%s);
+            """ % (table, ", ".join(columns), ", ?" * (len(columns) - 1)),
+            [tuple([run[each] for each in columns])
+                for run in created[table]])
+        assignments = ["LastSequence = ?"]
+        for each in rates:
+            assignments.append("%s = ?" % each)
+        cursor.executemany("""
+            UPDATE %s_runs SET %s WHERE rowid = ?;
+            """ % (table, ", ".join(assignments)),
+            [tuple([run["LastSequence"]] + [run[each] for each in rates] +
+                [rowid]) for (rowid, run) in updated[table].items()])
+
+    return (rest, num_rows, num_ignored)
+
+###
+
+def isBlank(source):
+
+  # Given a filename or file object "source", this function returns True if
+  # the file, once decompressed, contains nothing but whitespace, which means
+  # that the command which wrote it failed. It reads only until the first
+  # character that is not whitespace, because `showq -c` output can be large.
+
+    for chunk in iterChunks(source):
+        if len(chunk.strip()) > 0:
+            return False
+
+    return True
+
+###
+
+def iterChunks(source):
+
+  # Given a filename or file object "source", this generator yields the
+  # contents of the file, which are read XML_CHUNK_SIZE bytes at a time. A file
+  # that "collect-xml-data.py" compressed is recognized by its first bytes and
+  # decompressed one chunk at a time, so that it never has to be held in memory
+  # whole, and any other file is passed along as it is.
+
+    if hasattr(source, "read"):
+        xmlfile = source
+    else:
+        xmlfile = open(source, "rb")
+
+    try:
+        chunk = xmlfile.read(XML_CHUNK_SIZE)
+        decompressor = newDecompressor(chunk)
+        while len(chunk) > 0:
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            if len(chunk) > 0:
+                yield chunk
+            chunk = xmlfile.read(XML_CHUNK_SIZE)
+    finally:
+        if xmlfile is not source:
+            xmlfile.close()
+
+    return
+
+###
+
+def iterEvents(source):
+
+  # Given a filename or file object "source", this function returns a generator
+  # of the events in the XML, as described for `iterXML`. It uses `iterExpat`,
+  # which is the faster of the two, unless expat cannot be imported.
+
+    if expat is None:
+        return iterXML(source)
+
+    return iterExpat(source)
+
+###
+
+def iterExpat(source):
+
+  # Given a filename or file object "source", this generator yields exactly the
+  # same tuples as `iterXML`, but it drives expat itself instead of going
+  # through ElementTree. Everything we care about is in the attributes, so only
+  # the starts of elements are handled, and no element objects are built at
+  # all. With "ordered_attributes", expat hands over each element's attributes
+  # as the flat list that the tuples carry for grandchildren, so they are
+  # passed along as they are. The events from each chunk of the file are
+  # buffered by the handlers and yielded before the next chunk is parsed.
+
+    events = []
+    depth = [0]
+    parent = [None, None]
+
+    def startElement(tag, pairs):
+        depth[0] += 1
+        if depth[0] == 2:
+            parent[0] = tag
+            parent[1] = dict(zip(pairs[0::2], pairs[1::2]))
+            events.append((tag, parent[1], None, None))
+        elif depth[0] == 3:
+            events.append((parent[0], parent[1], tag, pairs))
+
+    def endElement(tag):
+        depth[0] -= 1
+
+    parser = expat.ParserCreate()
+    parser.ordered_attributes = True
+    if hasattr(parser, "returns_unicode"):
+        parser.returns_unicode = False
+    parser.StartElementHandler = startElement
+    parser.EndElementHandler = endElement
+
+    for chunk in iterChunks(source):
+        parser.Parse(chunk, False)
+        for event in events:
+            yield event
+        del events[:]
+
+    parser.Parse(b"", True)
+    for event in events:
+        yield event
+
+    return
+
+###
+
+def iterXML(source):
+
+  # Given a filename or file object "source", this generator streams the XML
+  # with `iterparse` and yields one tuple per element near the top of the
+  # document. For each child of the root element, such as `<cluster>` or
+  # `<queue option="active">`, it yields (tag, attrib, None, None), and for
+  # each grandchild, such as a `<job>` inside of a `<queue>`, it yields
+  # (parent tag, parent attrib, tag, pairs), where "pairs" is a flat list of
+  # the grandchild's attribute names and values, to be read with
+  # `pickAttributes`. Everything we care about in MOAB XML is stored in
+  # attributes, which are complete as soon as the "start" event fires, so
+  # each element is thrown away at its "end" event and memory use stays
+  # constant no matter how many jobs are in the file. This is the slower of
+  # the two ways to read the XML, and `iterExpat` is checked against it.
+
+  # ElementTree reads the file itself, so a compressed file is decompressed
+  # into memory first.
+
+    if hasattr(source, "read"):
+        start = source.tell()
+        head = source.read(len(ZSTD_MAGIC))
+        source.seek(start)
+    else:
+        with open(source, "rb") as xmlfile:
+            head = xmlfile.read(len(ZSTD_MAGIC))
+    if newDecompressor(head) is not None:
+        source = io.BytesIO(b"".join(iterChunks(source)))
+
+    depth = 0
+    parent = None
+
+    for event, elem in ElementTree.iterparse(source, events=("start", "end")):
+
+        if event == "start":
+            depth += 1
+            if depth == 2:
+                parent = elem
+                yield (elem.tag, elem.attrib, None, None)
+            elif depth == 3:
+                pairs = []
+                for item in elem.items():
+                    pairs.extend(item)
+                yield (parent.tag, parent.attrib, elem.tag, pairs)
+            continue
+
+        depth -= 1
+        if depth == 2:
+            parent.remove(elem)
+        elif depth == 1:
+            elem.clear()
+
+    return
+
+###
+
+def listDataFiles(data_dir):
+
+  # Given a "data_dir" string indicating the path to the data directory, this
+  # function returns a set of the names of all files in the "showbf", "showq",
+  # and "showqc" subdirectories. The names are relative to the data directory,
+  # e.g. "showq/<uuid>-out.xml", just like the "Filename" column of the
+  # "ingest_manifest" table.
+
+    filenames = set()
+    for each in ["showbf", "showq", "showqc"]:
+        dirname = os.path.join(data_dir, each)
+        if not os.path.isdir(dirname):
+            continue
+        for filename in os.listdir(dirname):
+            filenames.add(each + "/" + filename)
+
+    return filenames
+
+###
+
+def loadCompleted(connection):
+
+  # Given a `Connection` object, this function replaces the contents of
+  # KNOWN_COMPLETED with the JobIDs of the completed jobs in the database
+  # which completed no more than COMPLETED_HORIZON seconds before the newest
+  # one. It returns the number of JobIDs in the set.
+
+    cursor = connection.cursor()
+
+    query = """
+        SELECT  JobID
+            FROM
+                completed
+            WHERE
+                CompletionTime >= (
+                    SELECT max(CompletionTime) FROM completed
+                ) - ?
+        ;
+        """
+
+    KNOWN_COMPLETED.clear()
+    for row in cursor.execute(query, (COMPLETED_HORIZON,)):
+        KNOWN_COMPLETED.add(row[0])
+
+    return len(KNOWN_COMPLETED)
+
+###
+
+def main():
+
+  # This is the first function that will execute.
+
+  # Parse the command line options. The batch size is the number of samples
+  # whose rows are written to SQLite together in a single transaction.
+
+    parser = optparse.OptionParser(usage="%prog [options] [tarball ...]")
+    parser.add_option("-b", "--batch-size", dest="batch_size", type="int",
+        default=100, help="number of samples to import per transaction")
+    parser.add_option("-p", "--processes", dest="processes", type="int",
+        default=1, help="number of worker processes for parsing XML")
+    parser.add_option("-j", "--journal-mode", dest="journal_mode",
+        type="choice", choices=["delete", "wal"], default="delete",
+        help="SQLite journal mode, either \"delete\", or \"wal\" so that "
+        "readers never wait for the import, which is only safe when they all "
+        "run on the same host [default: %default]")
+    parser.add_option("-r", "--report", dest="report", type="int", default=0,
+        metavar="RUNS", help="instead of importing anything, show how long "
+        "each phase of the last RUNS imports took")
+    parser.add_option("-d", "--delta", dest="delta", action="store_true",
+        default=False, help="store each new `showq` sample as the changes "
+        "since the one before it")
+    parser.add_option("-m", "--monthly-shards", dest="shards",
+        action="store_true", default=False, help="write the rows of each "
+        "sample to a separate database file for its month")
+    parser.add_option("-s", "--settle", dest="settle", type="int",
+        default=30, help="with --watch, seconds a sample's files must be "
+        "left unmodified before it is imported")
+    parser.add_option("-w", "--watch", dest="watch", type="int", default=0,
+        metavar="SECONDS", help="keep running, and poll the data "
+        "directories for new samples every SECONDS seconds")
+
+    (options, args) = parser.parse_args()
+
+    if options.batch_size < 1:
+        parser.error("batch size must be a positive integer")
+    if options.processes < 1:
+        parser.error("number of processes must be a positive integer")
+    if options.watch < 0 or options.settle < 0:
+        parser.error("watch and settle times cannot be negative")
+    if options.report < 0:
+        parser.error("number of runs to report cannot be negative")
+
+  # Store current working directory.
+
+    cwd = os.getcwd()
+
+  # Find the data directory, where this script is running remotely at OLCF and
+  # locally on a personal laptop, for example.
+
+    if os.path.isdir("/lustre/atlas/proj-shared/csc108/data/moab/"):
+        data_dir = "/lustre/atlas/proj-shared/csc108/data/moab/"
+    elif os.path.isdir(os.path.join(cwd, "moab")):
+        data_dir = os.path.join(cwd, "moab")
+    else:
+        raise Exception("Data directory not found.")
+
+  # Create the database file in the data directory and connect Python to it.
+
+    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
+
+  # The report only reads from the database, and it needs nothing else.
+
+    if options.report > 0:
+        if os.path.isfile(dbfilename) is False:
+            raise Exception("Database not found: %s" % dbfilename)
+        connection = sqlite3.connect(dbfilename)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA query_only = true;")
+        if connection.execute("""
+                SELECT name FROM sqlite_master WHERE name = 'ingest_runs';
+                """).fetchone() is None:
+            print("No import runs have been recorded yet.")
+        else:
+            showReport(connection, options.report)
+        connection.close()
+        return
+
+  # Bring an existing database up to date with the current schema first.
+
+    migrateDatabase(dbfilename)
+
+    connection = sqlite3.connect(dbfilename)
+
+  # Enable users to access columns by name instead of by index.
+
+    connection.row_factory = sqlite3.Row
+
+  # Switch to the requested journal mode before anything is written. In WAL
+  # mode, the analysis programs can keep reading while this process writes.
+
+    journal_mode = setJournalMode(connection, "main", options.journal_mode)
+    if journal_mode != options.journal_mode:
+        print("Could not switch to the \"%s\" journal mode with SQLite %s, "
+            "e.g. because another program has the database open; using \"%s\" "
+            "instead" % (options.journal_mode, sqlite3.sqlite_version,
+            journal_mode))
+
+  # Create the database itself, if it doesn't exist.
+
+    initializeDatabase(connection)
+
+  # Remember which completed jobs have already been imported recently, so that
+  # the rows of `showq -c` files which repeat them are not even built.
+
+    loadCompleted(connection)
+
+  # Fill the "job_intervals" table from the existing data, the first time.
+
+    seedIntervals(connection, data_dir)
+
+  # With monthly shards, the rows for the tables made by `initializeSamples`
+  # go to "moab-data-<YYYY-MM>.sqlite" files next to the main database, which
+  # keeps everything else, such as "jobs", "completed", and the manifest.
+
+    shard_dir = None
+    if options.shards:
+        shard_dir = data_dir
+
+  # When tarballs are given on the command line, import those instead of the
+  # data directories.
+
+    if len(args) > 0:
+
+        run = newRun("tarball", options.batch_size, 1)
+        started = time.time()
+        num_rows = 0
+        num_samples = 0
+
+        for tarfilename in args:
+            (rows, samples) = importTarball(connection, tarfilename,
+                options.batch_size, shard_dir, run, options.delta)
+            num_rows += rows
+            num_samples += samples
+
+        run["Samples"] = num_samples
+
+        elapsed = time.time() - started
+
+        print("Imported %d rows from %d samples in %d tarballs in %.2f "
+            "seconds (%.0f rows/sec)" % (num_rows, num_samples, len(args),
+            elapsed, num_rows / max(elapsed, 1e-6)))
+
+        recordRun(connection, run)
+        checkpointDatabase(connection)
+        connection.close()
+
+        return
+
+  # In watch mode, this process keeps running and never returns on its own.
+
+    if options.watch > 0:
+        watchDirectories(connection, data_dir, options.watch, options.settle,
+            shard_dir, options.delta)
+        connection.close()
+        return
+
+  # Filter directories to find the UUIDs (SampleIDs) of newly collected data
+  # that needs to be imported. Every phase of the run is timed, and the times
+  # are recorded in "ingest_runs" at the end.
+
+    run = newRun("directories", options.batch_size, options.processes)
+
+    uuids = findNewUUIDs(connection, data_dir)
+
+  # With "--delta", samples can only be stored as snapshots in order of time,
+  # so they are imported in the order in which their `showq` files were
+  # written, rather than in the order of their UUIDs.
+
+    if options.delta:
+        uuids = sortSamples(data_dir, uuids)
+
+    run["DiscoverSeconds"] = time.time() - run["StartTime"]
+    run["Samples"] = len(uuids)
+
+  # Start populating the database from the raw XML files. Each sample is
+  # parsed into its own batch of rows, either here or in a pool of worker
+  # processes, and the results come back in order so that this process can
+  # merge them and write one transaction per "batch_size" samples. Only this
+  # process ever touches the SQLite connection.
+
+    started = time.time()
+    num_rows = 0
+
+    tasks = [(data_dir, sampleid) for sampleid in uuids]
+
+    pool = None
+    if options.processes > 1:
+        pool = multiprocessing.Pool(options.processes, initializeWorker,
+            (KNOWN_COMPLETED,))
+        results = pool.imap(parseSample, tasks, 4)
+    else:
+        results = (parseSample(task) for task in tasks)
+
+    batch = newBatch()
+    num_samples = 0
+    for sample in results:
+        mergeBatch(batch, sample)
+        num_samples += 1
+        if num_samples % options.batch_size == 0:
+            num_rows += writeBatch(connection, batch, shard_dir, run,
+                options.delta)
+            batch = newBatch()
+
+    num_rows += writeBatch(connection, batch, shard_dir, run, options.delta)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+  # Then the samples which the collector appended to segment files instead,
+  # which come after the loose files because they are newer.
+
+    (rows, samples) = importSegments(connection, data_dir, options.batch_size,
+        shard_dir, run, options.delta)
+    num_rows += rows
+    num_samples += samples
+    run["Samples"] += samples
+
+    elapsed = time.time() - started
+
+  # Report the ingest throughput, which is the easiest way to notice when the
+  # nightly job starts getting slower.
+
+    print("Imported %d rows from %d samples in %.2f seconds (%.0f rows/sec) "
+        "using %d of %d processors" % (num_rows, num_samples, elapsed,
+        num_rows / max(elapsed, 1e-6), options.processes,
+        multiprocessing.cpu_count()))
+
+  # When we are finished, record the run, let SQLite refresh its query planner
+  # statistics if they have gone stale, empty the write-ahead log if no reader
+  # still needs it, and close the connection to the database.
+
+    recordRun(connection, run)
+    connection.execute("PRAGMA optimize;")
+    if checkpointDatabase(connection) > 0:
+        print("The write-ahead log is still in use by readers, so it will be "
+            "checkpointed next time")
+    connection.close()
+
+    return
+
+###
+
+def mergeBatch(batch, other):
+
+  # Given two "batch" dictionaries, this function appends all of the rows in
+  # "other" to "batch".
+
+    for key in other:
+        batch[key].extend(other[key])
+
+    return
+
+###
+
+def migrateDatabase(dbfilename):
+
+  # Given a string "dbfilename" indicating the path to the database file, this
+  # function upgrades an existing database to the current SCHEMA_VERSION. The
+  # new database is built next to the old one from scratch by copying every
+  # row across, and then the files are swapped. This way, nothing is ever
+  # modified in place, a crash part way through leaves the old database
+  # untouched, and the old database is kept as "<dbfilename>.v<version>" in
+  # case humans need to check the work. It returns nothing.
+
+    if os.path.isfile(dbfilename) is False:
+        return
+
+    connection = sqlite3.connect(dbfilename)
+    version = connection.execute("PRAGMA user_version;").fetchone()[0]
+    tables = []
+    views = []
+    for row in connection.execute("""
+            SELECT name, type FROM sqlite_master
+                WHERE type = 'table' OR type = 'view';
+            """):
+        if row[1] == "table":
+            tables.append(row[0])
+        else:
+            views.append(row[0])
+    connection.close()
+
+    if version >= SCHEMA_VERSION or "sample_info" not in tables:
+        return
+
+    started = time.time()
+
+    newfilename = dbfilename + ".migrating"
+    if os.path.isfile(newfilename):
+        os.remove(newfilename)
+
+    connection = sqlite3.connect(newfilename)
+    connection.row_factory = sqlite3.Row
+    initializeDatabase(connection)
+
+    cursor = connection.cursor()
+    cursor.execute("ATTACH DATABASE ? AS old;", (dbfilename,))
+
+  # The columns of these tables have not changed, so the rows can be copied
+  # straight across, in their original order. The INSERT OR IGNORE drops any
+  # rows which only differed from each other in columns outside of the new
+  # natural keys. From version 4 on, there can be monthly shards, which are
+  # not migrated, and their rows refer to the jobs and codes by key, so those
+  # are copied across as well, keys and all, along with the quarantine.
+
+    copied = ["backfill", "cluster", "completed", "ingest_checkpoints",
+        "ingest_manifest", "ingest_runs", "sample_info"]
+    if version >= 4:
+        copied.extend(["jobs", "pal_codes", "quarantine", "state_codes"])
+
+    for table in copied:
+        if table not in tables:
+            continue
+        columns = []
+        for row in cursor.execute("PRAGMA old.table_info(%s);" % table):
+            columns.append(row["name"])
+        cursor.execute("""
+            INSERT OR IGNORE INTO main.%s (%s)
+                SELECT %s FROM old.%s ORDER BY rowid;
+            """ % (table, ", ".join(columns), ", ".join(columns), table))
+
+  # The job rows are read through the old "active", "blocked", and "eligible"
+  # tables, or views, in the same form that the XML parsers produce, so that
+  # `insertBatch` can split them between "jobs" and the per-sample tables.
+  # Samples that were stored as snapshots come out of the views expanded, so
+  # they are stored one row at a time in the new database.
+  # Nothing is committed until the end, because committing resets every open
+  # cursor in older versions of pysqlite.
+
+    reader = connection.cursor()
+    for table in ["active", "blocked", "eligible"]:
+        if table not in tables and table not in views:
+            continue
+        columns = ["SampleID", "SampleTime"]
+        for field in JOB_FIELDS[table]:
+            if field == "Group":
+                columns.append("Group_")
+            else:
+                columns.append(field)
+        order = ""
+        if table in tables:
+            order = "ORDER BY rowid"
+        reader.execute("SELECT %s FROM old.%s %s;" %
+            (", ".join(columns), table, order))
+        while True:
+            rows = reader.fetchmany(10000)
+            if len(rows) == 0:
+                break
+            batch = newBatch()
+            for row in rows:
+                batch[table].append(tuple(row))
+            insertBatch(cursor, batch)
+
+  # Older databases stored whatever string the XML had. SQLite has already
+  # turned every well-formed number into a native one on the way in, because
+  # of the column types, so any text left in a numeric column is malformed,
+  # and it is moved to the quarantine. This costs one scan per table. Just as
+  # during an import, the value becomes NULL, or the row is dropped if the
+  # column cannot be NULL.
+
+    for table in ["active_samples", "backfill", "blocked_samples", "cluster",
+            "completed", "eligible_samples", "jobs"]:
+        columns = []
+        numeric = []
+        notnull = []
+        for row in cursor.execute("PRAGMA main.table_info(%s);" % table):
+            columns.append(row["name"])
+            if row["type"] in ["INTEGER", "REAL"] and row["pk"] == 0:
+                numeric.append(row["name"])
+                if row["notnull"] == 1:
+                    notnull.append(row["name"])
+        checks = []
+        types = []
+        for column in numeric:
+            checks.append("typeof(%s) IN ('text', 'blob')" % column)
+            types.append("typeof(%s)" % column)
+        reader.execute("SELECT rowid, %s, %s FROM main.%s WHERE %s;" %
+            (", ".join(columns), ", ".join(types), table,
+            " OR ".join(checks)))
+        for row in reader.fetchall():
+            record = {}
+            for (i, column) in enumerate(columns):
+                record[column] = row[i + 1]
+            rowid = row[0]
+            for (i, column) in enumerate(numeric):
+                if row[len(columns) + 1 + i] not in ["text", "blob"]:
+                    continue
+                cursor.execute("""
+                    INSERT INTO quarantine (
+                        SampleID, TableName, Field, Value, Record
+                    ) VALUES (
+                        ?, ?, ?, ?, ?
+                    )
+                    """, (record.get("SampleID"), table, column,
+                    record[column], json.dumps(record, sort_keys=True)))
+                if column in notnull:
+                    cursor.execute("DELETE FROM main.%s WHERE rowid = ?;" %
+                        table, (rowid,))
+                else:
+                    cursor.execute("UPDATE main.%s SET %s = NULL "
+                        "WHERE rowid = ?;" % (table, column), (rowid,))
+        if table == "jobs":
+            for each in ["active", "blocked", "eligible"]:
+                cursor.execute("""
+                    DELETE FROM main.%s_samples
+                        WHERE JobKey NOT IN (SELECT JobKey FROM main.jobs);
+                    """ % each)
+
+    connection.commit()
+    cursor.execute("DETACH DATABASE old;")
+
+  # Running this again seeds the manifest, if the old database had none. Then,
+  # gather statistics so the query planner knows how selective the new
+  # indexes are.
+
+    initializeDatabase(connection)
+    connection.execute("ANALYZE;")
+    connection.commit()
+    connection.close()
+
+    backup = "%s.v%d" % (dbfilename, version)
+    os.rename(dbfilename, backup)
+    os.rename(newfilename, dbfilename)
+
+    print("Migrated %s from schema version %d to %d in %.2f seconds; the old "
+        "database was kept as %s" % (dbfilename, version, SCHEMA_VERSION,
+        time.time() - started, backup))
+
+    return
+
+###
+
+def newBatch():
+
+  # This function returns an empty "batch" dictionary, which holds a list of
+  # parameter tuples for each INSERT statement that `writeBatch` executes. The
+  # "showbfError" and "showqError" lists hold (errtext, SampleID) tuples for
+  # the "sample_info" table, the "manifest" list holds (Filename, SampleID,
+  # Size, MTime) tuples for the "ingest_manifest" table, the "checkpoints" list
+  # holds (Source, Size, MTime, Position, Finished) tuples for the
+  # "ingest_checkpoints" table, the "quarantine" list holds the malformed
+  # values found by `convertRow`, and the "timings" list holds a (read, parse)
+  # tuple of the seconds spent on each XML file.
+
+    return {
+        "active": [],
+        "backfill": [],
+        "blocked": [],
+        "checkpoints": [],
+        "cluster": [],
+        "completed": [],
+        "eligible": [],
+        "manifest": [],
+        "quarantine": [],
+        "showbfError": [],
+        "showqError": [],
+        "timings": []
+    }
+
+###
+
+def newDecompressor(head):
+
+  # Given the first bytes of a file, this function returns an object whose
+  # `decompress` method takes the file's contents a chunk at a time and
+  # returns them decompressed, if the file was compressed with gzip or zstd,
+  # or None if it was not compressed. Files compressed with zstd can only be
+  # read when the "zstandard" module is installed.
+
+    if head.startswith(GZIP_MAGIC):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    if head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise Exception("The zstandard module is needed to read files "
+                "that were compressed with zstd.")
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    return None
+
+###
+
+def newRun(mode, batch_size, processes):
+
+  # Given a string describing how this program was run, such as "tarball", and
+  # the batch size and the number of worker processes, this function returns a
+  # new "run" dictionary, which `writeBatch` and the callers of `writeBatch`
+  # fill in as they go and which `recordRun` writes to the "ingest_runs"
+  # table. The keys are the names of the columns.
+
+    return {
+        "BatchSize": batch_size,
+        "Bytes": 0,
+        "DiscoverSeconds": 0.0,
+        "Duplicates": 0,
+        "Files": 0,
+        "InsertSeconds": 0.0,
+        "Mode": mode,
+        "ParseSeconds": 0.0,
+        "Processes": processes,
+        "ReadSeconds": 0.0,
+        "Rows": 0,
+        "Samples": 0,
+        "StartTime": time.time()
+    }
+
+###
+
+def parseSample(task):
+
+  # Given a "task" tuple containing a "data_dir" string and a SampleID, this
+  # function parses all three XML files of that sample and returns the rows as
+  # a new "batch" dictionary. It takes a single argument and never touches
+  # SQLite so that it can run in a `multiprocessing.Pool` worker.
+
+    (data_dir, sampleid) = task
+
+    batch = newBatch()
+    importBackfill(batch, data_dir, [sampleid])
+    importCompleted(batch, data_dir, [sampleid])
+    importQueues(batch, data_dir, [sampleid])
+
+  # Record every file of this sample in the manifest, so that the files are
+  # known to be consumed once this batch has been committed.
+
+    for each in ["showbf", "showq", "showqc"]:
+        for suffix in ["-err.xml", "-out.xml"]:
+            filename = each + "/" + sampleid + suffix
+            try:
+                info = os.stat(os.path.join(data_dir, filename))
+            except OSError:
+                continue
+            batch["manifest"].append((filename, sampleid, info.st_size,
+                int(info.st_mtime)))
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS cluster (
+    return batch
 
-         -- Metadata for our study
+###
 
-            SampleID STRING NOT NULL,
-            SampleTime INTEGER NOT NULL,
+def parseOutput(batch, each, obj):
+
+  # Given a "batch" dictionary, the name of a command, and an object returned
+  # by `readXML`, this function appends the rows from the command's output to
+  # the batch, and it returns True. If the output turns out not to be
+  # well-formed, as it is when the command was killed part of the way through,
+  # every row that was taken from it is removed from the batch again, and it
+  # returns False, so that the caller can record the sample as an error.
+
+    lengths = {}
+    for key in batch:
+        lengths[key] = len(batch[key])
+
+    try:
+        if each == "showbf":
+            showbfXMLtoRows(batch, obj)
+        elif each == "showq":
+            showqXMLtoRows(batch, obj)
+        else:
+            showqcXMLtoRows(batch, obj)
+    except XML_ERRORS:
+        for key in lengths:
+            del batch[key][lengths[key]:]
+        return False
+
+    return True
 
-         -- Data
+###
 
-            LocalActiveNodes INTEGER NOT NULL,
-            LocalAllocProcs INTEGER NOT NULL,
-            LocalConfigNodes INTEGER NOT NULL,
-            LocalIdleNodes INTEGER NOT NULL,
-            LocalIdleProcs INTEGER NOT NULL,
-            LocalUpNodes INTEGER NOT NULL,
-            LocalUpProcs INTEGER NOT NULL,
-            RemoteActiveNodes INTEGER NOT NULL,
-            RemoteAllocProcs INTEGER NOT NULL,
-            RemoteConfigNodes INTEGER NOT NULL,
-            RemoteIdleNodes INTEGER NOT NULL,
-            RemoteIdleProcs INTEGER NOT NULL,
-            RemoteUpNodes INTEGER NOT NULL,
-            RemoteUpProcs INTEGER NOT NULL,
+def parseRecords(sampleid, records):
 
-         -- Other table-specific information
+  # Given a SampleID and a dictionary from `readSegment` of the output of that
+  # sample's commands, this function parses the records just as `parseSample`
+  # parses the files of a sample and returns the rows as a new "batch"
+  # dictionary. The records go into the manifest under the names that their
+  # files would have had, e.g. "showq/<uuid>-out.xml".
 
-            CONSTRAINT unique_rows UNIQUE (
+    batch = newBatch()
 
-             -- This can probably simplify to SampleID, SampleTime
+    for each in ["showbf", "showq", "showqc"]:
 
-                SampleID, SampleTime, LocalActiveNodes, LocalAllocProcs,
-                LocalConfigNodes, LocalIdleNodes, LocalIdleProcs, LocalUpNodes,
-                LocalUpProcs, RemoteActiveNodes, RemoteAllocProcs,
-                RemoteConfigNodes, RemoteIdleNodes, RemoteIdleProcs,
-                RemoteUpNodes, RemoteUpProcs
+        started = time.time()
 
-            ),
+        out = records.get((each, "out"))
+        err = records.get((each, "err"))
 
-            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
-        )
-        """)
+      # These are the same rules that `readXML` and `readErrors` follow for
+      # files.
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS completed (
-            AWDuration INTEGER,
-            Account STRING NOT NULL,
-            Class STRING NOT NULL,
-            CompletionCode STRING NOT NULL, -- because "CNCLD" can occur
-            CompletionTime INTEGER NOT NULL,
-            DRMJID INTEGER,
-            EEDuration INTEGER,
-            GJID INTEGER NOT NULL,
-            Group_ STRING NOT NULL,
-            JobID STRING NOT NULL PRIMARY KEY,
-            JobName STRING NOT NULL,
-            MasterHost INTEGER,
-            PAL STRING,
-            QOS STRING NOT NULL,
-            ReqAWDuration INTEGER NOT NULL,
-            ReqNodes INTEGER,
-            ReqProcs INTEGER NOT NULL,
-            StartTime INTEGER NOT NULL,
-            StatPSDed REAL NOT NULL,
-            StatPSUtl REAL NOT NULL,
-            State STRING NOT NULL,
-            SubmissionTime INTEGER NOT NULL,
-            SuspendDuration INTEGER NOT NULL,
-            User STRING NOT NULL
-        );
-        """)
+        errtext = "No error file found"
+        if err is not None:
+            errtext = err[0].decode("utf-8", "replace").strip()
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS eligible (
+        obj = {
+            "errtext": None,
+            "events": None,
+            "SampleID": sampleid
+        }
+        if out is None:
+            obj["errtext"] = "No output file found"
+        elif not isBlank(io.BytesIO(out[0])):
+            obj["events"] = iterEvents(io.BytesIO(out[0]))
+        else:
+            obj["errtext"] = errtext
 
-         -- Metadata for our study
+        read = time.time() - started
 
-            SampleID STRING NOT NULL,
-            SampleTime INTEGER NOT NULL,
+        if obj["events"] is not None:
+            if not parseOutput(batch, each, obj):
+                obj["errtext"] = errtext
 
-         -- Data
+        if each != "showqc":
+            batch[each + "Error"].append((obj["errtext"], sampleid))
 
-            Account STRING NOT NULL,
-            Class STRING NOT NULL,
-            DRMJID INTEGER,
-            EEDuration INTEGER,
-            GJID INTEGER NOT NULL,
-            Group_ STRING NOT NULL,
-            JobID STRING NOT NULL,
-            JobName STRING NOT NULL,
-            QOS STRING NOT NULL,
-            ReqAWDuration INTEGER NOT NULL,
-            ReqProcs INTEGER NOT NULL,
-            RsvStartTime INTEGER,
-            StartPriority INTEGER NOT NULL,
-            StartTime INTEGER NOT NULL,
-            State STRING NOT NULL,
-            SubmissionTime INTEGER NOT NULL,
-            SuspendDuration INTEGER NOT NULL,
-            User STRING NOT NULL,
+        batch["timings"].append((read, time.time() - started - read))
 
-         -- Other table-specific information
+    for (each, stream) in sorted(records):
+        (data, sampletime) = records[(each, stream)]
+        batch["manifest"].append(("%s/%s-%s.xml" % (each, sampleid, stream),
+            sampleid, len(data), int(sampletime)))
 
-            CONSTRAINT unique_rows UNIQUE (
+    return batch
 
-             -- This can probably simplify to SampleID, SampleTime, JobID ...
+###
 
-                SampleID, SampleTime, Account, Class, GJID, Group_, JobID,
-                JobName, QOS, ReqAWDuration, ReqProcs, StartPriority,
-                StartTime, State, SubmissionTime, SuspendDuration, User
+def pickAttributes(pairs, fields):
 
-            ),
+  # Given a flat list of XML attribute names and values, such as the ones in
+  # the events from `iterXML`, and a list of field names, this function
+  # returns a tuple of the values of those attributes in the order of the
+  # fields, with None for any which are missing. The positions are only worked
+  # out once for each combination of attributes and fields, and after that the
+  # values are picked straight out of the list by an `operator.itemgetter`.
 
-            FOREIGN KEY(SampleID) REFERENCES sample_info(SampleID)
-        )
-        """)
+    names = tuple(pairs[0::2])
+    key = (names, tuple(fields))
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sample_info (
-            SampleID STRING PRIMARY KEY,
-            showbfError STRING,
-            showqError STRING
-        );
-        """)
+    getter = ATTRIBUTE_GETTERS.get(key)
+    if getter is None:
+        if len(ATTRIBUTE_GETTERS) >= MAX_ATTRIBUTE_GETTERS:
+            ATTRIBUTE_GETTERS.clear()
+        positions = dict(zip(names, range(len(names))))
+        indices = [positions.get(field, len(names)) for field in fields]
+        if len(indices) == 1:
+            getter = lambda values: (values[indices[0]],)
+        else:
+            getter = operator.itemgetter(*indices)
+        ATTRIBUTE_GETTERS[key] = getter
 
-  # Commit changes
+  # A None at the end of the values stands in for every missing attribute.
 
-    connection.commit()
+    values = pairs[1::2]
+    values.append(None)
 
-    return
+    return getter(values)
 
 ###
 
-def main():
+def readErrors(outfilename):
 
-  # This is the first function that will execute.
+  # Given a string "outfilename", this function returns the contents of the
+  # error file that goes with it, without the surrounding whitespace. Note that
+  # we do not use the UUID to construct the "errfilename". This is because
+  # "errfilename" may be an absolute path, depending on if "outfilename" was an
+  # absolute path.
 
-  # Store current working directory.
+    errfilename = outfilename[:-8] + "-err.xml"
 
-    cwd = os.getcwd()
+    if os.path.isfile(errfilename) is False:
+        return "No error file found"
 
-  # Find the data directory, where this script is running remotely at OLCF and
-  # locally on a personal laptop, for example.
+    with open(errfilename, "r") as errfile:
+        return "".join(errfile.readlines()).strip()
 
-    if os.path.isdir("/lustre/atlas/proj-shared/csc108/data/moab/"):
-        data_dir = "/lustre/atlas/proj-shared/csc108/data/moab/"
-    elif os.path.isdir(os.path.join(cwd, "moab")):
-        data_dir = os.path.join(cwd, "moab")
-    else:
-        raise "Data directory not found."
+###
 
-  # Create the database file in the data directory and connect Python to it.
+def readSegment(indexfilename, position):
 
-    dbfilename = os.path.join(data_dir, "moab-data.sqlite")
+  # Given the path to the index of a segment file and a byte offset into the
+  # index, this generator reads the index from there and yields one tuple per
+  # sample, which holds its SampleID, a dictionary which maps (command,
+  # stream) tuples such as ("showq", "out") to (data, time) tuples, and the
+  # offset into the index just after the sample's lines. The lines of a sample
+  # are written all at once, so they always come together, but a line without
+  # a newline at the very end is still being written, and it is left for next
+  # time. Each line points to the line which frames the data in the segment,
+  # and the two must agree. The data are read from the segment in the order in
+  # which they were written, so the whole segment is read from start to end.
 
-    connection = sqlite3.connect(dbfilename)
+    segment = open(indexfilename[:-4] + ".seg", "rb")
 
-  # Enable users to access columns by name instead of by index.
+    try:
 
-    connection.row_factory = sqlite3.Row
+        with open(indexfilename, "rb") as index:
+            index.seek(position)
+            lines = index.read().split(b"\n")[:-1]
 
-  # Create the database itself, if it doesn't exist.
+        current = None
+        previous = position
+        records = {}
 
-    initializeDatabase(connection)
+        for line in lines:
 
-  # Filter directories to find the UUIDs (SampleIDs) of newly collected data
-  # that needs to be imported.
+            position += len(line) + 1
 
-    uuids = findNewUUIDs(connection, data_dir)
+          # A line that was cut short when the collector was killed is followed
+          # by a newline before the next sample's lines, and it either cannot
+          # be read or it does not match the frame it points to.
 
-  # Start populating the database from the raw XML files.
+            fields = line.split()
+            if len(fields) != 6 or not fields[4].isdigit():
+                continue
+            segment.seek(int(fields[4]))
+            if segment.readline().split() != fields[:4] + fields[5:]:
+                continue
 
-    importBackfill(connection, data_dir, uuids)
-    importCompleted(connection, data_dir, uuids)
-    importQueues(connection, data_dir, uuids)
+            (sampleid, sampletime, each, stream) = [field.decode("ascii")
+                for field in fields[:4]]
+            if sampleid != current:
+                if current is not None:
+                    yield (current, records, previous)
+                current = sampleid
+                records = {}
 
-  # When we are finished, close the connection to the database.
+            records[(each, stream)] = (segment.read(int(fields[5])),
+                float(sampletime))
+            previous = position
 
-    connection.close()
+        if current is not None:
+            yield (current, records, position)
+
+    finally:
+        segment.close()
 
     return
 
@@ -475,354 +3040,677 @@ def readXML(outfilename):
 
   # Given a string "outfilename", this function returns a dictionary containing
   # the file's SampleID, associated error information about when it was
-  # collected, and an `ElementTree` object if the data were collected without
-  # errors.
+  # collected, and an `iterEvents` generator if the data were collected
+  # without errors. Nothing is parsed until the generator is consumed.
 
   # Extract the UUID, which is the base name without "-out.xml".
     uuid = os.path.basename(outfilename)[:-8]
 
-  # The XML files are small (typically < 250K) so it's safe to slurp them.
     if os.path.isfile(outfilename) is False:
         return {
             "errtext": "No output file found",
-            "SampleID": uuid,
-            "tree": None
+            "events": None,
+            "SampleID": uuid
         }
 
-    xmltext = ""
-    with open(outfilename, "r") as xmlfile:
-        xmltext = "".join(xmlfile.readlines()).strip()
+  # An output file that contains nothing but whitespace means that the command
+  # failed.
 
-  # Now, prepare default return values and try to parse the XML content. Note
-  # that we do not use the UUID to construct the "errfilename". This is because
-  # "errfilename" may be an absolute path, depending on if "outfilename" was an
-  # absolute path.
+    blank = isBlank(outfilename)
+
+  # Now, prepare default return values.
 
-    errfilename = outfilename[:-8] + "-err.xml"
     errtext = None
-    tree = None
+    events = None
 
-    if len(xmltext) == 0:
-        with open(errfilename, "r") as errfile:
-            errtext = "".join(errfile.readlines()).strip()
+    if blank:
+        errtext = readErrors(outfilename)
     else:
-        tree = ElementTree.fromstring(xmltext)
+        events = iterEvents(outfilename)
 
     return {
         "errtext": errtext,
-        "SampleID": uuid,
-        "tree": tree
+        "events": events,
+        "SampleID": uuid
     }
 
 ###
 
-def showbfXMLtoSQL(connection, obj):
+def recordRun(connection, run):
+
+  # Given a `Connection` object and a "run" dictionary from `newRun`, this
+  # function adds a row for the run to the "ingest_runs" table, along with its
+  # wall time and the peak memory use of this process and of its largest
+  # worker process so far, and commits. It returns nothing.
+
+    row = dict(run)
+    row["EndTime"] = time.time()
+    row["WallSeconds"] = row["EndTime"] - row["StartTime"]
+    row["EndTime"] = int(row["EndTime"])
+    row["StartTime"] = int(row["StartTime"])
+
+  # Linux reports the maximum resident set size in kilobytes, but macOS uses
+  # bytes. For the children, it is the largest one that has been waited for.
+
+    scale = 1024
+    if sys.platform == "darwin":
+        scale = 1
+    row["PeakRSS"] = scale * \
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    row["WorkerPeakRSS"] = scale * \
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if row["WorkerPeakRSS"] == 0:
+        row["WorkerPeakRSS"] = None
+
+    columns = sorted(row)
+    connection.execute("""
+        INSERT INTO ingest_runs (%s) VALUES (%s);
+        """ % (", ".join(columns), ", ".join(["?"] * len(columns))),
+        [row[column] for column in columns])
+    connection.commit()
+
+    return
+
+###
+
+def seedIntervals(connection, data_dir):
+
+  # Given a `Connection` object and a "data_dir" string indicating the path to
+  # the data directory, this function fills the "job_intervals" table from the
+  # rows that are already in the database, including any monthly shards, if
+  # the table is empty. That happens once, for databases that were built
+  # before it existed, or that have just been migrated. It returns nothing.
 
     cursor = connection.cursor()
 
-    data = {
-        "meta": {},
-        "partitions": {}
-    }
+    cursor.execute("SELECT count(*) FROM job_intervals;")
+    if cursor.fetchone()[0] > 0:
+        return
 
-    root = obj["tree"]
+  # The first and last times and the counts can be combined in any order, so
+  # each queue, in the main database and then in each shard, is added in turn.
+
+    months = []
+    for name in sorted(os.listdir(data_dir)):
+        if name.startswith("moab-data-") and name.endswith(".sqlite"):
+            months.append(name[len("moab-data-"):-len(".sqlite")])
+
+    sources = [("main", None)]
+    for month in months:
+        sources.append(("shard", month))
+
+    for (kind, month) in sources:
+        for (offset, table) in enumerate(["active", "blocked", "eligible"]):
+            if kind == "main":
+                query = """
+                    SELECT  JobID, min(SampleTime), max(SampleTime), count(*)
+                        FROM %s
+                        GROUP BY JobID;
+                    """ % table
+            else:
+                schema = attachShards(connection, data_dir, [month])[month]
+                query = """
+                    SELECT  j.JobID, min(s.SampleTime), max(s.SampleTime),
+                            count(*)
+                        FROM %s.%s_samples AS s
+                        INNER JOIN main.jobs AS j ON s.JobKey = j.JobKey
+                        GROUP BY j.JobID;
+                    """ % (schema, table)
+            intervals = {}
+            for row in cursor.execute(query):
+                interval = [None, None, 0] * 3
+                interval[3 * offset:3 * offset + 3] = [row[1], row[2], row[3]]
+                intervals[row[0]] = interval
+            updateIntervals(cursor, intervals)
+        connection.commit()
 
-    sampleid = obj["SampleID"]
+    return
 
-    for elem in root:
+###
 
-    # The very first 'elem' will have a tag of "Object" which will say
-    # "cluster", and it doesn't do anything, so we can ignore it.
+def setJournalMode(connection, schema, journal_mode):
 
-        if elem.tag == "job":
-            data["meta"] = elem.attrib
+  # Given a `Connection` object, the name of an attached schema, and the name
+  # of a journal mode such as "wal" or "delete", this function switches that
+  # database to the journal mode, which SQLite remembers in the file itself.
+  # In WAL mode, each commit only has to reach the log on disk when the log
+  # is checkpointed, which is still safe against corruption. It returns the
+  # journal mode in use afterwards, which can differ if SQLite is too old to
+  # support WAL. It must not be called in the middle of a transaction.
 
-        elif elem.tag == "par" and elem.attrib["Name"] != "template":
-            data["partitions"][elem.attrib["Name"]] = []
-            for each in elem.getchildren():
-                data["partitions"][elem.attrib["Name"]].append(each.attrib)
+    journal_mode = connection.execute("PRAGMA %s.journal_mode = %s;" %
+        (schema, journal_mode)).fetchone()[0].lower()
 
-    # Now the fun part -- the SQL.
+    if journal_mode == "wal":
+        connection.execute("PRAGMA %s.synchronous = NORMAL;" % schema)
+        connection.execute("PRAGMA wal_autocheckpoint = %d;" %
+            WAL_AUTOCHECKPOINT)
 
-    if "time" not in data["meta"]:
-        return
+    return journal_mode
 
-    time = data["meta"]["time"]
-    for key in data["partitions"]:
-        for each in data["partitions"][key]:
-            cursor.execute("""
-                INSERT OR IGNORE INTO backfill (
-                    SampleID, SampleTime, duration, index_, proccount,
-                    nodecount, reqid, starttime
-                ) VALUES (
-                    ?, ?, ?, ?, ?, ?, ?, ?
-                )
-                """, (sampleid, time, each["duration"], each["index"],
-                each["proccount"], each["nodecount"], each["reqid"],
-                each["starttime"]))
+###
 
-  # Commit changes
+def showReport(connection, num_runs):
 
-    connection.commit()
+  # Given a `Connection` object and a number of runs, this function prints the
+  # most recent runs in the "ingest_runs" table, oldest first, followed by how
+  # the time spent per sample in each phase has changed between the older and
+  # the newer half of them. A phase whose cost keeps growing as history piles
+  # up will show up here long before the nightly job runs out of walltime. It
+  # returns nothing.
+
+    rows = connection.execute("""
+        SELECT * FROM ingest_runs ORDER BY RunID DESC LIMIT ?;
+        """, (num_runs,)).fetchall()
+    rows.reverse()
+
+    if len(rows) == 0:
+        print("No import runs have been recorded yet.")
+        return
+
+    phases = ["Discover", "Read", "Parse", "Insert", "Wall"]
+
+    print("%-16s %-11s %7s %7s %8s %9s %8s %8s %8s %8s %8s %8s %7s" % (
+        "Started", "Mode", "Samples", "Files", "MB", "Rows", "Dups",
+        "Discover", "Read", "Parse", "Insert", "Wall", "RSS MB"))
+    for row in rows:
+        print("%-16s %-11s %7d %7d %8.1f %9d %8d %7.1fs %7.1fs %7.1fs %7.1fs "
+            "%7.1fs %7.0f" % (time.strftime("%Y-%m-%d %H:%M",
+            time.localtime(row["StartTime"])), row["Mode"], row["Samples"],
+            row["Files"], row["Bytes"] / 1e6, row["Rows"], row["Duplicates"],
+            row["DiscoverSeconds"], row["ReadSeconds"], row["ParseSeconds"],
+            row["InsertSeconds"], row["WallSeconds"],
+            max(row["PeakRSS"] or 0, row["WorkerPeakRSS"] or 0) / 1e6))
+
+  # Compare the median cost per sample of each phase in the older half of the
+  # runs with that of the newer half.
+
+    runs = []
+    for row in rows:
+        if row["Samples"] > 0:
+            runs.append(row)
+    if len(runs) < 2:
+        return
+
+    halves = [runs[:len(runs) // 2], runs[len(runs) // 2:]]
+
+    print("")
+    print("Milliseconds per sample, median of the older %d and the newer %d "
+        "runs:" % (len(halves[0]), len(halves[1])))
+    for phase in phases:
+        medians = []
+        for half in halves:
+            costs = []
+            for row in half:
+                costs.append(1000.0 * row[phase + "Seconds"] / row["Samples"])
+            costs.sort()
+            medians.append(costs[len(costs) // 2])
+        change = ""
+        if medians[0] > 0:
+            change = "(%+.0f%%)" % (100.0 * (medians[1] / medians[0] - 1))
+        print("    %-8s %10.2f -> %10.2f %s" % (phase, medians[0], medians[1],
+            change))
 
     return
 
 ###
 
-def showqXMLtoSQL(connection, obj):
+def showbfXMLtoRows(batch, obj):
 
-    cursor = connection.cursor()
-
-    data = {
-        "cluster": {},
-        "jobs": {
-            "active": [],
-            "blocked": [],
-            "eligible": []
-        }
-    }
+  # Given a "batch" dictionary and an object returned by `readXML`, this
+  # function appends the rows for the "backfill" table to the batch.
 
-    root = obj["tree"]
+    backfill_fields = [
+        "duration", "index", "proccount", "nodecount", "reqid", "starttime"
+    ]
 
     sampleid = obj["SampleID"]
+    sampletime = None
+    ranges = []
 
-    for elem in root:
-
-      # The very first 'elem' will have a tag of "Object" which will say
-      # "queue", and it doesn't do anything, so we can ignore it.
+    for (tag, attrib, child, each) in obj["events"]:
 
-        if elem.tag == "cluster":
+    # The very first 'elem' will have a tag of "Object" which will say
+    # "cluster", and it doesn't do anything, so we can ignore it. The partition
+    # ranges are held until the end because we need the time from the "job"
+    # element, and there are only a handful of them per sample anyway.
 
-            data["cluster"] = elem.attrib
+        if tag == "job" and child is None:
+            sampletime = convertRow(batch, "backfill", sampleid, ["time"],
+                [attrib.get("time")])[0]
 
-        elif elem.tag == "queue":
+        elif tag == "par" and child is not None \
+                and attrib["Name"] != "template":
+            ranges.append(convertRow(batch, "backfill", sampleid,
+                backfill_fields, pickAttributes(each, backfill_fields)))
 
-            if elem.get("option") == "active":
-                for job in elem.getchildren():
-                    data["jobs"]["active"].append(job.attrib)
+    # Now the fun part -- the rows.
 
-            elif elem.get("option") == "eligible":
-                for job in elem.getchildren():
-                    data["jobs"]["eligible"].append(job.attrib)
+    if sampletime is None:
+        return
 
-            elif elem.get("option") == "blocked":
-                for job in elem.getchildren():
-                    data["jobs"]["blocked"].append(job.attrib)
+    for each in ranges:
+        batch["backfill"].append((sampleid, sampletime) + each)
 
-  # Now the fun part -- the SQL.
+    return
 
-    if "time" not in data["cluster"]:
-        return
+###
 
-    time = data["cluster"]["time"]
+def showqXMLtoRows(batch, obj):
 
-  # First, the "active" table ...
+  # Given a "batch" dictionary and an object returned by `readXML`, this
+  # function appends the rows for the "active", "blocked", "cluster", and
+  # "eligible" tables to the batch. Job rows hold the fields in JOB_FIELDS,
+  # and `insertBatch` splits them between "jobs" and the per-sample tables.
 
-    active_fields = [
-        "Account", "AWDuration", "Class", "DRMJID", "EEDuration",
-        "GJID", "Group", "JobID", "JobName", "MasterHost", "PAL",
-        "QOS", "ReqAWDuration", "ReqNodes", "ReqProcs", "RsvStartTime",
-        "RunPriority", "StartPriority", "StartTime", "State",
-        "StatPSDed", "StatPSUtl", "SubmissionTime", "SuspendDuration",
-        "User"
+    cluster_fields = [
+        "LocalActiveNodes", "LocalAllocProcs", "LocalConfigNodes",
+        "LocalIdleNodes", "LocalIdleProcs", "LocalUpNodes", "LocalUpProcs",
+        "RemoteActiveNodes", "RemoteAllocProcs", "RemoteConfigNodes",
+        "RemoteIdleNodes", "RemoteIdleProcs", "RemoteUpNodes", "RemoteUpProcs"
     ]
 
-    for job in data["jobs"]["active"]:
+    sampleid = obj["SampleID"]
+    sampletime = None
 
-        vals = {}
-        for field in active_fields:
-            if field in job:
-                vals[field] = job[field]
-            else:
-                vals[field] = None
+  # MOAB puts the `<cluster>` element, which carries the sample time, before
+  # the queues, so the job rows can go straight into the batch. Should a queue
+  # ever come first, its rows are held in "pending" until the time is known,
+  # and they are dropped if it never shows up, just as before.
 
-        cursor.execute("""
-            INSERT OR IGNORE INTO active (
-                SampleID, SampleTime, Account, AWDuration, Class, DRMJID,
-                EEDuration, GJID, Group_, JobID, JobName, MasterHost, PAL,
-                QOS, ReqAWDuration, ReqNodes, ReqProcs, RsvStartTime,
-                RunPriority, StartPriority, StartTime, State,
-                StatPSDed, StatPSUtl, SubmissionTime, SuspendDuration,
-                User
-            ) VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                ?, ?, ?, ?, ?, ?
-            )
-            """, (sampleid, time, vals["Account"], vals["AWDuration"],
-                vals["Class"], vals["DRMJID"], vals["EEDuration"],
-                vals["GJID"], vals["Group"], vals["JobID"], vals["JobName"],
-                vals["MasterHost"], vals["PAL"], vals["QOS"],
-                vals["ReqAWDuration"], vals["ReqNodes"], vals["ReqProcs"],
-                vals["RsvStartTime"], vals["RunPriority"],
-                vals["StartPriority"], vals["StartTime"], vals["State"],
-                vals["StatPSDed"], vals["StatPSUtl"], vals["SubmissionTime"],
-                vals["SuspendDuration"], vals["User"]))
+    pending = {
+        "active": [],
+        "blocked": [],
+        "eligible": []
+    }
 
-    connection.commit()
+    for (tag, attrib, child, job) in obj["events"]:
 
-  # Next, the "blocked" table ...
+      # The very first 'elem' will have a tag of "Object" which will say
+      # "queue", and it doesn't do anything, so we can ignore it.
 
-    blocked_fields = [
-        "Account", "Class", "DRMJID", "EEDuration", "GJID", "Group", "JobID",
-        "JobName", "ReqAWDuration", "ReqProcs", "QOS", "StartPriority",
-        "StartTime", "State", "SubmissionTime", "SuspendDuration", "User"
-    ]
+        if tag == "cluster" and child is None:
+
+            if "time" not in attrib:
+                continue
+
+            sampletime = convertRow(batch, "cluster", sampleid, ["time"],
+                [attrib["time"]])[0]
+
+          # Next, the live data about the "cluster", which was previously
+          # named "meta".
 
-    for job in data["jobs"]["blocked"]:
+            batch["cluster"].append((sampleid, sampletime) +
+                convertRow(batch, "cluster", sampleid, cluster_fields,
+                    [attrib[field] for field in cluster_fields]))
 
-        vals = {}
-        for field in blocked_fields:
-            if field in job:
-                vals[field] = job[field]
+            for key in pending:
+                for row in pending[key]:
+                    batch[key].append((sampleid, sampletime) + row)
+                pending[key] = []
+
+        elif tag == "queue" and child is not None:
+
+            option = attrib.get("option")
+            if option not in JOB_FIELDS:
+                continue
+
+            row = convertRow(batch, option, sampleid, JOB_FIELDS[option],
+                pickAttributes(job, JOB_FIELDS[option]))
+            if sampletime is None:
+                pending[option].append(row)
             else:
-                vals[field] = None
+                batch[option].append((sampleid, sampletime) + row)
 
-        cursor.execute("""
-            INSERT OR IGNORE INTO blocked (
-                SampleID, SampleTime, Account, Class, DRMJID, EEDuration, GJID,
-                Group_, JobID, JobName, QOS, ReqAWDuration, ReqProcs,
-                StartPriority, StartTime, State, SubmissionTime,
-                SuspendDuration, User
-            ) VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-            )
-            """, (sampleid, time, vals["Account"], vals["Class"],
-                vals["DRMJID"], vals["EEDuration"], vals["GJID"],
-                vals["Group"], vals["JobID"], vals["JobName"], vals["QOS"],
-                vals["ReqAWDuration"], vals["ReqProcs"], vals["StartPriority"],
-                vals["StartTime"], vals["State"], vals["SubmissionTime"],
-                vals["SuspendDuration"], vals["User"]))
+    return
 
-    connection.commit()
+###
 
-  # Next, the live data about the "cluster", which was previously named "meta".
+def showqcXMLtoRows(batch, obj):
 
-    vals = data["cluster"]
+  # Given a "batch" dictionary and an object returned by `readXML`, this
+  # function appends the rows for the "completed" table to the batch. The new
+  # JobIDs are only added to KNOWN_COMPLETED once the whole output has been
+  # parsed, because `parseOutput` removes the rows again if it is cut off.
 
-    cursor.execute("""
-        INSERT OR IGNORE INTO cluster (
-            SampleID, SampleTime, LocalActiveNodes, LocalAllocProcs,
-            LocalConfigNodes, LocalIdleNodes, LocalIdleProcs, LocalUpNodes,
-            LocalUpProcs, RemoteActiveNodes, RemoteAllocProcs,
-            RemoteConfigNodes, RemoteIdleNodes, RemoteIdleProcs, RemoteUpNodes,
-            RemoteUpProcs
-        ) VALUES (
-            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-        )
-        """, (sampleid, time, vals["LocalActiveNodes"],
-            vals["LocalAllocProcs"], vals["LocalConfigNodes"],
-            vals["LocalIdleNodes"], vals["LocalIdleProcs"],
-            vals["LocalUpNodes"], vals["LocalUpProcs"],
-            vals["RemoteActiveNodes"], vals["RemoteAllocProcs"],
-            vals["RemoteConfigNodes"], vals["RemoteIdleNodes"],
-            vals["RemoteIdleProcs"], vals["RemoteUpNodes"],
-            vals["RemoteUpProcs"]))
-
-  # Finally, the "eligible" table ...
-
-    eligible_fields = [
-        "Account", "Class", "DRMJID", "EEDuration", "GJID", "Group", "JobID",
-        "JobName", "QOS", "ReqAWDuration", "ReqProcs", "RsvStartTime",
-        "StartPriority", "StartTime", "State", "SubmissionTime",
-        "SuspendDuration", "time", "User"
+    completed_fields = [
+        "AWDuration", "Account", "Class", "CompletionCode", "CompletionTime",
+        "DRMJID", "EEDuration", "GJID", "Group", "JobID", "JobName",
+        "MasterHost", "PAL", "QOS", "ReqAWDuration", "ReqNodes", "ReqProcs",
+        "StartTime", "StatPSDed", "StatPSUtl", "State", "SubmissionTime",
+        "SuspendDuration", "User"
     ]
 
-    for job in data["jobs"]["eligible"]:
+    jobid_fields = ["JobID"]
 
-        vals = {}
-        for field in eligible_fields:
-            if field in job:
-                vals[field] = job[field]
-            else:
-                vals[field] = None
+    new_jobids = set()
 
-        cursor.execute("""
-            INSERT OR IGNORE INTO eligible (
-                SampleID, SampleTime, Account, Class, DRMJID, EEDuration, GJID,
-                Group_, JobID, JobName, QOS, ReqAWDuration, ReqProcs,
-                RsvStartTime, StartPriority, StartTime, State, SubmissionTime,
-                SuspendDuration, User
-            ) VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
-            )
-            """, (sampleid, time, vals["Account"], vals["Class"],
-                vals["DRMJID"], vals["EEDuration"], vals["GJID"],
-                vals["Group"], vals["JobID"], vals["JobName"], vals["QOS"],
-                vals["ReqAWDuration"], vals["ReqProcs"], vals["RsvStartTime"],
-                vals["StartPriority"], vals["StartTime"], vals["State"],
-                vals["SubmissionTime"], vals["SuspendDuration"], vals["User"]))
+    for (tag, attrib, child, job) in obj["events"]:
 
-    connection.commit()
+      # When `showq -c` returned the same jobs as in an earlier sample, the
+      # collector wrote a reference to that sample instead. Those jobs are
+      # imported along with the earlier sample, and a job completes only once,
+      # so a reference stands for no new rows, and the rest can be skipped.
 
-  # Commit changes
+        if tag == "reference" and child is None:
+            break
 
-    connection.commit()
+        if tag == "queue" and child is not None:
+            jobid = pickAttributes(job, jobid_fields)[0]
+            if jobid in KNOWN_COMPLETED or jobid in new_jobids:
+                continue
+            batch["completed"].append(convertRow(batch, "completed",
+                obj["SampleID"], completed_fields,
+                pickAttributes(job, completed_fields)))
+            if jobid is not None:
+                new_jobids.add(jobid)
+
+    KNOWN_COMPLETED.update(new_jobids)
 
     return
 
 ###
 
-def showqcXMLtoSQL(connection, obj):
+def sortSamples(data_dir, uuids):
 
-    cursor = connection.cursor()
+  # Given a "data_dir" string indicating the path to the data directory and a
+  # list of UUIDs, this function returns the UUIDs sorted by the modification
+  # time of their `showq` output files, which is when each sample was taken,
+  # give or take a few seconds. Samples without that file come first.
 
-    data = {
-        "jobs": []
-    }
+    samples = []
+    for sampleid in uuids:
+        try:
+            mtime = os.stat(os.path.join(data_dir, "showq",
+                sampleid + "-out.xml")).st_mtime
+        except OSError:
+            mtime = 0
+        samples.append((mtime, sampleid))
 
-    root = obj["tree"]
+    return [sampleid for (mtime, sampleid) in sorted(samples)]
 
-    for elem in root:
-        if elem.tag == "queue":
-            for job in elem.getchildren():
-                data["jobs"].append(job.attrib)
+###
 
-  # And already we are on to the SQL part.
+def splitBatch(batch):
 
-    completed_fields = [
-        "AWDuration", "Account", "Class", "CompletionCode", "CompletionTime",
-        "DRMJID", "EEDuration", "GJID", "Group", "JobID", "JobName",
-        "MasterHost", "PAL", "QOS", "ReqAWDuration", "ReqNodes", "ReqProcs",
-        "StartTime", "StatPSDed", "StatPSUtl", "State", "SubmissionTime",
-        "SuspendDuration", "User"
-    ]
+  # Given a "batch" dictionary, this function returns a tuple of a copy of the
+  # batch without the rows for the tables made by `initializeSamples`, and a
+  # dictionary which maps month labels such as "2018-07" to new batches which
+  # hold just those rows, according to the month of each row's SampleTime.
 
-    for job in data["jobs"]:
-        vals = {}
-        for field in completed_fields:
-            if field in job:
-                vals[field] = job[field]
-            else:
-                vals[field] = None
+    rest = {}
+    for key in batch:
+        rest[key] = batch[key]
 
-        cursor.execute("""
-            INSERT OR IGNORE INTO completed (
-                AWDuration, Account, Class, CompletionCode, CompletionTime,
-                DRMJID, EEDuration, GJID, Group_, JobID, JobName, MasterHost,
-                PAL, QOS, ReqAWDuration, ReqNodes, ReqProcs, StartTime,
-                StatPSDed, StatPSUtl, State, SubmissionTime, SuspendDuration,
-                User
-            ) VALUES (
-                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                ?, ?, ?
-            )
-            """, (vals["AWDuration"], vals["Account"], vals["Class"],
-            vals["CompletionCode"], vals["CompletionTime"], vals["DRMJID"],
-            vals["EEDuration"], vals["GJID"], vals["Group"], vals["JobID"],
-            vals["JobName"], vals["MasterHost"], vals["PAL"], vals["QOS"],
-            vals["ReqAWDuration"], vals["ReqNodes"], vals["ReqProcs"],
-            vals["StartTime"], vals["StatPSDed"], vals["StatPSUtl"],
-            vals["State"], vals["SubmissionTime"], vals["SuspendDuration"],
-            vals["User"]))
+    shards = {}
+    for key in ["active", "backfill", "blocked", "cluster", "eligible"]:
+        rest[key] = []
+        for row in batch[key]:
+            if row[1] is None:
+                rest[key].append(row)
+                continue
+            month = time.strftime("%Y-%m", time.gmtime(row[1]))
+            if month not in shards:
+                shards[month] = newBatch()
+            shards[month][key].append(row)
 
-  # Commit changes
+    return (rest, shards)
 
-    connection.commit()
+###
+
+def updateIntervals(cursor, intervals):
+
+  # Given a `Cursor` object and a dictionary from `findIntervals`, this
+  # function folds the intervals into the "job_intervals" table, keeping the
+  # earliest first time, the latest last time, and the sum of the counts for
+  # each queue. SQLite's `min` and `max` return NULL if any argument is NULL,
+  # hence the `coalesce`. It does not commit.
+
+    updates = []
+    inserts = []
+    for jobid in intervals:
+        (fa, la, na, fb, lb, nb, fe, le, ne) = intervals[jobid]
+        updates.append((fa, fa, la, la, na, fb, fb, lb, lb, nb, fe, fe, le,
+            le, ne, jobid))
+        inserts.append(tuple([jobid] + intervals[jobid]))
+
+  # A version of UPSERT that works with SQLite versions older than 3.24:
+
+    cursor.executemany("""
+        UPDATE job_intervals SET
+            FirstActive = coalesce(min(FirstActive, ?), FirstActive, ?),
+            LastActive = coalesce(max(LastActive, ?), LastActive, ?),
+            ActiveSamples = ActiveSamples + ?,
+            FirstBlocked = coalesce(min(FirstBlocked, ?), FirstBlocked, ?),
+            LastBlocked = coalesce(max(LastBlocked, ?), LastBlocked, ?),
+            BlockedSamples = BlockedSamples + ?,
+            FirstEligible = coalesce(min(FirstEligible, ?), FirstEligible, ?),
+            LastEligible = coalesce(max(LastEligible, ?), LastEligible, ?),
+            EligibleSamples = EligibleSamples + ?
+        WHERE JobID = ?;
+        """, updates)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO job_intervals (
+            JobID, FirstActive, LastActive, ActiveSamples, FirstBlocked,
+            LastBlocked, BlockedSamples, FirstEligible, LastEligible,
+            EligibleSamples
+        ) VALUES (
+            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+        )
+        """, inserts)
 
     return
 
 ###
 
+def watchDirectories(connection, data_dir, interval, settle, shard_dir,
+        delta=False):
+
+  # Given a `Connection` object, a "data_dir" string indicating the path to the
+  # data directory, two integers, and the "shard_dir" and "delta" to pass on to
+  # `writeBatch`, this function runs forever, polling the
+  # data directories every "interval" seconds and importing each new sample as
+  # soon as it is complete. A sample is complete when all three "-out.xml"
+  # files exist and none of its files has been modified for "settle" seconds,
+  # which means that MOAB has finished writing them. Should one of the files
+  # never appear, the sample is imported anyway once its oldest file is an
+  # hour old, just as the nightly import would have done.
+
+  # The connection, and therefore SQLite's cache of prepared statements, stays
+  # open between polls, and so does the set of filenames that are known to be
+  # consumed. After the first poll, only files that have never been seen
+  # before are looked up in the database. KNOWN_COMPLETED keeps growing too,
+  # so it is loaded again from the database with every checkpoint, which drops
+  # the jobs that have fallen behind the watermark.
+
+    consumed = set()
+    checkpointed = time.time()
+
+  # Each CHECKPOINT_INTERVAL is recorded in "ingest_runs" as a run of its own.
+
+    run = newRun("watch", None, 1)
+
+  # Exit cleanly on SIGTERM as well as on Ctrl-C. Each batch is committed as
+  # a single transaction, so stopping between polls never loses anything.
+
+    def terminate(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, terminate)
+
+    try:
+
+        while True:
+
+            started = time.time()
+            filenames = listDataFiles(data_dir) - consumed
+            known = findConsumed(connection, filenames)
+            consumed |= known
+            filenames -= known
+
+            mtimes = {}
+            for filename in filenames:
+                try:
+                    mtime = os.stat(os.path.join(data_dir, filename)).st_mtime
+                except OSError:
+                    continue
+                sampleid = os.path.basename(filename)[:-8]
+                if sampleid not in mtimes:
+                    mtimes[sampleid] = []
+                mtimes[sampleid].append((mtime, filename))
+
+            now = time.time()
+            run["DiscoverSeconds"] += now - started
+            started = now
+            batch = newBatch()
+            ready = []
+            for sampleid in sorted(mtimes):
+                outputs = 0
+                for (mtime, filename) in mtimes[sampleid]:
+                    if filename.endswith("-out.xml"):
+                        outputs += 1
+                newest = max(mtimes[sampleid])[0]
+                oldest = min(mtimes[sampleid])[0]
+                if newest > now - settle:
+                    continue
+                if outputs < 3 and oldest > now - 3600:
+                    continue
+                mergeBatch(batch, parseSample((data_dir, sampleid)))
+                ready.append(sampleid)
+
+            num_rows = 0
+            num_samples = len(ready)
+            if len(ready) > 0:
+                num_rows = writeBatch(connection, batch, shard_dir, run,
+                    delta)
+                for row in batch["manifest"]:
+                    consumed.add(row[0])
+
+          # Samples in segment files are complete as soon as they are in the
+          # index, so they need no time to settle.
+
+            (rows, samples) = importSegments(connection, data_dir, 100,
+                shard_dir, run, delta)
+            num_rows += rows
+            num_samples += samples
+
+            if num_samples > 0:
+                run["Samples"] += num_samples
+                print("%s: imported %d rows from %d samples in %.2f seconds" %
+                    (time.strftime("%Y-%m-%d %H:%M:%S"), num_rows,
+                    num_samples, time.time() - started))
+                sys.stdout.flush()
+
+            if time.time() - checkpointed >= CHECKPOINT_INTERVAL:
+                recordRun(connection, run)
+                run = newRun("watch", None, 1)
+                checkpointDatabase(connection)
+                loadCompleted(connection)
+                checkpointed = time.time()
+
+            time.sleep(interval)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+
+      # A signal can arrive in the middle of a batch, which must not be
+      # committed along with the record of the run.
+
+        connection.rollback()
+        recordRun(connection, run)
+
+    return
+
+###
+
+def writeBatch(connection, batch, shard_dir=None, run=None, delta=False):
+
+  # Given a `Connection` object, a "batch" dictionary, and optionally the path
+  # to a directory of monthly shards, a "run" dictionary from `newRun`, and
+  # whether to store `showq` samples as snapshots and runs, this function
+  # writes every row in the batch to SQLite and commits the whole batch as a
+  # single transaction. The time it takes, and the files, rows, and time spent
+  # reading and parsing that the batch accounts for, are added to the run. It
+  # returns the number of rows that were submitted, including any that were
+  # ignored as duplicates.
+
+    started = time.time()
+
+    cursor = connection.cursor()
+    num_ignored = 0
+    num_rows = 0
+    timings = batch["timings"]
+    manifest = batch["manifest"]
+
+  # Which jobs were seen when is worked out before the rows are split up, but
+  # it is only written along with the manifest, so that no sample is counted
+  # twice if the import stops part of the way through.
+
+    intervals = findIntervals(batch)
+
+  # Runs span months, so they stay in the main database even with monthly
+  # shards. A sample which is already in "showq_snapshots" is ignored, so it
+  # does no harm if they are committed below before the manifest is.
+
+    if delta:
+        (batch, rows, ignored) = insertSnapshots(cursor, batch)
+        num_rows += rows
+        num_ignored += ignored
+
+  # Samples are imported in the order of their UUIDs, which is random in time,
+  # so a batch can span more months than SQLite can attach at once. The shards
+  # are then written in groups, each in its own transaction, and the rest of
+  # the batch, which includes the manifest, is committed last. If anything
+  # fails part of the way through, the samples will simply be imported again,
+  # and the natural keys will ignore the rows that were already written.
+  #
+  # The codes and jobs which the rows in the shards refer to are committed to
+  # the main database before anything else. With a write-ahead log, SQLite
+  # only makes a commit atomic for each attached database on its own, so a
+  # crash could otherwise leave a shard pointing at a JobKey that was never
+  # committed, and which the next run would hand to a different job.
+
+    if shard_dir is not None:
+        encodeJobs(cursor, batch)
+        connection.commit()
+        (batch, shards) = splitBatch(batch)
+        months = sorted(shards)
+        for i in range(0, len(months), 8):
+            group = months[i:i + 8]
+            schemas = attachShards(connection, shard_dir, group)
+            for month in group:
+                (rows, ignored) = insertBatch(cursor, shards[month],
+                    schemas[month])
+                num_rows += rows
+                num_ignored += ignored
+            connection.commit()
+
+    (rows, ignored) = insertBatch(cursor, batch)
+    num_rows += rows
+    num_ignored += ignored
+    updateIntervals(cursor, intervals)
+
+  # Commit the whole batch at once.
+
+    connection.commit()
+
+    if run is not None:
+        run["InsertSeconds"] += time.time() - started
+        run["Rows"] += num_rows
+        run["Duplicates"] += num_ignored
+        run["Files"] += len(manifest)
+        for row in manifest:
+            run["Bytes"] += row[2] or 0
+        for (read, parse) in timings:
+            run["ReadSeconds"] += read
+            run["ParseSeconds"] += parse
+
+    return num_rows
+
+###
+
 if __name__ == "__main__":
     main()
 
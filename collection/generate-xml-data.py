@@ -0,0 +1,441 @@
+#-  Python 2.6 source code (also tested with 2.7)
+
+#-  generate-xml-data.py ~~
+#
+#   This program writes a synthetic data directory in the same layout that
+#   "collect-xml-data.py" creates on Lustre, so that "from-xml-to-sqlite.py"
+#   can be tested and benchmarked on any machine. Each sample is a set of
+#   "-out.xml" and "-err.xml" files for `showbf`, `showq`, and `showq -c`,
+#   named by a UUID, with the same elements and attributes that the parsers in
+#   "from-xml-to-sqlite.py" read. Behind the files is a small simulation of a
+#   queue, where jobs are submitted, wait as eligible or blocked, run, and then
+#   complete, so that a job shows up in many consecutive samples and then in
+#   the completed queue, just like on Titan.
+#
+#   For example, to write one day of samples, one every 5 minutes, into a new
+#   "moab" directory under the current directory:
+#
+#       $ python2 generate-xml-data.py --samples=288 moab
+#
+#   The defaults for the number of jobs are only meant to be in the same
+#   ballpark as Titan's queues, and they can be changed from the command line.
+#   The same seed always produces the same files.
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import optparse
+import os
+import random
+
+###
+
+# The accounts, users, and groups of the simulated jobs. Each user always
+# submits to the same project.
+
+PROJECTS = [
+    ("CSC108", "doleynik", "csc108"),
+    ("AST106", "mzingale", "ast106"),
+    ("BIP152", "jhuang", "bip152"),
+    ("CHM126", "kwilson", "chm126"),
+    ("CLI115", "mtaylor", "cli115"),
+    ("FUS110", "jchen", "fus110"),
+    ("GEO111", "alee", "geo111"),
+    ("MAT049", "rpatel", "mat049"),
+    ("NPH109", "sgarcia", "nph109"),
+    ("STF007", "tnguyen", "stf007")
+]
+
+# Titan's size, which bounds the cluster summary in every sample. A few nodes
+# are always down, and jobs only start when there are enough up nodes free.
+
+NUM_NODES = 18688
+
+NUM_UP_NODES = 18638
+
+PROCS_PER_NODE = 16
+
+###
+
+def completeJob(job, now, rng):
+
+  # Given a job dictionary, the current UNIX time, and a `random.Random`
+  # object, this function marks the job as finished at "now", usually
+  # successfully, and returns it.
+
+    job["CompletionTime"] = now
+    if rng.random() < 0.9:
+        job["CompletionCode"] = "0"
+        job["State"] = "Completed"
+    else:
+        job["CompletionCode"] = rng.choice(["1", "137", "271", "CNCLD"])
+        job["State"] = rng.choice(["Completed", "Removed", "Vacated"])
+
+    return job
+
+###
+
+def generateCorpus(out_dir, num_samples, num_jobs = 1000,
+        num_completed = 1000, error_rate = 0.01, interval = 300,
+        start = 1530403200, seed = 0):
+
+  # Given the path to the directory to write to and the number of samples, this
+  # function writes that many samples, "interval" seconds apart and starting at
+  # the UNIX time "start". About "num_jobs" jobs are queued at any time, of
+  # which as many as fit on Titan are running, and the "num_completed" jobs to
+  # finish most recently are listed by `showq -c`. Each command fails on its
+  # own with probability "error_rate", in which case its "-out.xml" file is
+  # empty and its "-err.xml" file explains why. It returns the total number of
+  # jobs listed across all of the samples.
+
+    rng = random.Random(seed)
+
+    for each in ["showbf", "showq", "showqc"]:
+        dirname = os.path.join(out_dir, each)
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+
+    state = {
+        "completed": [],
+        "next_id": 3000000,
+        "queued": []
+    }
+
+    num_written = 0
+
+    for i in range(num_samples):
+
+        now = start + i * interval
+        stepQueue(state, now, num_jobs, num_completed, rng)
+
+        sampleid = "%032x" % rng.getrandbits(128)
+
+        texts = {
+            "showbf": showbfXML(state, now, rng),
+            "showq": showqXML(state, now),
+            "showqc": showqcXML(state, now)
+        }
+
+        for each in ["showbf", "showq", "showqc"]:
+            if rng.random() < error_rate:
+                writeSample(out_dir, each, sampleid, "", "ERROR:    cannot "
+                    "connect to server 'titan-batch.ccs.ornl.gov'\n", now)
+            else:
+                writeSample(out_dir, each, sampleid, texts[each], "", now)
+
+        num_written += len(state["queued"]) + len(state["completed"])
+
+    return num_written
+
+###
+
+def jobAttributes(job, now):
+
+  # Given a job dictionary and the current UNIX time, this function returns a
+  # string of the XML attributes that MOAB would print for that job right now.
+  # Which attributes are present depends on the job's queue, just as it does
+  # for the real `showq`.
+
+    attrib = {
+        "Account": job["Account"],
+        "Class": "batch",
+        "DRMJID": job["JobID"],
+        "EEDuration": job["EEDuration"],
+        "GJID": job["JobID"],
+        "Group": job["Group"],
+        "JobID": job["JobID"],
+        "JobName": job["JobName"],
+        "QOS": job["QOS"],
+        "ReqAWDuration": job["ReqAWDuration"],
+        "ReqProcs": job["ReqNodes"] * PROCS_PER_NODE,
+        "StartPriority": job["StartPriority"] +
+            (now - job["SubmissionTime"]) // 60,
+        "StartTime": job["StartTime"],
+        "State": job["State"],
+        "SubmissionTime": job["SubmissionTime"],
+        "SuspendDuration": 0,
+        "User": job["User"]
+    }
+
+    if job["StartTime"] > 0:
+        elapsed = min(job.get("CompletionTime", now), now) - job["StartTime"]
+        attrib.update({
+            "AWDuration": elapsed,
+            "MasterHost": job["MasterHost"],
+            "PAL": "titan",
+            "ReqNodes": job["ReqNodes"],
+            "RunPriority": 1,
+            "StatPSDed": "%.2f" % (elapsed * job["ReqNodes"] * 30.0),
+            "StatPSUtl": "%.2f" % (elapsed * job["ReqNodes"] * 29.4)
+        })
+        if job.get("CompletionTime") is not None:
+            attrib["CompletionCode"] = job["CompletionCode"]
+            attrib["CompletionTime"] = job["CompletionTime"]
+            del attrib["RunPriority"]
+    elif job.get("RsvStartTime") is not None:
+        attrib["RsvStartTime"] = job["RsvStartTime"]
+
+    parts = []
+    for key in sorted(attrib):
+        parts.append('%s="%s"' % (key, attrib[key]))
+
+    return " ".join(parts)
+
+###
+
+def main():
+
+  # This is the first function that will execute.
+
+    parser = optparse.OptionParser(usage="%prog [options] output_dir")
+    parser.add_option("-c", "--completed", dest="num_completed", type="int",
+        default=1000, help="number of jobs listed by `showq -c` "
+        "[default: %default]")
+    parser.add_option("-e", "--error-rate", dest="error_rate", type="float",
+        default=0.01, help="fraction of commands that fail "
+        "[default: %default]")
+    parser.add_option("-i", "--interval", dest="interval", type="int",
+        default=300, help="seconds between samples [default: %default]")
+    parser.add_option("-j", "--jobs", dest="num_jobs", type="int",
+        default=1000, help="number of jobs in the queue at any time "
+        "[default: %default]")
+    parser.add_option("-n", "--samples", dest="num_samples", type="int",
+        default=288, help="number of samples to write [default: %default]")
+    parser.add_option("-s", "--seed", dest="seed", type="int", default=0,
+        help="seed for the random number generator [default: %default]")
+    parser.add_option("-t", "--start", dest="start", type="int",
+        default=1530403200, help="UNIX time of the first sample "
+        "[default: %default]")
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != 1:
+        parser.error("exactly one output directory is required")
+    if options.num_samples < 0 or options.num_jobs < 0 \
+            or options.num_completed < 0:
+        parser.error("numbers of samples and jobs cannot be negative")
+    if options.error_rate < 0 or options.error_rate > 1:
+        parser.error("error rate must be between 0 and 1")
+    if options.interval < 1:
+        parser.error("interval must be a positive integer")
+
+    num_jobs = generateCorpus(args[0], options.num_samples, options.num_jobs,
+        options.num_completed, options.error_rate, options.interval,
+        options.start, options.seed)
+
+    print("Wrote %d samples listing %d jobs in total to %s" %
+        (options.num_samples, num_jobs, args[0]))
+
+###
+
+def newJob(state, now, rng):
+
+  # Given the simulation's "state" dictionary, the current UNIX time, and a
+  # `random.Random` object, this function returns a newly submitted job. Most
+  # jobs are small, but a few ask for a large part of the machine, and the
+  # actual run time is some fraction of the requested walltime.
+
+    state["next_id"] += 1
+    (account, user, group) = rng.choice(PROJECTS)
+
+    nodes = rng.choice([1, 1, 1, 2, 4, 8, 16, 32, 64, 125, 313, 1000, 3750,
+        5000])
+    walltime = rng.choice([1800, 3600, 7200, 7200, 21600, 43200, 86400])
+    blocked = (rng.random() < 0.3)
+    if account == "CSC108":
+        name = "SAGA-Python-PBSJobScript.%x" % rng.getrandbits(32)
+    else:
+        name = "job-%s-%d" % (user, rng.randrange(1000))
+
+    return {
+        "Account": account,
+        "EEDuration": 0,
+        "Group": group,
+        "JobID": "%d" % state["next_id"],
+        "JobName": name,
+        "MasterHost": rng.randrange(NUM_NODES),
+        "QOS": rng.choice(["normal"] * 9 + ["debug"]),
+        "ReqAWDuration": walltime,
+        "ReqNodes": nodes,
+        "RunTime": int(walltime * rng.uniform(0.05, 1.0)),
+        "StartPriority": rng.randrange(1000, 100000),
+        "StartTime": 0,
+        "State": rng.choice(["BatchHold", "Deferred", "Idle"]),
+        "SubmissionTime": now - rng.randrange(300),
+        "User": user,
+        "blocked": blocked
+    }
+
+###
+
+def showbfXML(state, now, rng):
+
+  # Given the simulation's "state" dictionary, the current UNIX time, and a
+  # `random.Random` object, this function returns the text of `showbf` output
+  # for the "titan" partition, whose ranges describe the idle nodes.
+
+    busy = 0
+    for job in state["queued"]:
+        if job["StartTime"] > 0:
+            busy += job["ReqNodes"]
+    idle = max(NUM_NODES - busy, 0)
+
+    ranges = []
+    for i in range(rng.randrange(1, 5)):
+        nodes = max(idle - i * rng.randrange(0, 200), 0)
+        ranges.append('<range duration="%d" index="%d" nodecount="%d" '
+            'proccount="%d" reqid="0" starttime="%d"></range>' %
+            (rng.randrange(600, 86400), i, nodes, nodes * PROCS_PER_NODE,
+            now + i * 600))
+
+    return ('<Data><Object>cluster</Object><job time="%d"></job>'
+        '<par Name="template"></par><par Name="titan">%s</par></Data>\n' %
+        (now, "".join(ranges)))
+
+###
+
+def showqcXML(state, now):
+
+  # Given the simulation's "state" dictionary and the current UNIX time, this
+  # function returns the text of `showq -c` output.
+
+    jobs = []
+    for job in state["completed"]:
+        jobs.append("<job %s></job>" % jobAttributes(job, now))
+
+    return ('<Data><Object>queue</Object><cluster time="%d"></cluster>'
+        '<queue count="%d" option="completed">%s</queue></Data>\n' %
+        (now, len(jobs), "".join(jobs)))
+
+###
+
+def showqXML(state, now):
+
+  # Given the simulation's "state" dictionary and the current UNIX time, this
+  # function returns the text of `showq` output, with the cluster summary
+  # first and then the active, eligible, and blocked queues.
+
+    queues = {
+        "active": [],
+        "blocked": [],
+        "eligible": []
+    }
+
+    active_nodes = 0
+    for job in state["queued"]:
+        if job["StartTime"] > 0:
+            queues["active"].append(job)
+            active_nodes += job["ReqNodes"]
+        elif job["blocked"]:
+            queues["blocked"].append(job)
+        else:
+            queues["eligible"].append(job)
+
+    idle_nodes = NUM_UP_NODES - active_nodes
+
+    cluster = {
+        "LocalActiveNodes": active_nodes,
+        "LocalAllocProcs": active_nodes * PROCS_PER_NODE,
+        "LocalConfigNodes": NUM_NODES,
+        "LocalIdleNodes": idle_nodes,
+        "LocalIdleProcs": idle_nodes * PROCS_PER_NODE,
+        "LocalUpNodes": NUM_UP_NODES,
+        "LocalUpProcs": NUM_UP_NODES * PROCS_PER_NODE,
+        "RemoteActiveNodes": 0,
+        "RemoteAllocProcs": 0,
+        "RemoteConfigNodes": 0,
+        "RemoteIdleNodes": 0,
+        "RemoteIdleProcs": 0,
+        "RemoteUpNodes": 0,
+        "RemoteUpProcs": 0,
+        "time": now
+    }
+
+    parts = []
+    for key in sorted(cluster):
+        parts.append('%s="%s"' % (key, cluster[key]))
+
+    text = ['<Data><Object>queue</Object><cluster %s></cluster>' %
+        " ".join(parts)]
+    for option in ["active", "eligible", "blocked"]:
+        text.append('<queue count="%d" option="%s">' %
+            (len(queues[option]), option))
+        for job in queues[option]:
+            text.append("<job %s></job>" % jobAttributes(job, now))
+        text.append("</queue>")
+    text.append("</Data>\n")
+
+    return "".join(text)
+
+###
+
+def stepQueue(state, now, num_jobs, num_completed, rng):
+
+  # Given the simulation's "state" dictionary, the current UNIX time, the
+  # target numbers of queued and completed jobs, and a `random.Random` object,
+  # this function advances the simulation to "now". Running jobs that have
+  # used up their run time complete, waiting jobs start while there is room,
+  # blocked jobs are sometimes released, and new jobs are submitted until the
+  # queue is about as long as "num_jobs". It returns nothing.
+
+    queued = []
+    for job in state["queued"]:
+        if job["StartTime"] > 0 and now - job["StartTime"] >= job["RunTime"]:
+            state["completed"].append(completeJob(job, now, rng))
+        else:
+            queued.append(job)
+    state["queued"] = queued
+    del state["completed"][:max(len(state["completed"]) - num_completed, 0)]
+
+    while len(state["queued"]) < num_jobs * rng.uniform(0.95, 1.05):
+        state["queued"].append(newJob(state, now, rng))
+
+    free_nodes = NUM_UP_NODES
+    for job in state["queued"]:
+        if job["StartTime"] > 0:
+            free_nodes -= job["ReqNodes"]
+
+    for job in state["queued"]:
+        if job["StartTime"] > 0:
+            continue
+        if job["blocked"]:
+            if rng.random() < 0.02:
+                job["blocked"] = False
+            else:
+                continue
+        job["EEDuration"] = now - job["SubmissionTime"]
+        job["State"] = "Idle"
+        if job["ReqNodes"] <= free_nodes and rng.random() < 0.5:
+            job["MasterHost"] = rng.randrange(NUM_NODES)
+            job["StartTime"] = now
+            job["State"] = "Running"
+            job["RsvStartTime"] = None
+            free_nodes -= job["ReqNodes"]
+        elif job.get("RsvStartTime") is None and rng.random() < 0.05:
+            job["RsvStartTime"] = now + rng.randrange(600, 86400)
+
+    return
+
+###
+
+def writeSample(out_dir, command, sampleid, outtext, errtext, now):
+
+  # Given the path to the output directory, the name of a command such as
+  # "showq", a SampleID, the text of the command's standard output and error,
+  # and the UNIX time of the sample, this function writes the two XML files
+  # for that command and gives them the sample's time as their modification
+  # time, as though they had been collected then. It returns nothing.
+
+    for (suffix, text) in [("-out.xml", outtext), ("-err.xml", errtext)]:
+        filename = os.path.join(out_dir, command, sampleid + suffix)
+        with open(filename, "w") as f:
+            f.write(text)
+        os.utime(filename, (now, now))
+
+    return
+
+###
+
+if __name__ == "__main__":
+    main()
+
+#-  vim:set syntax=python:
@@ -0,0 +1,180 @@
+#-  Python 3 source code
+
+#-  test_hist_by_jobs.py ~~
+#
+#   This program checks that "hist-nodes-by-jobs.py" and
+#   "hist-walltime-by-jobs.py" count a job once, even when it was modified with
+#   `qalter` while it waited and therefore has two rows in the "jobs" table.
+#   The queries are read out of the programs themselves, because they need
+#   matplotlib to be imported, and they are run against a database which
+#   "from-xml-to-sqlite.py" builds from a handful of made-up samples.
+#
+#   Run it from the top of the repository with
+#
+#       $ python -m pytest tests
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import ast
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+
+###
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, "analysis"))
+
+import shards
+
+CLUSTER = ('<cluster LocalActiveNodes="2" LocalAllocProcs="32" '
+    'LocalConfigNodes="4" LocalIdleNodes="2" LocalIdleProcs="32" '
+    'LocalUpNodes="4" LocalUpProcs="64" RemoteActiveNodes="0" '
+    'RemoteAllocProcs="0" RemoteConfigNodes="0" RemoteIdleNodes="0" '
+    'RemoteIdleProcs="0" RemoteUpNodes="0" RemoteUpProcs="0" '
+    'time="%d"></cluster>')
+
+JOB = ('<job AWDuration="%(AWDuration)d" Account="CSC108" Class="batch" '
+    'DRMJID="%(JobID)d" EEDuration="60" GJID="%(JobID)d" Group="csc108" '
+    'JobID="%(JobID)d" JobName="backfill" MasterHost="1" PAL="titan" '
+    'QOS="normal" ReqAWDuration="%(ReqAWDuration)d" ReqNodes="%(ReqNodes)d" '
+    'ReqProcs="%(ReqProcs)d" RunPriority="1" StartPriority="100" '
+    'StartTime="%(StartTime)d" StatPSDed="0.00" StatPSUtl="0.00" '
+    'State="%(State)s" SubmissionTime="900" SuspendDuration="0" '
+    'User="doleynik"></job>')
+
+###
+
+def findQuery(filename):
+
+  # Given the filename of an analysis program, this function returns the SQL
+  # assigned to "query" in its `analyze` function.
+
+    with open(os.path.join(ROOT, "analysis", filename)) as f:
+        tree = ast.parse(f.read())
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and len(node.targets) == 1:
+            target = node.targets[0]
+            if isinstance(target, ast.Name) and target.id == "query":
+                return ast.literal_eval(node.value)
+
+    raise Exception("No query found in %s." % filename)
+
+###
+
+def writeSample(showq_dir, now, queues):
+
+  # Given the path to the "showq" directory, a sample time, and a dictionary
+  # of lists of job attribute dictionaries by queue, this function writes the
+  # output of one `showq` sample and its empty error file.
+
+    sampleid = uuid.uuid4().hex
+
+    parts = ["<Data><Object>queue</Object>", CLUSTER % now]
+    for option in ["active", "eligible", "blocked"]:
+        jobs = queues.get(option, [])
+        parts.append('<queue count="%d" option="%s">' % (len(jobs), option))
+        for job in jobs:
+            values = {
+                "AWDuration": 0,
+                "ReqNodes": job["ReqProcs"] // 16,
+                "StartTime": 0,
+                "State": "Idle"
+            }
+            values.update(job)
+            parts.append(JOB % values)
+        parts.append("</queue>")
+    parts.append("</Data>")
+
+    with open(os.path.join(showq_dir, sampleid + "-out.xml"), "w") as f:
+        f.write("".join(parts))
+    with open(os.path.join(showq_dir, sampleid + "-err.xml"), "w") as f:
+        pass
+
+###
+
+class TestHistByJobs(unittest.TestCase):
+
+    def setUp(self):
+
+      # Job 42 waits with a one-hour walltime on 32 processors, is modified to
+      # two hours on 64, and then runs. Job 43 runs unmodified.
+
+        self.tmpdir = tempfile.mkdtemp()
+        showq_dir = os.path.join(self.tmpdir, "moab", "showq")
+        os.makedirs(showq_dir)
+
+        other = {
+            "AWDuration": 300,
+            "JobID": 43,
+            "ReqAWDuration": 1800,
+            "ReqProcs": 16,
+            "StartTime": 950,
+            "State": "Running"
+        }
+        before = {"JobID": 42, "ReqAWDuration": 3600, "ReqProcs": 32}
+        after = {"JobID": 42, "ReqAWDuration": 7200, "ReqProcs": 64}
+        running = dict(after)
+        running.update({"StartTime": 1500, "State": "Running"})
+
+        writeSample(showq_dir, 1000, {
+            "active": [other],
+            "eligible": [before]
+        })
+        writeSample(showq_dir, 1300, {
+            "active": [other],
+            "eligible": [after]
+        })
+        writeSample(showq_dir, 1600, {
+            "active": [other, running]
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def importSamples(self, options):
+        with open(os.devnull, "w") as devnull:
+            subprocess.check_call([sys.executable,
+                os.path.join(ROOT, "collection", "from-xml-to-sqlite.py")] +
+                options, cwd = self.tmpdir, stdout = devnull)
+        dbfilename = os.path.join(self.tmpdir, "moab", "moab-data.sqlite")
+        connection = shards.connectShards(dbfilename)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def check(self, options):
+        connection = self.importSamples(options)
+        count = connection.execute("""
+            SELECT count(*) FROM jobs WHERE JobID = 42;
+            """).fetchone()[0]
+        self.assertEqual(count, 2)
+        nodes = sorted([tuple(row) for row in
+            connection.execute(findQuery("hist-nodes-by-jobs.py"))])
+        self.assertEqual(nodes, [(42, 4), (43, 1)])
+        walltimes = sorted([tuple(row) for row in
+            connection.execute(findQuery("hist-walltime-by-jobs.py"))])
+        self.assertEqual(walltimes, [(42, 7200), (43, 1800)])
+        connection.close()
+
+    def test_samples(self):
+        self.check([])
+
+    def test_delta(self):
+        self.check(["--delta"])
+
+    def test_monthly_shards(self):
+        self.check(["--monthly-shards"])
+
+###
+
+if __name__ == "__main__":
+    unittest.main()
+
+#-  vim:set syntax=python:
@@ -0,0 +1,132 @@
+#-  Python 3 source code
+
+#-  test_migration.py ~~
+#
+#   This program checks that "from-xml-to-sqlite.py" keeps everything in a
+#   version 4 database when it upgrades it to the current schema, including
+#   the values in "quarantine". The version 4 database is made by importing a
+#   sample with the current program and then taking away what version 5 added,
+#   namely the tables for "--delta" and the half of each view which reads them.
+#
+#   Run it from the top of the repository with
+#
+#       $ python -m pytest tests
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+
+###
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLUSTER = ('<cluster LocalActiveNodes="2" LocalAllocProcs="32" '
+    'LocalConfigNodes="4" LocalIdleNodes="2" LocalIdleProcs="32" '
+    'LocalUpNodes="4" LocalUpProcs="64" RemoteActiveNodes="0" '
+    'RemoteAllocProcs="0" RemoteConfigNodes="0" RemoteIdleNodes="0" '
+    'RemoteIdleProcs="0" RemoteUpNodes="0" RemoteUpProcs="0" '
+    'time="%d"></cluster>')
+
+# The StartPriority of job 1001 is not an integer, so it is quarantined.
+
+JOB = ('<job AWDuration="300" Account="CSC108" Class="batch" '
+    'DRMJID="%(JobID)d" EEDuration="60" GJID="%(JobID)d" Group="csc108" '
+    'JobID="%(JobID)d" JobName="backfill" MasterHost="1" PAL="titan" '
+    'QOS="normal" ReqAWDuration="1800" ReqNodes="1" ReqProcs="16" '
+    'RunPriority="1" StartPriority="%(StartPriority)s" StartTime="950" '
+    'StatPSDed="0.00" StatPSUtl="0.00" State="Running" SubmissionTime="900" '
+    'SuspendDuration="0" User="doleynik"></job>')
+
+###
+
+def downgrade(dbfilename):
+
+  # Given the filename of a database in the current schema, this function
+  # turns it into a version 4 database with the same data in it.
+
+    connection = sqlite3.connect(dbfilename)
+    for table in ["active_runs", "blocked_runs", "eligible_runs",
+            "showq_snapshots"]:
+        connection.execute("DROP TABLE %s;" % table)
+    for view in ["active", "blocked", "eligible"]:
+        sql = connection.execute("""
+            SELECT sql FROM sqlite_master WHERE type = "view" AND name = ?;
+            """, (view,)).fetchone()[0]
+        connection.execute("DROP VIEW %s;" % view)
+        connection.execute(sql.split("UNION ALL")[0])
+    connection.execute("PRAGMA user_version = 4;")
+    connection.commit()
+    connection.close()
+
+###
+
+def dump(connection, table):
+
+  # Given a `Connection` object and the name of a table or view, this function
+  # returns all of its rows, sorted.
+
+    return sorted(connection.execute("SELECT * FROM %s;" % table).fetchall())
+
+###
+
+class TestMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        showq_dir = os.path.join(self.tmpdir, "moab", "showq")
+        os.makedirs(showq_dir)
+        sampleid = uuid.uuid4().hex
+        parts = ["<Data><Object>queue</Object>", CLUSTER % 1000]
+        parts.append('<queue count="2" option="active">')
+        parts.append(JOB % {"JobID": 1000, "StartPriority": "100"})
+        parts.append(JOB % {"JobID": 1001, "StartPriority": "high"})
+        parts.append("</queue></Data>")
+        with open(os.path.join(showq_dir, sampleid + "-out.xml"), "w") as f:
+            f.write("".join(parts))
+        with open(os.path.join(showq_dir, sampleid + "-err.xml"), "w") as f:
+            pass
+        self.dbfilename = os.path.join(self.tmpdir, "moab",
+            "moab-data.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def importSamples(self):
+        with open(os.devnull, "w") as devnull:
+            subprocess.check_call([sys.executable,
+                os.path.join(ROOT, "collection", "from-xml-to-sqlite.py")],
+                cwd = self.tmpdir, stdout = devnull, stderr = devnull)
+
+    def test_version_4(self):
+        self.importSamples()
+        downgrade(self.dbfilename)
+
+        connection = sqlite3.connect(self.dbfilename)
+        before = {}
+        for table in ["active", "jobs", "quarantine", "sample_info"]:
+            before[table] = dump(connection, table)
+        connection.close()
+        self.assertEqual(len(before["quarantine"]), 1)
+
+        self.importSamples()
+
+        connection = sqlite3.connect(self.dbfilename)
+        version = connection.execute("PRAGMA user_version;").fetchone()[0]
+        self.assertEqual(version, 5)
+        for table in before:
+            self.assertEqual(dump(connection, table), before[table], table)
+        connection.close()
+
+###
+
+if __name__ == "__main__":
+    unittest.main()
+
+#-  vim:set syntax=python:
@@ -0,0 +1,265 @@
+#-  Python 3 source code
+
+#-  test_truncated_output.py ~~
+#
+#   This program checks what happens to the output of a MOAB command that was
+#   killed part of the way through. "collect-xml-data.py" should leave an
+#   empty output file behind after the last attempt, and the importer should
+#   record a sample whose output is cut off anyway, e.g. from before the
+#   collector did that, as an error with the text of its error file, instead
+#   of stopping the whole import. The jobs in a `showq -c` output that is cut
+#   off must still be imported from the next sample which lists them.
+#
+#   Run it from the top of the repository with
+#
+#       $ python -m pytest tests
+#
+#                                                   ~~ last updated 18 Oct 2026
+
+import gzip
+import importlib.util
+import io
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tarfile
+import tempfile
+import unittest
+import uuid
+
+###
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLUSTER = ('<cluster LocalActiveNodes="2" LocalAllocProcs="32" '
+    'LocalConfigNodes="4" LocalIdleNodes="2" LocalIdleProcs="32" '
+    'LocalUpNodes="4" LocalUpProcs="64" RemoteActiveNodes="0" '
+    'RemoteAllocProcs="0" RemoteConfigNodes="0" RemoteIdleNodes="0" '
+    'RemoteIdleProcs="0" RemoteUpNodes="0" RemoteUpProcs="0" '
+    'time="%d"></cluster>')
+
+JOB = ('<job AWDuration="300" Account="CSC108" Class="batch" '
+    'DRMJID="%(JobID)d" EEDuration="60" GJID="%(JobID)d" Group="csc108" '
+    'JobID="%(JobID)d" JobName="backfill" MasterHost="1" PAL="titan" '
+    'QOS="normal" ReqAWDuration="1800" ReqNodes="1" ReqProcs="16" '
+    'RunPriority="1" StartPriority="100" StartTime="950" StatPSDed="0.00" '
+    'StatPSUtl="0.00" State="Running" SubmissionTime="900" '
+    'SuspendDuration="0" User="doleynik"></job>')
+
+COMPLETED = ('<job AWDuration="300" Account="CSC108" Class="batch" '
+    'CompletionCode="0" CompletionTime="%(CompletionTime)d" '
+    'DRMJID="%(JobID)d" EEDuration="60" GJID="%(JobID)d" Group="csc108" '
+    'JobID="%(JobID)d" JobName="backfill" MasterHost="1" PAL="titan" '
+    'QOS="normal" ReqAWDuration="1800" ReqNodes="1" ReqProcs="16" '
+    'StartPriority="100" StartTime="950" StatPSDed="0.00" StatPSUtl="0.00" '
+    'State="Completed" SubmissionTime="900" SuspendDuration="0" '
+    'User="doleynik"></job>')
+
+KILLED = "ERROR:    killed after 60 seconds"
+
+###
+
+def loadCollector():
+
+  # This function returns "collect-xml-data.py" as a module, which cannot be
+  # imported by name because of the dashes in its filename.
+
+    filename = os.path.join(ROOT, "collection", "collect-xml-data.py")
+    spec = importlib.util.spec_from_file_location("collect_xml_data",
+        filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+###
+
+def makeCompleted(now, jobids):
+
+  # Given a sample time and a list of JobIDs, this function returns the bytes
+  # of a `showq -c` output which lists those jobs as completed.
+
+    parts = ["<Data><Object>queue</Object>", CLUSTER % now]
+    parts.append('<queue count="%d" option="completed">' % len(jobids))
+    for jobid in jobids:
+        parts.append(COMPLETED % {"CompletionTime": now - 10, "JobID": jobid})
+    parts.append("</queue></Data>")
+    return "".join(parts).encode()
+
+###
+
+def makeOutput(now, num_jobs):
+
+  # Given a sample time and a number of jobs, this function returns the bytes
+  # of a `showq` output with that many running jobs.
+
+    parts = ["<Data><Object>queue</Object>", CLUSTER % now]
+    parts.append('<queue count="%d" option="active">' % num_jobs)
+    for i in range(num_jobs):
+        parts.append(JOB % {"JobID": 1000 + i})
+    parts.append("</queue></Data>")
+    return "".join(parts).encode()
+
+###
+
+class TestImporter(unittest.TestCase):
+
+  # One complete sample and one that was cut off, whose output is more than
+  # big enough to be streamed from a tarball rather than read whole.
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.tmpdir, "moab")
+        os.makedirs(os.path.join(self.data_dir, "showq"))
+        self.good = uuid.uuid4().hex
+        self.bad = uuid.uuid4().hex
+        self.files = {
+            "showq/%s-out.xml" % self.good: makeOutput(1000, 3),
+            "showq/%s-err.xml" % self.good: b"",
+            "showq/%s-out.xml" % self.bad: makeOutput(1300, 100)[:8000],
+            "showq/%s-err.xml" % self.bad: (KILLED + "\n").encode()
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def writeFiles(self):
+        for filename in self.files:
+            with open(os.path.join(self.data_dir, filename), "wb") as f:
+                f.write(self.files[filename])
+
+    def importSamples(self, args):
+        with open(os.devnull, "w") as devnull:
+            subprocess.check_call([sys.executable,
+                os.path.join(ROOT, "collection", "from-xml-to-sqlite.py")] +
+                args, cwd = self.tmpdir, stdout = devnull)
+        return sqlite3.connect(os.path.join(self.data_dir,
+            "moab-data.sqlite"))
+
+    def check(self, connection):
+        rows = connection.execute("""
+            SELECT SampleID, showqError FROM sample_info ORDER BY SampleID;
+            """).fetchall()
+        self.assertEqual(sorted(rows), sorted([(self.good, None),
+            (self.bad, KILLED)]))
+        rows = connection.execute("""
+            SELECT SampleID, count(*) FROM active GROUP BY SampleID;
+            """).fetchall()
+        self.assertEqual(rows, [(self.good, 3)])
+        rows = connection.execute("""
+            SELECT SampleID FROM cluster;
+            """).fetchall()
+        self.assertEqual(rows, [(self.good,)])
+        rows = connection.execute("""
+            SELECT Filename FROM ingest_manifest;
+            """).fetchall()
+        self.assertEqual(sorted([row[0] for row in rows]),
+            sorted(self.files))
+
+    def test_files(self):
+        self.writeFiles()
+        self.check(self.importSamples([]))
+        self.check(self.importSamples(["--delta"]))
+
+    def test_compressed(self):
+        for filename in list(self.files):
+            if filename.endswith("-out.xml"):
+                data = gzip.compress(self.files[filename])
+                if self.bad in filename:
+                    data = data[:len(data) // 2]
+                self.files[filename] = data
+        self.writeFiles()
+        self.check(self.importSamples([]))
+
+    def test_tarball(self):
+
+      # The error member comes after its output in one tarball, and before it
+      # in the other.
+
+        for order in [sorted, lambda names: sorted(names, reverse = True)]:
+            tarfilename = os.path.join(self.tmpdir, "samples.tar.gz")
+            with tarfile.open(tarfilename, "w:gz") as tarball:
+                for filename in order(self.files):
+                    info = tarfile.TarInfo("moab/" + filename)
+                    info.size = len(self.files[filename])
+                    tarball.addfile(info, io.BytesIO(self.files[filename]))
+            connection = self.importSamples([tarfilename])
+            self.check(connection)
+            connection.close()
+            os.remove(os.path.join(self.data_dir, "moab-data.sqlite"))
+
+###
+
+class TestCompleted(TestImporter):
+
+  # The same samples, along with `showq -c` outputs. The one that was cut off
+  # lists jobs 1 and 2 before it ends, and it is imported first. The complete
+  # one after it lists jobs 1, 2, and 3.
+
+    def setUp(self):
+        TestImporter.setUp(self)
+        os.makedirs(os.path.join(self.data_dir, "showqc"))
+        bad = makeCompleted(1300, [1, 2])
+        self.files.update({
+            "showqc/%s-out.xml" % self.good: makeCompleted(1000, [1, 2, 3]),
+            "showqc/%s-err.xml" % self.good: b"",
+            "showqc/%s-out.xml" % self.bad: bad[:bad.index(b"</queue>")],
+            "showqc/%s-err.xml" % self.bad: (KILLED + "\n").encode()
+        })
+
+    def writeFiles(self):
+        TestImporter.writeFiles(self)
+        for (sampleid, mtime) in [(self.bad, 1000000), (self.good, 1000100)]:
+            os.utime(os.path.join(self.data_dir, "showq",
+                sampleid + "-out.xml"), (mtime, mtime))
+
+    def check(self, connection):
+        TestImporter.check(self, connection)
+        rows = connection.execute("""
+            SELECT JobID FROM completed ORDER BY JobID;
+            """).fetchall()
+        self.assertEqual([int(row[0]) for row in rows], [1, 2, 3])
+
+###
+
+class TestCollector(unittest.TestCase):
+
+  # A command that writes half of an XML document and then hangs is killed
+  # at once, and it gets no second attempt.
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.collector = loadCollector()
+        self.collector.POLL_INTERVAL = 0.05
+        self.collector.RETRIES = 0
+        self.collector.TIMEOUT = 1
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check(self, compress):
+        outfilename = os.path.join(self.tmpdir, "hang-out.xml")
+        errfilename = os.path.join(self.tmpdir, "hang-err.xml")
+        args = ["sh", "-c", "printf '<Data><cluster time=\"1'; sleep 30"]
+        results = self.collector.runCommands([("hang", args, outfilename,
+            errfilename)], os.environ.copy(), compress)
+        self.assertTrue(results["hang"]["timed_out"])
+        self.assertEqual(results["hang"]["out_bytes"], 0)
+        self.assertEqual(os.path.getsize(outfilename), 0)
+        with open(errfilename) as f:
+            self.assertEqual(f.read().strip(), KILLED.replace("60", "1"))
+
+    def test_plain(self):
+        self.check(None)
+
+    @unittest.skipUnless(shutil.which("gzip"), "gzip is not installed")
+    def test_gzip(self):
+        self.check("gzip")
+
+###
+
+if __name__ == "__main__":
+    unittest.main()
+
+#-  vim:set syntax=python: